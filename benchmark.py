@@ -0,0 +1,423 @@
+"""
+Headless, reproducible benchmarks for the recommender engine and the skin analysis code.
+
+    python benchmark.py --sizes 10000,100000,1000000 --output bench.json
+    python benchmark.py --sizes 10000 --output new.json --compare bench.json
+
+Synthetic catalogs shaped like skindataall.csv (one row per review) and synthetic face images
+are generated once per seed into --workdir and reused. Each catalog size is measured in fresh
+interpreters (recommender_engine loads its catalog at import): a cold load from CSV, then a
+warm load from the snapshot that run wrote, followed by the query benchmarks. Results are a
+flat JSON list of {"benchmark", "size", "unit", "value"} records plus run metadata, so two
+runs can be diffed with --compare.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+BASE_INGREDIENTS = [
+    "water", "glycerin", "sodium hyaluronate", "hyaluronic acid", "niacinamide", "salicylic acid",
+    "retinol", "tea tree oil", "shea butter", "ceramide np", "squalane", "aloe barbadensis leaf juice",
+    "centella asiatica extract", "green tea extract", "zinc oxide", "kaolin clay", "caffeine",
+    "ascorbic acid", "vitamin c", "peptide complex", "collagen", "oat kernel", "chamomile extract",
+    "licorice root", "azelaic acid", "fragrance", "alcohol denat", "dimethicone", "sulfur",
+    "benzoyl peroxide", "ceramide ap", "panthenol", "allantoin", "lactic acid", "glycolic acid",
+]
+BRANDS = ["CLINIQUE", "Drunk Elephant", "The Ordinary", "Tatcha", "Origins", "Fresh", "Kiehl's",
+          "Sunday Riley", "Belif", "Murad", "Peter Thomas Roth", "First Aid Beauty"]
+CATEGORIES = ["Moisturizer", "Face Wash & Cleansers", "Face Serums", "Face Masks",
+              "Eye Creams & Treatments", "Acne Treatment", "Toners", "Face Oils"]
+PRODUCT_WORDS = ["Acne Gel", "Hydrating Cream", "Serum", "Pore Mask", "Dry Rescue", "Eye Cream",
+                 "Brightening Toner", "Redness Relief", "Night Oil", "Clarifying Wash"]
+SKIN_TYPES = ["Oily", "Dry", "Normal", "Combination", ""]
+CSV_COLUMNS = ["Unnamed: 0", "User_id", "Product_Url", "Product_id", "Rating", "Skin_Tone", "Skin_Type",
+               "Eye_Color", "Hair_Color", "Sensitive", "Oily", "Dry", "Normal", "Combination", "Product",
+               "Brand", "Category", "Price", "Rating_Stars", "Review", "Review_Cleaned", "Ingredients",
+               "Ingredients_Cleaned", "Good_Stuff", "Ing_Tfidf", "Username"]
+
+REVIEWS_PER_PRODUCT = 8    # average review rows per product in the generated CSV
+SYNTHETIC_VOCAB = 2000     # ingredient vocabulary size (BASE_INGREDIENTS + generated long tail)
+IMAGE_SIZE = (480, 640)    # synthetic face images (rows, cols), matching a webcam frame
+DELTA_PRODUCTS = 300       # products per timed catalog delta
+DELTA_ROUNDS = 5
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+REGRESSION_THRESHOLD = 1.10  # --compare flags results more than 10% worse
+
+
+# ---------------------------
+# Synthetic data
+# ---------------------------
+def synthetic_catalog(n_rows, seed=0):
+    """
+    DataFrame with skindataall.csv's columns and n_rows review rows.
+    Products get 2-12 ingredients drawn from a Zipf-like vocabulary (a few very common
+    ingredients, a long tail of rare ones), so index and similarity costs look like real data.
+    """
+    rng = np.random.default_rng(seed)
+    n_products = max(1, n_rows // REVIEWS_PER_PRODUCT)
+    vocab = BASE_INGREDIENTS + [f"botanical extract {i}" for i in range(SYNTHETIC_VOCAB - len(BASE_INGREDIENTS))]
+    weights = 1.0 / np.arange(1, len(vocab) + 1)
+    weights /= weights.sum()
+
+    ingredient_lists = []
+    for size in rng.integers(2, 13, n_products):
+        picks = rng.choice(len(vocab), size=size, replace=False, p=weights)
+        ingredient_lists.append([vocab[i] for i in picks])
+    product_names = np.array([f"Product {p} {PRODUCT_WORDS[w]}"
+                              for p, w in enumerate(rng.integers(0, len(PRODUCT_WORDS), n_products))], dtype=object)
+    cleaned = np.array([repr(ings) for ings in ingredient_lists], dtype=object)
+    raw = np.array([", ".join(ings) for ings in ingredient_lists], dtype=object)
+    brands = np.array(BRANDS, dtype=object)[rng.integers(0, len(BRANDS), n_products)]
+    categories = np.array(CATEGORIES, dtype=object)[rng.integers(0, len(CATEGORIES), n_products)]
+    prices = rng.integers(8, 120, n_products)
+
+    product = rng.integers(0, n_products, n_rows)
+    skin = np.array(SKIN_TYPES, dtype=object)[rng.integers(0, len(SKIN_TYPES), n_rows)]
+    missing_ingredients = rng.random(n_rows) < 0.01
+    return pd.DataFrame({
+        "Unnamed: 0": np.arange(n_rows),
+        "User_id": rng.integers(0, max(1, n_rows // 3), n_rows),
+        "Product_Url": [f"https://example.com/p/{p}" for p in product],
+        "Product_id": product,
+        "Rating": np.round(rng.uniform(3, 5, n_rows), 1),
+        "Skin_Tone": np.array(["Fair", "Light", "Medium", "Olive", "Dark"], dtype=object)[rng.integers(0, 5, n_rows)],
+        "Skin_Type": skin,
+        "Eye_Color": np.array(["Brown", "Blue", "Green"], dtype=object)[rng.integers(0, 3, n_rows)],
+        "Hair_Color": np.array(["Black", "Brown", "Blonde"], dtype=object)[rng.integers(0, 3, n_rows)],
+        "Sensitive": rng.integers(0, 2, n_rows),
+        "Oily": (skin == "Oily").astype(int),
+        "Dry": (skin == "Dry").astype(int),
+        "Normal": (skin == "Normal").astype(int),
+        "Combination": (skin == "Combination").astype(int),
+        "Product": product_names[product],
+        "Brand": brands[product],
+        "Category": categories[product],
+        "Price": prices[product],
+        "Rating_Stars": rng.integers(1, 6, n_rows),
+        "Review": "great stuff",
+        "Review_Cleaned": "great stuff",
+        "Ingredients": raw[product],
+        "Ingredients_Cleaned": np.where(missing_ingredients, "", cleaned[product]),
+        "Good_Stuff": (rng.random(n_rows) < 0.7).astype(int),
+        "Ing_Tfidf": "0.1 0.2",
+        "Username": [f"user{i}" for i in range(n_rows)],
+    }, columns=CSV_COLUMNS)
+
+def synthetic_face_box():
+    """(x, y, w, h) bounding box of the face ellipse drawn by synthetic_face."""
+    h, w = IMAGE_SIZE
+    return w // 3 - w // 4, 20, w // 2, h - 40
+
+def synthetic_detect(frame):
+    """
+    Face detector for the synthetic faces, which have no Haar features: the box synthetic_face
+    draws, scaled to the frame. Lets the detection benchmarks time ROI analysis instead of a
+    face search that finds nothing.
+    """
+    h, w = IMAGE_SIZE
+    fy, fx = frame.shape[0] / h, frame.shape[1] / w
+    x, y, bw, bh = synthetic_face_box()
+    return round(x * fx), round(y * fy), round(bw * fx), round(bh * fy)
+
+def synthetic_face(rng, dark_circles=False, acne=False):
+    """BGR face-like frame; optionally with shadowed under-eye areas and blemishes inside the analysis ROIs."""
+    from skin_analysis import ACNE_ROI, DARK_CIRCLE_ROI
+    import cv2
+    h, w = IMAGE_SIZE
+    frame = np.full((h, w, 3), rng.integers(40, 80, 3), dtype=np.uint8)
+    tone = tuple(int(v) for v in rng.integers([120, 140, 170], [170, 190, 230]))
+    cv2.ellipse(frame, (w // 3, h // 2), (w // 4, h // 2 - 20), 0, 0, 360, tone, -1)
+    noise = rng.normal(0, 6, frame.shape)
+    frame = np.clip(frame + noise, 0, 255).astype(np.uint8)
+    if dark_circles:
+        y0, y1, x0, x1 = DARK_CIRCLE_ROI
+        frame[y0:y1, x0:x1] = (frame[y0:y1, x0:x1] * 0.35).astype(np.uint8)
+    if acne:
+        y0, y1, x0, x1 = ACNE_ROI
+        for _ in range(int(rng.integers(15, 40))):
+            center = (int(rng.integers(x0 + 3, x1 - 3)), int(rng.integers(y0 + 3, y1 - 3)))
+            cv2.circle(frame, center, int(rng.integers(2, 5)), (60, 60, 190), -1)
+    return frame
+
+def write_synthetic_images(directory, count, seed=0):
+    """Write count JPEG faces (cycling through plain, darkened under-eye, blemished and both) -> list of paths."""
+    import cv2
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"face_{i:05d}.jpg")
+        if not os.path.exists(path):
+            cv2.imwrite(path, synthetic_face(rng, dark_circles=bool(i & 1), acne=bool(i & 2)))
+        paths.append(path)
+    return paths
+
+def ensure_catalog(workdir, n_rows, seed=0):
+    """Path of the synthetic CSV for (n_rows, seed), generating it on first use."""
+    directory = os.path.join(workdir, f"catalog_{n_rows}_{seed}")
+    path = os.path.join(directory, "skindataall.csv")
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        tmp = path + ".tmp"
+        synthetic_catalog(n_rows, seed).to_csv(tmp, index=False)
+        os.replace(tmp, path)
+    return path
+
+
+# ---------------------------
+# Measurement helpers
+# ---------------------------
+def summarize(samples):
+    """Latency samples in seconds -> milliseconds {p50, p90, p99, mean, max}."""
+    ms = np.asarray(samples, dtype=float) * 1000
+    return {"p50": float(np.percentile(ms, 50)), "p90": float(np.percentile(ms, 90)),
+            "p99": float(np.percentile(ms, 99)), "mean": float(ms.mean()), "max": float(ms.max())}
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+def query_mix(engine, count, seed=0):
+    """
+    Reproducible recommend_products keyword arguments resembling GUI/API traffic:
+    1-3 concerns, usually a skin type, sometimes avoided ingredients, brand/category filters
+    and a non-default sort.
+    """
+    rng = np.random.default_rng(seed)
+    brands = sorted({p["brand"] for p in engine.product_list[:5000] if isinstance(p["brand"], str)})
+    categories = sorted({p["category"] for p in engine.product_list[:5000] if isinstance(p["category"], str)})
+    common_ingredients = engine.ingredients[:200]
+    skin_types = ["all", "oily", "dry", "normal", "combination"]
+    queries = []
+    for _ in range(count):
+        concerns = [str(c) for c in rng.choice(engine.skin_concerns, size=int(rng.integers(1, 4)), replace=False)]
+        query = {"skin_type": skin_types[int(rng.integers(len(skin_types)))], "concerns": concerns,
+                 "avoid_ingredients": None, "brand_filter": None, "category_filter": None,
+                 "sort_by": "rating"}
+        if rng.random() < 0.3 and common_ingredients:
+            query["avoid_ingredients"] = [str(i) for i in rng.choice(common_ingredients, size=int(rng.integers(1, 3)))]
+        if rng.random() < 0.2 and brands:
+            query["brand_filter"] = brands[int(rng.integers(len(brands)))].lower()[:5]
+        if rng.random() < 0.2 and categories:
+            query["category_filter"] = categories[int(rng.integers(len(categories)))].split()[0]
+        if rng.random() < 0.3:
+            query["sort_by"] = "brand" if rng.random() < 0.5 else "relevance"
+        queries.append(query)
+    return queries
+
+
+# ---------------------------
+# Catalog benchmarks (run inside a fresh interpreter per load)
+# ---------------------------
+def run_catalog_worker(csv_path, phase, queries, batch_profiles, top_n, seed):
+    """Import recommender_engine for csv_path and time it; for phase "warm" also run the query benchmarks."""
+    os.environ["SKINCARE_CATALOG_CSV"] = csv_path
+    start = time.perf_counter()
+    import recommender_engine as engine
+    results = {f"load_{phase}_s": time.perf_counter() - start,
+               "products": len(engine.product_list), "ingredients": len(engine.ingredients)}
+    if phase != "warm":
+        return results
+
+    mix = query_mix(engine, queries, seed)
+    concern_sets = [q["concerns"] for q in mix]
+
+    samples = []
+    for q in mix:
+        engine.invalidate_caches()
+        samples.append(timed(engine.recommend_products, limit=top_n, **q))
+    results["query_uncached_ms"] = summarize(samples)
+    for q in mix:
+        engine.recommend_products(limit=top_n, **q)
+    results["query_cached_ms"] = summarize([timed(engine.recommend_products, limit=top_n, **q) for q in mix])
+
+    engine.invalidate_caches()
+    results["query_columnar_ms"] = summarize([timed(engine.recommend_products_columnar, limit=top_n, **q) for q in mix])
+    results["keywords_uncached_ms"] = summarize([timed(engine._derive_ingredient_keywords, c, engine.columnar_catalog["ingredients"]["index"]) for c in concern_sets])
+
+    engine.invalidate_caches()
+    profiles = query_mix(engine, batch_profiles, seed + 1)
+    elapsed = timed(engine.recommend_products_batch, profiles, top_n=top_n)
+    results["batch_profiles_per_s"] = len(profiles) / elapsed
+
+    rng = np.random.default_rng(seed)
+    ids = rng.integers(0, len(engine.product_list), min(queries, 200))
+    results["similar_exact_ms"] = summarize([timed(engine.similar_products, [int(i)], top_n) for i in ids])
+
+    # incremental updates: each round re-adds DELTA_PRODUCTS products under fresh ids
+    raw = pd.read_csv(csv_path)
+    product_ids = raw["Product_id"].unique()
+    rows = raw[raw["Product_id"].isin(product_ids[:DELTA_PRODUCTS])]
+    deltas = [rows.assign(Product_id=rows["Product_id"] + (k + 1) * (int(product_ids.max()) + 1),
+                          Product=rows["Product"] + f" v{k + 2}") for k in range(DELTA_ROUNDS)]
+    results["catalog_delta_ms"] = summarize([timed(engine.apply_delta, d) for d in deltas])
+    return results
+
+def run_catalog_benchmarks(csv_path, queries, batch_profiles, top_n, seed):
+    """Cold (CSV) and warm (snapshot) loads in separate interpreters -> merged worker results."""
+    snapshot = os.path.splitext(csv_path)[0] + ".snapshot"
+    shutil.rmtree(snapshot, ignore_errors=True)
+    merged = {}
+    for phase in ("cold", "warm"):
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as out:
+            out_path = out.name
+        try:
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", csv_path, "--phase", phase,
+                            "--worker-output", out_path, "--queries", str(queries),
+                            "--batch-profiles", str(batch_profiles), "--top-n", str(top_n), "--seed", str(seed)],
+                           check=True)
+            with open(out_path, encoding="utf-8") as f:
+                merged.update(json.load(f))
+        finally:
+            os.remove(out_path)
+    return merged
+
+
+# ---------------------------
+# Detection benchmarks
+# ---------------------------
+def run_detection_benchmarks(workdir, image_count, seed, processes=None):
+    """Per-frame ROI analysis and face tracking, per-image detection (decode + analysis) and bulk tagging throughput."""
+    import cv2
+    import skin_analysis
+    directory = os.path.join(workdir, f"faces_{seed}")
+    paths = write_synthetic_images(directory, image_count, seed)
+    frames = [cv2.imread(p) for p in paths[:min(len(paths), 200)]]
+    results = {"images": len(paths)}
+    box = synthetic_face_box()
+    for scale in (1, 2):
+        scaled = [cv2.resize(f, None, fx=1 / scale, fy=1 / scale, interpolation=cv2.INTER_AREA) for f in frames]
+        face = tuple(v // scale for v in box)
+        results[f"measure_frame_x{scale}_ms"] = summarize([timed(skin_analysis.measure_frame, f, face) for f in scaled])
+    # one face drifting across the frame; the synthetic faces have no Haar features, so every
+    # detector here is synthetic_detect and track_redetections counts how often it was asked
+    tracker = skin_analysis.FaceTracker(detect=synthetic_detect)
+    moving = [np.roll(frames[0], (int(8 * np.sin(t / 6)), int(16 * np.sin(t / 9))), axis=(0, 1)) for t in range(len(frames))]
+    results["track_frame_ms"] = summarize([timed(tracker.update, f) for f in moving])
+    results["track_redetections"] = tracker.detections
+    results["detect_image_ms"] = summarize([timed(skin_analysis.detect_skin_concerns_from_image, p, detect=synthetic_detect)
+                                            for p in paths[:200]])
+    start = time.perf_counter()
+    tagged = list(skin_analysis.analyze_images(directory, processes=processes, detect=synthetic_detect))
+    results["bulk_images_per_s"] = len(tagged) / (time.perf_counter() - start)
+    results["bulk_images_failed"] = sum(r["error"] is not None for r in tagged)
+    return results
+
+
+# ---------------------------
+# Results
+# ---------------------------
+# Direction of each metric: lower is better unless listed here
+HIGHER_IS_BETTER = ("batch_profiles_per_s", "bulk_images_per_s")
+
+def flatten(group, size, results):
+    """Worker dicts -> records; latency summaries expand to one record per statistic."""
+    records = []
+    for name, value in results.items():
+        if isinstance(value, dict):
+            for stat, v in value.items():
+                records.append({"benchmark": f"{group}.{name}.{stat}", "size": size, "unit": "ms", "value": v})
+        else:
+            unit = "per_s" if name.endswith("per_s") else ("s" if name.endswith("_s") else "count")
+            records.append({"benchmark": f"{group}.{name}", "size": size, "unit": unit, "value": value})
+    return records
+
+def run_metadata(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    import cv2
+    return {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "commit": commit,
+            "python": platform.python_version(), "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "numpy": np.__version__, "pandas": pd.__version__,
+            "opencv": cv2.__version__, "seed": args.seed, "queries": args.queries,
+            "batch_profiles": args.batch_profiles, "top_n": args.top_n}
+
+def compare(current, baseline, threshold=REGRESSION_THRESHOLD, out=sys.stdout):
+    """Print current vs baseline for shared benchmarks -> number of regressions beyond threshold."""
+    old = {(r["benchmark"], r["size"]): r["value"] for r in baseline["results"]}
+    regressions = 0
+    print(f"{'benchmark':<45} {'size':>9} {'baseline':>12} {'current':>12} {'ratio':>7}", file=out)
+    for r in current["results"]:
+        key = (r["benchmark"], r["size"])
+        if key not in old or r["unit"] == "count" or not old[key]:
+            continue
+        ratio = r["value"] / old[key]
+        if r["benchmark"].endswith(".max"):
+            worse = False  # single worst sample: shown, but too noisy to gate on
+        elif r["benchmark"].endswith(HIGHER_IS_BETTER):
+            worse = ratio < 1 / threshold
+        else:
+            worse = ratio > threshold
+        regressions += worse
+        print(f"{r['benchmark']:<45} {r['size'] or '-':>9} {old[key]:>12.3f} {r['value']:>12.3f} "
+              f"{ratio:>6.2f}x{'  REGRESSION' if worse else ''}", file=out)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark catalog loading, queries and skin analysis")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="comma-separated catalog sizes in CSV rows (reviews)")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "skincare_benchmark"),
+                        help="where synthetic catalogs and images are generated and reused")
+    parser.add_argument("--output", "-o", help="write results JSON here (default: stdout)")
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="ratio beyond which --compare reports a regression (exit status 1)")
+    parser.add_argument("--queries", type=int, default=300, help="queries per latency benchmark")
+    parser.add_argument("--batch-profiles", type=int, default=2000)
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--images", type=int, default=400, help="synthetic face images (0 skips detection)")
+    parser.add_argument("--processes", type=int, default=None, help="bulk image tagging processes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--phase", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        results = run_catalog_worker(args.worker, args.phase, args.queries, args.batch_profiles, args.top_n, args.seed)
+        with open(args.worker_output, "w", encoding="utf-8") as f:
+            json.dump(results, f)
+        return 0
+
+    records = []
+    for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+        csv_path = ensure_catalog(args.workdir, size, args.seed)
+        print(f"catalog {size} rows: {csv_path}", file=sys.stderr)
+        records += flatten("catalog", size, run_catalog_benchmarks(csv_path, args.queries, args.batch_profiles,
+                                                                   args.top_n, args.seed))
+    if args.images:
+        print(f"detection: {args.images} images", file=sys.stderr)
+        records += flatten("detection", None, run_detection_benchmarks(args.workdir, args.images, args.seed,
+                                                                       args.processes))
+
+    report = {"meta": run_metadata(args), "results": records}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold,
+                                  out=sys.stdout if args.output else sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
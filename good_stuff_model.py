@@ -0,0 +1,190 @@
+"""
+Serving side of the notebook's Good_Stuff RandomForestClassifier (random_forest_model.pkl).
+
+The notebook label-encodes the categorical columns and trains on every remaining review column:
+
+    python good_stuff_model.py skindataall.csv --output random_forest_model.pkl   # (re)train
+
+Label encoders are replaced by sorted class arrays (exactly LabelEncoder.classes_) and applied with
+np.searchsorted, so encoding a whole catalog or a batch of user profiles is a few array operations.
+scikit-learn is only needed when a model is actually loaded or trained.
+"""
+import argparse
+import os
+import pickle
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# Feature columns in the order the notebook trained on (the CSV columns minus the dropped text columns)
+FEATURE_COLUMNS = ["Unnamed: 0", "User_id", "Product_id", "Rating", "Skin_Tone", "Skin_Type", "Eye_Color",
+                   "Hair_Color", "Sensitive", "Oily", "Dry", "Normal", "Combination", "Product", "Brand",
+                   "Category", "Price", "Rating_Stars"]
+CATEGORICAL_COLUMNS = ["Skin_Tone", "Skin_Type", "Eye_Color", "Hair_Color", "Brand", "Category", "Product"]
+# Columns describing the user; the rest describe the product (or the individual review)
+PROFILE_COLUMNS = ["Skin_Tone", "Skin_Type", "Eye_Color", "Hair_Color", "Sensitive", "Oily", "Dry", "Normal", "Combination"]
+PROFILE_ENCODED = ["Skin_Tone", "Skin_Type", "Eye_Color", "Hair_Color"]
+# Profile keys as used by the app (snake_case) -> notebook column
+PROFILE_KEYS = {"skin_tone": "Skin_Tone", "skin_type": "Skin_Type", "eye_color": "Eye_Color", "hair_color": "Hair_Color",
+                "sensitive": "Sensitive"}
+SKIN_TYPE_FLAGS = ("Oily", "Dry", "Normal", "Combination")
+
+GOOD_STUFF_THRESHOLD = 0.5  # mean predicted probability at or above which a product counts as good_stuff
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+model_path = os.environ.get("SKINCARE_GOOD_STUFF_MODEL") or os.path.join(script_dir, "random_forest_model.pkl")
+
+
+# ---------------------------
+# Encoding (vectorized LabelEncoder)
+# ---------------------------
+def fit_classes(values):
+    """Sorted distinct string values: the classes_ a LabelEncoder fitted on `values` would have."""
+    return np.unique(np.asarray(pd.Series(values).astype(str), dtype=object).astype(str))
+
+def encode(values, classes, ignore_case=False):
+    """
+    LabelEncoder.transform through one searchsorted over the class array.
+    Unseen values get len(classes), the code the notebook gives them by appending to classes_.
+    - ignore_case: match user-typed values ("combination") against the CSV spelling ("Combination")
+    """
+    values = np.asarray(pd.Series(values).astype(str), dtype=object).astype(str)
+    if not len(classes):
+        return np.zeros(len(values), dtype=np.int64)
+    keys, order = classes, None
+    if ignore_case:
+        values = np.char.lower(values)
+        keys = np.char.lower(np.asarray(classes, dtype=str))
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+    pos = np.searchsorted(keys, values)
+    found = pos < len(keys)
+    found[found] = keys[pos[found]] == values[found]
+    codes = pos if order is None else order[np.minimum(pos, len(order) - 1)]
+    return np.where(found, codes, len(classes))
+
+def fit_encoders(raw):
+    """{column: class array} for every categorical column of a raw (review-level) catalog frame."""
+    return {col: fit_classes(raw[col]) for col in CATEGORICAL_COLUMNS if col in raw}
+
+def feature_matrix(raw, encoders):
+    """float64 (rows x FEATURE_COLUMNS) matrix for a raw catalog frame (missing numeric values -> 0)."""
+    X = np.zeros((len(raw), len(FEATURE_COLUMNS)), dtype=np.float64)
+    for j, col in enumerate(FEATURE_COLUMNS):
+        if col not in raw:
+            continue
+        if col in encoders:
+            X[:, j] = encode(raw[col], encoders[col])
+        else:
+            X[:, j] = pd.to_numeric(raw[col], errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+    return X
+
+
+# ---------------------------
+# Model loading and prediction
+# ---------------------------
+def fingerprint(path=None):
+    """(size, mtime_ns) of the model file, or None when there is none (used to invalidate cached predictions)."""
+    try:
+        st = os.stat(path or model_path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+_loaded = {}  # path -> (fingerprint, model): catalog deltas reuse the unpickled forest
+
+def load_model(path=None):
+    """Unpickle the classifier, or None when the file is missing or cannot be loaded (e.g. no scikit-learn)."""
+    path = path or model_path
+    stamp = fingerprint(path)
+    if stamp is None:
+        return None
+    cached = _loaded.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    try:
+        with open(path, "rb") as f:
+            model = pickle.load(f)
+    except Exception as e:
+        warnings.warn(f"Good_Stuff model {path} not loaded: {e}")
+        return None
+    _loaded[path] = (stamp, model)
+    return model
+
+def positive_proba(model, X):
+    """P(Good_Stuff == 1) for every row of X, in one predict_proba call."""
+    if not len(X):
+        return np.zeros(0)
+    classes = list(model.classes_)
+    names = getattr(model, "feature_names_in_", None)
+    if names is not None:
+        # fitted on a DataFrame (the notebook): pass one with the same column names and order
+        X = pd.DataFrame(X, columns=FEATURE_COLUMNS)[list(names)]
+    proba = model.predict_proba(X)
+    return proba[:, classes.index(1)] if 1 in classes else np.zeros(len(X))
+
+def profile_matrix(profiles, encoders):
+    """
+    Encode user profiles -> float64 (n_profiles x PROFILE_COLUMNS).
+    - profiles: dicts with skin_tone, skin_type, eye_color, hair_color and sensitive (any may be missing);
+      the Oily/Dry/Normal/Combination flags are derived from skin_type like in the CSV
+    """
+    frame = pd.DataFrame([{col: p.get(key) for key, col in PROFILE_KEYS.items()} for p in profiles],
+                         columns=list(PROFILE_KEYS.values()))
+    for col in PROFILE_ENCODED:
+        # a missing value encodes like the CSV's empty cells ("nan"); "all" is the app's "no skin type"
+        frame[col] = frame[col].astype(object).where(frame[col].notna(), "nan").astype(str).str.strip()
+    frame.loc[frame["Skin_Type"].str.lower().isin(["", "all"]), "Skin_Type"] = "nan"
+    for flag in SKIN_TYPE_FLAGS:
+        frame[flag] = (frame["Skin_Type"].str.lower() == flag.lower()).astype(np.float64)
+    frame["Sensitive"] = pd.to_numeric(frame["Sensitive"], errors="coerce").fillna(0)
+    out = np.zeros((len(frame), len(PROFILE_COLUMNS)), dtype=np.float64)
+    for j, col in enumerate(PROFILE_COLUMNS):
+        if col in PROFILE_ENCODED:
+            out[:, j] = encode(frame[col], np.asarray(encoders.get(col, []), dtype=str), ignore_case=True)
+        else:
+            out[:, j] = frame[col].to_numpy(dtype=np.float64)
+    return out
+
+def cross_features(product_block, profile_block, rows=None):
+    """
+    Every (profile, product) pair as one feature row, profile-major: row p * n_products + i.
+    - rows: build only these rows (e.g. one range at a time, to bound memory)
+    """
+    n_products = len(product_block)
+    if rows is None:
+        rows = np.arange(len(profile_block) * n_products)
+    X = product_block[rows % n_products]
+    cols = [FEATURE_COLUMNS.index(c) for c in PROFILE_COLUMNS]
+    X[:, cols] = profile_block[rows // n_products]
+    return X
+
+
+# ---------------------------
+# Training (mirrors the notebook)
+# ---------------------------
+def train_model(csv_path, output_path=None, n_estimators=100, n_jobs=-1):
+    """
+    Fit RandomForestClassifier(random_state=42) on every row of the CSV and pickle it.
+    class_weight="balanced" stands in for the notebook's SMOTE oversampling (no imblearn dependency).
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    raw = pd.read_csv(csv_path)
+    X = feature_matrix(raw, fit_encoders(raw))
+    y = (pd.to_numeric(raw["Good_Stuff"], errors="coerce") == 1).astype(int).to_numpy()
+    model = RandomForestClassifier(n_estimators=n_estimators, random_state=42, class_weight="balanced", n_jobs=n_jobs)
+    model.fit(X, y)
+    with open(output_path or model_path, "wb") as f:
+        pickle.dump(model, f)
+    return model
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the Good_Stuff RandomForest on a catalog CSV")
+    parser.add_argument("csv", help="review-level catalog (skindataall.csv layout)")
+    parser.add_argument("--output", "-o", default=model_path)
+    parser.add_argument("--trees", type=int, default=100)
+    args = parser.parse_args()
+    train_model(args.csv, args.output, args.trees)
+    print(f"Model saved to {args.output}")
@@ -2,232 +2,35 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import pandas as pd
 import cv2
-import numpy as np
 import webbrowser
 import os
 import io
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageTk
+from skin_analysis import WebcamConcernPipeline, detect_skin_concerns_from_image
+import metrics
 
 # ---------------------------
-# Load dataset (original behavior preserved)
+# Recommendation backend: the HTTP service when RECOMMENDER_SERVICE_URL is set, else the in-process engine
 # ---------------------------
-script_dir = os.path.dirname(os.path.abspath(__file__))
-file_path = os.path.join(script_dir, 'skindataall.csv')
+SERVICE_URL = os.environ.get("RECOMMENDER_SERVICE_URL")
 
 try:
-    skin_data = pd.read_csv(file_path)
-except FileNotFoundError:
-    messagebox.showerror("Error", f"Dataset file not found at: {file_path}")
+    if SERVICE_URL:
+        from recommendation_service import RecommendationClient
+        engine = RecommendationClient(SERVICE_URL)
+    else:
+        import recommender_engine as engine
+except FileNotFoundError as e:
+    messagebox.showerror("Error", f"Dataset file not found at: {e.filename}")
     raise SystemExit(1)
 except Exception as e:
     messagebox.showerror("Error", f"Error loading dataset: {str(e)}")
     raise SystemExit(1)
 
-# Keep original column mapping & preprocessing (unchanged)
-skin_data = skin_data.rename(columns={
-    "Product": "name",
-    "Brand": "brand",
-    "Skin_Type": "skin_type",
-    "Category": "category",
-    "Ingredients_Cleaned": "key_ingredients",
-    "Product_Url": "url",
-    "Good_Stuff": "good_stuff",
-    "Rating_Stars": "rating"
-})
-
-# preserve existing eval behavior for key_ingredients
-skin_data["key_ingredients"] = skin_data["key_ingredients"].apply(lambda x: eval(x) if isinstance(x, str) else [])
-skin_data["skin_type"] = skin_data["skin_type"].apply(lambda x: x.lower() if isinstance(x, str) else "all")
-product_list = skin_data.to_dict(orient="records")
-
-# Supported concerns and ingredients (original)
-skin_concerns = ["acne", "dark circles", "dryness", "redness", "pores", "oiliness", "sensitivity", "hyperpigmentation", "wrinkles"]
-ingredients = sorted(set(ingredient for product in product_list for ingredient in product["key_ingredients"]))
-
-# ---------------------------
-# Concern -> ingredient mapping (enhancement)
-# ---------------------------
-# This mapping helps the recommender expand a concern into ingredient keywords.
-CONCERN_TO_INGREDIENTS = {
-    "acne": ["salicylic", "benzoyl", "niacinamide", "tea tree", "sulfur"],
-    "dark circles": ["caffeine", "retinol", "vitamin c", "niacinamide", "hyaluronic"],
-    "dryness": ["hyaluronic", "glycerin", "shea", "ceramide", "squalane"],
-    "redness": ["aloe", "centella", "green tea", "niacinamide", "azelaic"],
-    "pores": ["niacinamide", "salicylic", "retinol", "clay"],
-    "oiliness": ["salicylic", "clay", "niacinamide", "zinc"],
-    "sensitivity": ["aloe", "oat", "centella", "chamomile", "ceramide"],
-    "hyperpigmentation": ["vitamin c", "niacinamide", "azelaic", "licorice"],
-    "wrinkles": ["retinol", "peptide", "collagen", "vitamin c"]
-}
-
-def derive_ingredient_keywords_from_concerns(concerns):
-    """Return a set of ingredient keyword strings derived from concerns and dataset ingredients."""
-    keywords = set()
-    for c in concerns:
-        c_norm = c.strip().lower()
-        # mapping-based
-        for mapped in CONCERN_TO_INGREDIENTS.get(c_norm, []):
-            keywords.add(mapped.lower())
-        # find ingredients in dataset that contain the concern word (partial match)
-        for ing in ingredients:
-            if c_norm in ing.lower():
-                keywords.add(ing.lower())
-    # fallback to the concerns themselves if no mapping found
-    if not keywords:
-        for c in concerns:
-            if c.strip():
-                keywords.add(c.strip().lower())
-    return keywords
-
-# ---------------------------
-# Enhanced recommendation engine (keeps original fallback)
-# ---------------------------
-def recommend_products(skin_type, concerns,
-                       avoid_ingredients=None,
-                       brand_filter=None,
-                       category_filter=None,
-                       sort_by="rating"):
-    """
-    Enhanced recommender (returns same type of results as original):
-    - skin_type: string (e.g., 'oily', 'all')
-    - concerns: list of concern strings
-    - avoid_ingredients: list of strings to avoid (optional)
-    - brand_filter: partial brand name to restrict to (optional)
-    - category_filter: partial category to restrict to (optional)
-    - sort_by: "rating", "brand", or "relevance"
-    Returns: (message, list_of_products)
-    """
-    # normalize inputs
-    concerns = [c.strip().lower() for c in concerns if c and c.strip()]
-    avoid_ingredients = [a.strip().lower() for a in (avoid_ingredients or []) if a and a.strip()]
-    brand_filter = brand_filter.strip().lower() if isinstance(brand_filter, str) and brand_filter.strip() else None
-    category_filter = category_filter.strip().lower() if isinstance(category_filter, str) and category_filter.strip() else None
-
-    # derive ingredient keywords
-    target_keywords = derive_ingredient_keywords_from_concerns(concerns)
-
-    # scoring function
-    def product_score(product):
-        score = 0
-        product_ings = [str(x).lower() for x in product.get("key_ingredients", [])]
-        # ingredient keyword matches (higher weight)
-        for kw in target_keywords:
-            if any(kw in ing for ing in product_ings):
-                score += 3
-        # if concern string appears in product category or name
-        prod_category = str(product.get("category", "")).lower()
-        prod_name = str(product.get("name", "")).lower()
-        for c in concerns:
-            if c in prod_category or c in prod_name:
-                score += 1
-        # brand/category filter: disqualify if filter set and doesn't match
-        if brand_filter and brand_filter not in str(product.get("brand", "")).lower():
-            return 0
-        if category_filter and category_filter not in prod_category:
-            return 0
-        # avoid ingredients: disqualify if any present
-        for a in avoid_ingredients:
-            if any(a in ing for ing in product_ings):
-                return 0
-        return score
-
-    # apply base filters (skin type and good_stuff)
-    candidates = []
-    for product in product_list:
-        prod_skin = product.get("skin_type", "all")
-        if not (skin_type in prod_skin or prod_skin == "all"):
-            continue
-        try:
-            if int(product.get("good_stuff", 0)) != 1:
-                continue
-        except Exception:
-            # if not castable, be conservative (skip)
-            continue
-        sc = product_score(product)
-        if sc > 0:
-            candidates.append((sc, product))
-
-    # if nothing from enhanced matching -> fallback to original behavior
-    if not candidates:
-        fallback = []
-        for product in product_list:
-            try:
-                if int(product.get("good_stuff", 0)) != 1:
-                    continue
-            except Exception:
-                continue
-            prod_ings = [str(x).lower() for x in product.get("key_ingredients", [])]
-            if any(any(kw in ing for ing in prod_ings) for kw in target_keywords):
-                fallback.append(product)
-        if fallback:
-            return "No products for the selected skin type. Showing results for all skin types:", fallback
-        else:
-            return "No products found for the given concerns.", []
-
-    # sorting
-    if sort_by == "rating":
-        candidates.sort(key=lambda tup: (tup[0], float(tup[1].get("rating", 0) or 0)), reverse=True)
-    elif sort_by == "brand":
-        candidates.sort(key=lambda tup: tup[1].get("brand", "").lower())
-    elif sort_by == "relevance":
-        candidates.sort(key=lambda tup: (tup[0], float(tup[1].get("rating", 0) or 0)), reverse=True)
-    else:
-        candidates.sort(key=lambda tup: (tup[0], float(tup[1].get("rating", 0) or 0)), reverse=True)
-
-    recommended_products = [tup[1] for tup in candidates]
-    return "Here are your recommendations:", recommended_products
-
-# ---------------------------
-# Original detection functions (kept, with safe guards)
-# ---------------------------
-def detect_skin_concerns_from_webcam():
-    concerns_detected = set()
-    cap = cv2.VideoCapture(0)
-    cv2.namedWindow("Skin Concern Detection (Press Q to Stop)")
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        # protect small frames
-        h, w = gray.shape[:2]
-        try:
-            if h > 200 and w > 300:
-                roi_dark_circles = gray[100:200, 150:300]
-                if np.mean(roi_dark_circles) < 80:
-                    concerns_detected.add("dark circles")
-                edges = cv2.Canny(gray, 100, 200)
-                acne_area = edges[200:300, 100:200]
-                if np.sum(acne_area) > 1000:
-                    concerns_detected.add("acne")
-        except Exception:
-            pass
-        cv2.putText(frame, f"Detected: {', '.join(concerns_detected)}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-        cv2.imshow("Skin Concern Detection (Press Q to Stop)", frame)
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-    cap.release()
-    cv2.destroyAllWindows()
-    return list(concerns_detected)
-
-def detect_skin_concerns_from_image(image_path):
-    concerns_detected = set()
-    img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-    if img is None:
-        return []
-    try:
-        h, w = img.shape[:2]
-        if h > 200 and w > 300:
-            roi_dark_circles = img[100:200, 150:300]
-            if np.mean(roi_dark_circles) < 80:
-                concerns_detected.add("dark circles")
-            edges = cv2.Canny(img, 100, 200)
-            acne_area = edges[200:300, 100:200]
-            if np.sum(acne_area) > 1000:
-                concerns_detected.add("acne")
-    except Exception:
-        pass
-    return list(concerns_detected)
-
 # ---------------------------
 # GUI - enhanced but non-destructive
 # ---------------------------
@@ -244,9 +47,9 @@ root.configure(bg=DEFAULT_BG)
 # Title & info (kept)
 tk.Label(root, text="Skincare Recommendation System", font=("Helvetica", 18, "bold"), bg=DEFAULT_BG).pack(pady=10)
 tk.Label(root, text="Supported Skin Concerns:", font=("Helvetica", 12, "bold"), bg=DEFAULT_BG, fg=DEFAULT_FG).pack(pady=5)
-tk.Label(root, text=", ".join(skin_concerns), font=("Helvetica", 10), bg=DEFAULT_BG, fg=DEFAULT_FG).pack(pady=5)
+tk.Label(root, text=", ".join(engine.skin_concerns), font=("Helvetica", 10), bg=DEFAULT_BG, fg=DEFAULT_FG).pack(pady=5)
 tk.Label(root, text="Key Ingredients:", font=("Helvetica", 12, "bold"), bg=DEFAULT_BG, fg=DEFAULT_FG).pack(pady=5)
-tk.Label(root, text=", ".join(ingredients), font=("Helvetica", 10), bg=DEFAULT_BG, fg=DEFAULT_FG).pack(pady=5)
+tk.Label(root, text=", ".join(engine.ingredients), font=("Helvetica", 10), bg=DEFAULT_BG, fg=DEFAULT_FG).pack(pady=5)
 
 # Input frame (grouping filters)
 input_frame = tk.Frame(root, bg=DEFAULT_BG)
@@ -324,31 +127,189 @@ def toggle_theme_event():
 dark_check = tk.Checkbutton(button_frame, text="Dark Mode", variable=dark_mode_var, command=toggle_theme_event, bg=DEFAULT_BG)
 dark_check.grid(row=0, column=4, padx=6)
 
-# Results panel (scrollable)
+# Results panel: a virtualized Treeview (Tk draws only the visible rows). Results are fetched
+# from the engine a page at a time, and the next page is requested when scrolling nears the end.
+RESULTS_PAGE_SIZE = 200
+RESULT_COLUMNS = (("name", "Product", 380), ("brand", "Brand", 170), ("category", "Category", 170), ("rating", "Rating", 70))
+
 results_container = tk.Frame(root, bg=DEFAULT_BG)
 results_container.pack(fill="both", expand=True, padx=10, pady=10)
 
-canvas = tk.Canvas(results_container, bg=DEFAULT_BG, highlightthickness=0)
-scrollbar = ttk.Scrollbar(results_container, orient="vertical", command=canvas.yview)
-scrollable_frame = tk.Frame(canvas, bg=DEFAULT_BG)
+message_label = tk.Label(results_container, text="", font=("Helvetica", 12, "bold"), justify="left", bg=DEFAULT_BG, fg=DEFAULT_FG)
+message_label.pack(anchor="w", pady=(0, 6))
+
+tree_frame = tk.Frame(results_container, bg=DEFAULT_BG)
+tree_frame.pack(fill="both", expand=True)
+results_tree = ttk.Treeview(tree_frame, columns=[c for c, _, _ in RESULT_COLUMNS], show="headings", selectmode="browse")
+for col, heading, width in RESULT_COLUMNS:
+    results_tree.heading(col, text=heading)
+    results_tree.column(col, width=width, anchor="w", stretch=(col == "name"))
+scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=results_tree.yview)
+results_tree.pack(side="left", fill="both", expand=True)
+scrollbar.pack(side="right", fill="y")
 
-scrollable_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
-canvas.create_window((0,0), window=scrollable_frame, anchor="nw")
-canvas.configure(yscrollcommand=scrollbar.set)
+link_button = tk.Button(results_container, text="Open Link", state="disabled", command=lambda: open_selected_link())
+link_button.pack(anchor="e", pady=(6, 0))
 
-canvas.pack(side="left", fill="both", expand=True)
-scrollbar.pack(side="right", fill="y")
+# ---------------------------
+# Background queries: engine calls run on one worker thread and hand their results to a queue
+# that the Tk loop drains with root.after (Tk itself is only touched from the main thread)
+# ---------------------------
+QUERY_POLL_MS = 15  # how often finished queries are picked up while any are in flight
+LIVE_DEBOUNCE_MS = 350  # live mode: quiet time after the last edit before the query runs
+
+query_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recommend")
+_finished_queries = queue.Queue()
+_in_flight = [0]
+_poll_job = []
+
+def submit_query(token, work, on_done, on_error):
+    """
+    Run work() on the query worker, then on_done(result) or on_error(exception) on the Tk thread.
+    - token: threading.Event cancelling the query once set: it is skipped if it has not started,
+      and its result is dropped if it has
+    """
+    def run():
+        if token.is_set():
+            _finished_queries.put((token, None, None))
+            return
+        try:
+            _finished_queries.put((token, on_done, work()))
+        except Exception as e:
+            _finished_queries.put((token, on_error, e))
+
+    _in_flight[0] += 1
+    query_executor.submit(run)
+    if not _poll_job:
+        _poll_job.append(root.after(QUERY_POLL_MS, poll_queries))
 
-results_frame = scrollable_frame  # keep old name
+def poll_queries():
+    del _poll_job[:]
+    while True:
+        try:
+            token, callback, value = _finished_queries.get_nowait()
+        except queue.Empty:
+            break
+        _in_flight[0] -= 1
+        if callback and not token.is_set():
+            callback(value)
+    if _in_flight[0]:
+        _poll_job.append(root.after(QUERY_POLL_MS, poll_queries))
 
-# store current recommendations for export
+# store current recommendations for export (the rows fetched so far, in display order)
 current_recommendations = []
+# the query being shown: engine keyword arguments, requested top N, whether the engine has run out
+# of rows, its cancellation token, whether a page is being fetched and what to run when it arrives
+current_query = {}
+
+def on_results_scroll(first, last):
+    scrollbar.set(first, last)
+    # near the end of the fetched rows: ask the worker for the next page
+    if float(last) > 0.9 and has_more_results():
+        request_page(RESULTS_PAGE_SIZE)
+
+results_tree.configure(yscrollcommand=on_results_scroll)
+
+def has_more_results():
+    return bool(current_query) and not current_query["done"] and len(current_recommendations) < current_query["top_n"]
+
+def request_page(limit, then=None, failed=None):
+    """
+    Fetch the next `limit` rows of the current query in the background; then() runs once they are
+    shown, failed(reason) instead if the fetch fails or a new query replaces this one.
+    """
+    query = current_query
+    if then:
+        query["after_page"].append((then, failed))
+    if query["loading"]:
+        return
+    query["loading"] = True
+    offset = len(current_recommendations)
+    limit = min(limit, query["top_n"] - offset)
+
+    def work():
+        with metrics.stage("recommend", frontend="tk"):
+            return engine.recommend_products(**query["args"], limit=limit, offset=offset)
+
+    submit_query(query["token"], work, lambda result: show_page(query, offset, limit, *result),
+                 lambda e: show_query_error(query, e))
+
+def show_page(query, offset, limit, message, page):
+    """Append a fetched page to current_recommendations and the tree (the first page also sets the message)."""
+    query["loading"] = False
+    if len(page) < limit:
+        query["done"] = True
+    with metrics.stage("render", frontend="tk") as st:
+        for i, product in enumerate(page, offset):
+            results_tree.insert("", "end", iid=str(i), values=(product.get("name", "Unknown"), product.get("brand", "Unknown"),
+                                                               product.get("category", "N/A"), product.get("rating", "N/A")))
+        current_recommendations.extend(page)
+        if offset == 0:
+            if page:
+                message_label.configure(text=message)
+                results_tree.yview_moveto(0)
+            else:
+                message_label.configure(text=f"{message}\nTry different criteria for better results.")
+        st.record(candidates_out=len(page))
+    callbacks, query["after_page"] = query["after_page"], []
+    for then, _ in callbacks:
+        then()
+
+def show_query_error(query, error):
+    query["loading"] = False
+    message_label.configure(text=f"Error getting recommendations: {error}")
+    fail_waiting(query, f"Error getting recommendations: {error}")
+
+def fail_waiting(query, reason):
+    """Tell whatever waits for the query's next page (e.g. an export) that it will not arrive."""
+    callbacks, query["after_page"] = query["after_page"], []
+    for _, failed in callbacks:
+        if failed:
+            root.after_idle(failed, reason)
+
+def load_all_results(then, failed=None):
+    """
+    Fetch every row of the current top N that has not been scrolled into view yet, then call then().
+    Rows come RESULTS_PAGE_SIZE at a time, each page shown in its own Tk callback, so the window
+    stays responsive for a large top N; failed(reason) runs if a page cannot be fetched.
+    """
+    if has_more_results():
+        request_page(RESULTS_PAGE_SIZE, lambda: load_all_results(then, failed), failed)
+    else:
+        then()
+
+def selected_product():
+    selection = results_tree.selection()
+    return current_recommendations[int(selection[0])] if selection else None
+
+def on_result_selected(event=None):
+    product = selected_product()
+    url = product.get("url", "") if product else ""
+    link_button.configure(state="normal" if isinstance(url, str) and url.strip() else "disabled")
+
+def open_selected_link(event=None):
+    product = selected_product()
+    url = product.get("url", "") if product else ""
+    if isinstance(url, str) and url.strip():
+        try:
+            webbrowser.open(url)
+        except Exception:
+            messagebox.showerror("Error", "Unable to open the product URL.")
+
+results_tree.bind("<<TreeviewSelect>>", on_result_selected)
+results_tree.bind("<Double-1>", open_selected_link)
+results_tree.bind("<Return>", open_selected_link)
 
 # ---------------------------
 # Display recommendations (integrated)
 # ---------------------------
-def display_recommendations():
-    global current_recommendations
+def display_recommendations(live=False):
+    """
+    Start a query for the current inputs; results arrive in the background.
+    - live: triggered by an edit in live mode (incomplete input is ignored instead of reported,
+      and an unchanged query is not re-run)
+    """
+    global current_recommendations, current_query
     user_skin_type = skin_type_var.get().lower()
     user_concerns = concerns_var.get()
     top_n_input = top_n_var.get()
@@ -357,8 +318,9 @@ def display_recommendations():
     avoid_ingredients = avoid_var.get()
     sort_by = sort_var.get().lower()
 
-    if not user_skin_type or not user_concerns:
-        messagebox.showwarning("Input Error", "Please fill in all fields!")
+    if not user_skin_type or not user_concerns.strip():
+        if not live:
+            messagebox.showwarning("Input Error", "Please fill in all fields!")
         return
 
     try:
@@ -366,64 +328,121 @@ def display_recommendations():
         if top_n <= 0:
             raise ValueError()
     except Exception:
-        messagebox.showwarning("Input Error", "Please enter a positive integer for the Top N recommendations.")
+        if not live:
+            messagebox.showwarning("Input Error", "Please enter a positive integer for the Top N recommendations.")
         return
 
     concerns_list = [c.strip() for c in user_concerns.split(",") if c.strip()]
     avoid_list = [a.strip() for a in avoid_ingredients.split(",")] if avoid_ingredients.strip() else []
+    args = {"skin_type": user_skin_type, "concerns": concerns_list, "avoid_ingredients": avoid_list,
+            "brand_filter": brand_filter, "category_filter": category_filter, "sort_by": sort_by}
+    if live and current_query and (current_query["args"], current_query["top_n"]) == (args, top_n):
+        return
 
-    # get recommendations via enhanced engine
-    message, recommendations = recommend_products(user_skin_type, concerns_list,
-                                                   avoid_ingredients=avoid_list,
-                                                   brand_filter=brand_filter,
-                                                   category_filter=category_filter,
-                                                   sort_by=sort_by)
+    # abandon the previous query, then clear its results (one delete call; the Treeview keeps its row machinery)
+    if current_query:
+        current_query["token"].set()
+        fail_waiting(current_query, "a new search replaced the results")
+    results_tree.delete(*results_tree.get_children())
+    link_button.configure(state="disabled")
+    message_label.configure(text="Searching...")
+    current_recommendations = []
+    current_query = {"args": args, "top_n": top_n, "done": False,
+                     "token": threading.Event(), "loading": False, "after_page": []}
+
+    # get the first page via enhanced engine (already ordered by sort_by); the rest follows on scroll
+    request_page(RESULTS_PAGE_SIZE)
+
+# Live mode: re-run the query as the inputs change, once edits pause for LIVE_DEBOUNCE_MS
+live_var = tk.BooleanVar(value=False)
+_live_job = []
+
+def on_query_edited(*_):
+    if not live_var.get():
+        return
+    for job in _live_job:
+        root.after_cancel(job)
+    _live_job[:] = [root.after(LIVE_DEBOUNCE_MS, run_live_query)]
 
-    # Clear previous results
-    for widget in results_frame.winfo_children():
-        widget.destroy()
+def run_live_query():
+    del _live_job[:]
+    if live_var.get():
+        display_recommendations(live=True)
 
-    # show message
-    ttk.Label(results_frame, text=message, font=("Helvetica", 12, "bold"), background=DEFAULT_BG).pack(pady=10)
+for var in (skin_type_var, concerns_var, top_n_var, brand_var, category_var, avoid_var, sort_var):
+    var.trace_add("write", on_query_edited)
 
-    if recommendations:
-        # keep original behavior of sorting by rating and selecting top_n for display
-        try:
-            sorted_recommendations = sorted(recommendations, key=lambda x: float(x.get('rating', 0) or 0), reverse=True)
-        except Exception:
-            sorted_recommendations = recommendations
-
-        sorted_recommendations = sorted_recommendations[:top_n]
-        current_recommendations = sorted_recommendations
-
-        for product in sorted_recommendations:
-            prod_text = f"{product.get('name', 'Unknown')} by {product.get('brand', 'Unknown')} ({product.get('category', 'N/A')})\nRating: {product.get('rating', 'N/A')}"
-            frame = tk.Frame(results_frame, bg=DEFAULT_BG)
-            frame.pack(fill="x", padx=10, pady=6)
-
-            lbl = tk.Label(frame, text=prod_text, font=("Helvetica", 10), wraplength=700, justify="left", bg=DEFAULT_BG, fg=DEFAULT_FG, anchor="w")
-            lbl.pack(side="left", fill="x", expand=True)
-
-            url = product.get('url', '')
-            if isinstance(url, str) and url.strip():
-                def open_link(u=url):
-                    try:
-                        webbrowser.open(u)
-                    except Exception:
-                        messagebox.showerror("Error", "Unable to open the product URL.")
-                link_btn = tk.Button(frame, text="Open Link", command=open_link)
-                link_btn.pack(side="right", padx=6)
-    else:
-        ttk.Label(results_frame, text="Try different criteria for better results.", font=("Helvetica", 10, "italic"), background=DEFAULT_BG).pack(pady=10)
+live_check = tk.Checkbutton(button_frame, text="Live Search", variable=live_var, command=on_query_edited, bg=DEFAULT_BG)
+live_check.grid(row=0, column=5, padx=6)
 
 
 # ---------------------------
 # Webcam/Image usage functions (preserve)
 # ---------------------------
+WEBCAM_PREVIEW_MS = 33  # preview refresh period (~30 fps); capture and analysis run on worker threads
+WEBCAM_STOP_POLL_MS = 20  # after Done: how often the Tk loop checks that the pipeline threads have exited
+WEBCAM_STOP_TIMEOUT_S = 2.0  # ... and how long it waits before releasing the camera off the Tk thread
+
 def use_webcam_for_concerns():
-    detected_concerns = detect_skin_concerns_from_webcam()
-    concerns_var.set(", ".join(detected_concerns))
-    messagebox.showinfo("Detected Concerns", f"Detected concerns: {', '.join(detected_concerns)}")
+    try:
+        pipeline = WebcamConcernPipeline().start()
+    except RuntimeError as e:
+        messagebox.showerror("Webcam Error", str(e))
+        return
+
+    win = tk.Toplevel(root)
+    win.title("Skin Concern Detection")
+    preview = tk.Label(win)
+    preview.pack()
+    status = tk.Label(win, text="Detected: ", font=("Helvetica", 11))
+    status.pack(pady=4)
+    finished = []
+
+    def finish():
+        if finished:
+            return
+        finished.append(True)
+        # the threads exit on their own (a camera read can take a frame period): wait for them
+        # with root.after instead of joining them here, so the Tk loop never blocks
+        pipeline.request_stop()
+        win.destroy()
+        deadline = time.monotonic() + WEBCAM_STOP_TIMEOUT_S
+
+        def stopped():
+            if pipeline.running and time.monotonic() < deadline:
+                root.after(WEBCAM_STOP_POLL_MS, stopped)
+                return
+            if pipeline.running:  # camera read stuck: join and release on a helper thread
+                threading.Thread(target=pipeline.stop, daemon=True).start()
+            else:
+                pipeline.stop()  # threads gone: only releases the camera
+            detected_concerns = pipeline.concerns()
+            concerns_var.set(", ".join(detected_concerns))
+            messagebox.showinfo("Detected Concerns", f"Detected concerns: {', '.join(detected_concerns)}")
+
+        stopped()
+
+    def refresh():
+        if finished:
+            return
+        if not pipeline.running:
+            finish()
+            return
+        frame = pipeline.latest_frame()
+        if frame is not None:
+            face = pipeline.face()
+            if face is not None:
+                x, y, w, h = face
+                frame = cv2.rectangle(frame.copy(), (x, y), (x + w, y + h), (180, 105, 255), 2)
+            image = ImageTk.PhotoImage(Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+            preview.configure(image=image)
+            preview.image = image
+        status.configure(text=f"Detected: {', '.join(pipeline.concerns())}")
+        win.after(WEBCAM_PREVIEW_MS, refresh)
+
+    tk.Button(win, text="Done", command=finish, bg="#FF69B4", fg="white", font=("Helvetica", 12)).pack(pady=6)
+    win.protocol("WM_DELETE_WINDOW", finish)
+    refresh()
 
 def upload_image_for_concerns():
     file_path = filedialog.askopenfilename(filetypes=[("Image files", "*.jpg;*.png;*.jpeg")])
@@ -447,6 +466,11 @@ def export_recommendations():
                                              filetypes=[("CSV Files", "*.csv"), ("Text Files", "*.txt")])
     if not file_path:
         return
+    # the export covers the whole top N, not only the rows scrolled into view so far
+    load_all_results(lambda: write_export(file_path),
+                     lambda reason: messagebox.showerror("Export Error", f"Export cancelled: {reason}"))
+
+def write_export(file_path):
     try:
         rows = []
         for p in current_recommendations:
@@ -473,5 +497,16 @@ def export_recommendations():
 # ---------------------------
 # Start GUI loop
 # ---------------------------
+# with SKINCARE_METRICS=1, per-stage timings are printed every minute and on exit
+metrics_exporter = metrics.PeriodicExporter([metrics.stream_exporter()], interval=60).start() if metrics.enabled else None
+# the in-process engine picks up catalog delta files and appended CSV rows while the app runs
+catalog_watcher = engine.CatalogWatcher(interval=5.0).start() if not SERVICE_URL else None
 root.mainloop()
+if current_query:
+    current_query["token"].set()
+query_executor.shutdown(wait=False, cancel_futures=True)
+if catalog_watcher:
+    catalog_watcher.stop()
+if metrics_exporter:
+    metrics_exporter.stop()
 
@@ -0,0 +1,256 @@
+"""
+Opt-in, in-process metrics for the recommendation path: per-stage wall time and candidate counts.
+
+    with metrics.stage("filter", backend="index") as s:
+        ...
+        s.record(candidates_in=len(scores), candidates_out=len(candidates))
+
+Disabled by default (set SKINCARE_METRICS=1 or call enable()); while disabled stage() returns
+one shared no-op object, so instrumented code pays a function call and nothing else.
+Everything lands in `registry` as counters and fixed-bucket histograms, which exporters turn
+into a log line, a JSON document or the Prometheus text format.
+"""
+import bisect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+# Histogram upper bounds: seconds for stage timings, item counts for candidate sizes
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000, 500000, 1000000)
+
+enabled = os.environ.get("SKINCARE_METRICS", "") not in ("", "0")
+
+def enable(on=True):
+    """Turn recording on (or off with on=False). Already recorded values are kept."""
+    global enabled
+    enabled = bool(on)
+
+
+# ---------------------------
+# Registry
+# ---------------------------
+class Histogram:
+    """Fixed-bucket histogram; cumulative() gives Prometheus-style counts of observations <= each bound."""
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(self.counts):
+            self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        total, out = 0, []
+        for le, c in zip(self.buckets, self.counts):
+            total += c
+            out.append((le, total))
+        return out
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (inf when it is past the last bucket)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        for le, total in self.cumulative():
+            if total >= rank:
+                return le
+        return float("inf")
+
+
+class MetricsRegistry:
+    """Thread-safe store of counters and histograms keyed by (name, sorted label items)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram(buckets)
+            hist.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        """Plain-data copy: {"counters": [...], "histograms": [...]} with labels as dicts."""
+        with self._lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            histograms = [{"name": name, "labels": dict(labels), "count": h.count, "sum": h.sum,
+                           "buckets": h.cumulative(), "p50": h.quantile(0.5), "p99": h.quantile(0.99)}
+                          for (name, labels), h in sorted(self.histograms.items())]
+        return {"counters": counters, "histograms": histograms}
+
+registry = MetricsRegistry()
+
+
+# ---------------------------
+# Instrumentation helpers
+# ---------------------------
+class Stage:
+    """Times one stage into stage_seconds{stage=...}; record() adds stage_<name>{stage=...} size histograms."""
+    __slots__ = ("name", "labels", "start", "counts")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.counts = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def record(self, **counts):
+        self.counts = counts
+
+    def __exit__(self, exc_type, exc, tb):
+        registry.observe("stage_seconds", time.perf_counter() - self.start, stage=self.name, **self.labels)
+        for name, value in (self.counts or {}).items():
+            registry.observe(f"stage_{name}", value, SIZE_BUCKETS, stage=self.name, **self.labels)
+        return False
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def record(self, **counts):
+        pass
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+def stage(name, **labels):
+    """Context manager timing a stage (a shared no-op when metrics are disabled)."""
+    return Stage(name, labels) if enabled else _NULL_STAGE
+
+def inc(name, amount=1, **labels):
+    """Increment a counter when metrics are enabled."""
+    if enabled:
+        registry.inc(name, amount, **labels)
+
+
+# ---------------------------
+# Exporters (callables taking a registry)
+# ---------------------------
+def _label_text(labels):
+    escape = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return ",".join(f'{k}="{escape(v)}"' for k, v in sorted(labels.items()))
+
+def to_prometheus(reg=None):
+    """Prometheus text exposition format, every metric prefixed with "skincare_"."""
+    snap = (reg or registry).snapshot()
+    lines, typed = [], set()
+    for c in snap["counters"]:
+        name = "skincare_" + c["name"]
+        if name not in typed:
+            lines.append(f"# TYPE {name} counter")
+            typed.add(name)
+        lines.append(f"{name}{{{_label_text(c['labels'])}}} {c['value']}")
+    for h in snap["histograms"]:
+        name = "skincare_" + h["name"]
+        if name not in typed:
+            lines.append(f"# TYPE {name} histogram")
+            typed.add(name)
+        labels = _label_text(h["labels"])
+        sep = "," if labels else ""
+        for le, total in h["buckets"]:
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{le}"}} {total}')
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {h["count"]}')
+        lines.append(f"{name}_sum{{{labels}}} {h['sum']}")
+        lines.append(f"{name}_count{{{labels}}} {h['count']}")
+    return "\n".join(lines) + "\n"
+
+def to_json(reg=None):
+    """JSON document of registry.snapshot()."""
+    return json.dumps((reg or registry).snapshot(), default=str)
+
+def to_log_line(reg=None):
+    """One compact line: per-stage count, mean and approximate p99 in ms, then counters."""
+    snap = (reg or registry).snapshot()
+    parts = []
+    for h in snap["histograms"]:
+        if h["name"] != "stage_seconds" or not h["count"]:
+            continue
+        where = "/".join(str(v) for k, v in sorted(h["labels"].items()) if k != "stage")
+        parts.append(f"{h['labels'].get('stage')}{'@' + where if where else ''} n={h['count']} "
+                     f"mean={1000 * h['sum'] / h['count']:.2f}ms p99<={1000 * h['p99']:.1f}ms")
+    for c in snap["counters"]:
+        labels = _label_text(c["labels"])
+        parts.append(f"{c['name']}{'{' + labels + '}' if labels else ''}={c['value']}")
+    return "; ".join(parts) or "no metrics recorded"
+
+def log_exporter(logger=None, level=logging.INFO):
+    """Exporter writing to_log_line() to a logger (default: the "skincare.metrics" logger)."""
+    logger = logger or logging.getLogger("skincare.metrics")
+    return lambda reg: logger.log(level, "%s", to_log_line(reg))
+
+def stream_exporter(stream=None, formatter=to_log_line):
+    """Exporter printing formatter(registry) to a text stream (default: stderr)."""
+    return lambda reg: print(formatter(reg), file=stream or sys.stderr, flush=True)
+
+def file_exporter(path, formatter=to_json):
+    """Exporter atomically rewriting path with formatter(registry) (e.g. to_prometheus for a textfile collector)."""
+    def export(reg):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(formatter(reg))
+        os.replace(tmp, path)
+    return export
+
+class PeriodicExporter:
+    """Daemon thread calling each exporter with the registry every `interval` seconds (and once on stop())."""
+
+    def __init__(self, exporters, interval=60.0, reg=None):
+        self.exporters = list(exporters)
+        self.interval = interval
+        self.registry = reg or registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.export()
+
+    def export(self):
+        for exporter in self.exporters:
+            try:
+                exporter(self.registry)
+            except Exception:
+                logging.getLogger("skincare.metrics").exception("metrics exporter failed")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.export()
@@ -0,0 +1,222 @@
+"""
+Compact product records behind recommender_engine.product_list.
+
+A ProductRecord is a read-only mapping (record["name"], record.get("url"), dict(record)) that
+holds only its ProductStore and its position. The store keeps the columns the recommender and
+GUI read as compact arrays: strings factorized into int32 codes over shared distinct values,
+numbers as NumPy arrays, and key_ingredients as int32 ids into one interned ingredient
+vocabulary (kept alongside its lowercased form). Cold columns (review text, usernames,
+per-skin-type breakdowns, ...) are fetched through a loader the first time a record asks for one.
+
+Stores are append-only: catalog deltas add rows to small per-column tails, so records handed
+out earlier stay valid.
+"""
+import threading
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+INGREDIENTS_COLUMN = "key_ingredients"
+
+
+def _python_value(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+# ---------------------------
+# Columns (base arrays + a tail list for appended rows)
+# ---------------------------
+class _StringColumn:
+    """int32 codes into distinct values (-1 = missing, read back as NaN)."""
+    __slots__ = ("codes", "values", "tail")
+
+    def __init__(self, series):
+        codes, values = pd.factorize(series)
+        self.codes = codes.astype(np.int32)
+        self.values = list(values)
+        self.tail = []
+
+    def __getitem__(self, pos):
+        if pos >= len(self.codes):
+            return self.tail[pos - len(self.codes)]
+        code = self.codes[pos]
+        return self.values[code] if code >= 0 else np.nan
+
+
+class _ArrayColumn:
+    """NumPy array (numeric, or object for cold string columns)."""
+    __slots__ = ("array", "tail")
+
+    def __init__(self, array):
+        self.array = array
+        self.tail = []
+
+    def __getitem__(self, pos):
+        if pos >= len(self.array):
+            return self.tail[pos - len(self.array)]
+        return _python_value(self.array[pos])
+
+
+def _column(series):
+    if pd.api.types.is_numeric_dtype(series.dtype) and not isinstance(series.dtype, pd.CategoricalDtype):
+        return _ArrayColumn(series.to_numpy())
+    return _StringColumn(series)
+
+
+# ---------------------------
+# Store and records
+# ---------------------------
+class ProductStore:
+    """
+    Column store for one loaded catalog.
+    - frame: the hot columns (every column except key_ingredients is copied into compact arrays)
+    - columns: all record keys, in order (default: the frame's columns)
+    - ingredients: (ptr, ids, vocab) CSR of key_ingredients; default: built from frame["key_ingredients"] lists
+    - cold_loader: column name -> array of base-row values, for record keys not in the frame
+    """
+
+    def __init__(self, frame, columns=None, ingredients=None, cold_loader=None):
+        self.columns = list(frame.columns if columns is None else columns)
+        self.column_set = frozenset(self.columns)
+        self.size = self.base_size = len(frame)
+        self._hot = {col: _column(frame[col]) for col in frame.columns if col != INGREDIENTS_COLUMN}
+        if ingredients is None:
+            ingredients = ingredient_csr(frame[INGREDIENTS_COLUMN] if INGREDIENTS_COLUMN in frame else [[]] * len(frame))
+        ptr, ids, vocab = ingredients
+        self.ing_ptr = np.asarray(ptr, dtype=np.int64)
+        self.ing_ids = np.asarray(ids, dtype=np.int32)
+        self.ing_tail = []
+        self.vocab = list(vocab)
+        self.vocab_lower = [str(v).lower() for v in self.vocab]
+        self._vocab_ids = None
+        self._cold_loader = cold_loader
+        self._cold = {}
+        self._cold_tail = {}
+        self._lock = threading.Lock()
+
+    def value(self, pos, key):
+        column = self._hot.get(key)
+        if column is not None:
+            return column[pos]
+        if key == INGREDIENTS_COLUMN:
+            return [self.vocab[i] for i in self.ingredient_ids(pos)]
+        return self._cold_column(key)[pos]
+
+    def ingredient_ids(self, pos):
+        """int32 vocabulary ids of a product's key_ingredients."""
+        if pos >= self.base_size:
+            return self.ing_tail[pos - self.base_size]
+        return self.ing_ids[self.ing_ptr[pos]:self.ing_ptr[pos + 1]]
+
+    def _cold_column(self, key):
+        column = self._cold.get(key)
+        if column is None:
+            if key not in self.column_set:
+                raise KeyError(key)
+            with self._lock:
+                column = self._cold.get(key)
+                if column is None:
+                    values = self._cold_loader(key) if self._cold_loader else None
+                    if values is None:
+                        values = np.full(self.base_size, None, dtype=object)
+                    column = _ArrayColumn(np.asarray(values))
+                    column.tail = self._cold_tail.setdefault(key, [])
+                    self._cold[key] = column
+        return column
+
+    def _intern(self, ingredient):
+        if self._vocab_ids is None:
+            self._vocab_ids = {v: i for i, v in enumerate(self.vocab)}
+        i = self._vocab_ids.get(ingredient)
+        if i is None:
+            i = self._vocab_ids[ingredient] = len(self.vocab)
+            self.vocab_lower.append(str(ingredient).lower())
+            self.vocab.append(ingredient)
+        return i
+
+    def truncate(self, size):
+        """
+        Drop appended rows past `size` (left over by a delta that failed half-way). Tails are
+        trimmed even when size is the current size: an append that raised has extended some
+        columns without counting the rows.
+        """
+        keep = max(size, self.base_size) - self.base_size
+        for column in self._hot.values():
+            del column.tail[keep:]
+        for tail in self._cold_tail.values():
+            del tail[keep:]
+        del self.ing_tail[keep:]
+        self.size = min(self.size, self.base_size + keep)
+
+    def append(self, frame):
+        """Add the rows of a product frame (missing columns -> NaN) -> their new records."""
+        start = self.size
+        for col in self.columns:
+            values = frame[col].tolist() if col in frame else [np.nan] * len(frame)
+            if col == INGREDIENTS_COLUMN:
+                self.ing_tail.extend(np.array([self._intern(x) for x in lst], dtype=np.int32)
+                                     for lst in (v if isinstance(v, (list, tuple)) else [] for v in values))
+            elif col in self._hot:
+                self._hot[col].tail.extend(values)
+            else:
+                self._cold_tail.setdefault(col, []).extend(values)
+        self.size += len(frame)
+        return self.records(start)
+
+    def records(self, start=0):
+        return [ProductRecord(self, pos) for pos in range(start, self.size)]
+
+
+class ProductRecord(Mapping):
+    """Read-only view of one product of a ProductStore; dict(record) makes a plain copy."""
+    __slots__ = ("_store", "_pos")
+
+    def __init__(self, store, pos):
+        self._store = store
+        self._pos = pos
+
+    def __getitem__(self, key):
+        return self._store.value(self._pos, key)
+
+    def __iter__(self):
+        return iter(self._store.columns)
+
+    def __len__(self):
+        return len(self._store.columns)
+
+    def __contains__(self, key):
+        return key in self._store.column_set
+
+    def __eq__(self, other):
+        if isinstance(other, ProductRecord):
+            return self._store is other._store and self._pos == other._pos
+        return Mapping.__eq__(self, other)
+
+    def __hash__(self):
+        return hash((id(self._store), self._pos))
+
+    def __reduce__(self):
+        # pickles (e.g. to worker processes) as a plain dict rather than dragging the store along
+        return dict, (dict(self),)
+
+    def __repr__(self):
+        return f"ProductRecord({self._pos}, name={self.get('name')!r})"
+
+    @property
+    def position(self):
+        """Position in product_list."""
+        return self._pos
+
+    @property
+    def ingredient_ids(self):
+        return self._store.ingredient_ids(self._pos)
+
+
+def ingredient_csr(lists):
+    """key_ingredients lists -> (ptr, ids, vocab) with every distinct ingredient string stored once."""
+    lists = [x if isinstance(x, (list, tuple)) else [] for x in lists]
+    ptr = np.zeros(len(lists) + 1, dtype=np.int64)
+    np.cumsum([len(x) for x in lists], out=ptr[1:])
+    ids, vocab = pd.factorize(pd.Series([x for lst in lists for x in lst], dtype=object))
+    return ptr, ids.astype(np.int32), list(vocab)
@@ -0,0 +1,318 @@
+"""
+Standalone HTTP/JSON recommendation service (asyncio, no GUI).
+
+    python recommendation_service.py --host 127.0.0.1 --port 8765
+
+The catalog is loaded once at startup (recommender_engine) and every connection is
+served by the same event loop, with HTTP/1.1 keep-alive. Endpoints:
+- GET  /health     -> {"status": "ok", "products": N}
+- GET  /catalog    -> {"skin_concerns": [...], "ingredients": [...]}
+- GET  /stats      -> query cache counters
+- GET  /metrics    -> per-stage timings in Prometheus text format (enable with --metrics)
+- POST /keywords   {"concerns": [...]} -> {"keywords": [...]}
+- POST /recommend  {"skin_type", "concerns", "avoid_ingredients", "brand_filter",
+                    "category_filter", "sort_by", "limit", "offset"} -> {"message", "products"}
+                   (limit defaults to DEFAULT_LIMIT and may not exceed MAX_LIMIT)
+- POST /similar    {"names": [...], "top_k", "approximate"} -> {"products": [... with "score"], "approximate"}
+                   ("approximate" in the reply: whether the LSH index was used; see --lsh)
+To use more cores, start one process per core with --reuse-port on the same port.
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import logging
+import threading
+from urllib.parse import urlsplit
+
+import metrics
+
+# Fields of a product record that are sent to clients
+PRODUCT_FIELDS = ("name", "brand", "category", "rating", "rating_count", "url", "skin_type", "key_ingredients")
+
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+KEEP_ALIVE_TIMEOUT = 15  # seconds an idle connection is kept open
+DEFAULT_LIMIT = 50  # products per /recommend reply when the request gives no limit
+MAX_LIMIT = 500     # largest accepted limit / top_k (clients page through longer lists)
+
+REASONS = {200: "OK", 204: "No Content", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 411: "Length Required", 413: "Payload Too Large",
+           500: "Internal Server Error"}
+
+CORS_HEADERS = ("Access-Control-Allow-Origin: *\r\n"
+                "Access-Control-Allow-Methods: GET, POST, OPTIONS\r\n"
+                "Access-Control-Allow-Headers: Content-Type\r\n")
+
+engine = None  # recommender_engine, imported by serve() so that importing this module stays cheap
+
+
+def product_to_json(product):
+    """JSON-safe subset of a product record (NaN -> null)."""
+    out = {}
+    for field in PRODUCT_FIELDS:
+        value = product.get(field)
+        if isinstance(value, float) and value != value:
+            value = None
+        out[field] = value
+    return out
+
+
+def _as_list(value, name):
+    """Accept a JSON list of strings or a comma-separated string."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(",") if v.strip()]
+    if isinstance(value, list) and all(isinstance(v, str) for v in value):
+        return value
+    raise ValueError(f"'{name}' must be a list of strings or a comma-separated string")
+
+
+def _as_int(value, name, default, maximum=None):
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise ValueError(f"'{name}' must be a non-negative integer")
+    if maximum is not None and value > maximum:
+        raise ValueError(f"'{name}' must be at most {maximum}")
+    return value
+
+
+def _as_str(value, name, default=None):
+    """Accept a JSON string (or null/missing -> default)."""
+    if value is None:
+        return default
+    if not isinstance(value, str):
+        raise ValueError(f"'{name}' must be a string")
+    return value
+
+
+def handle_recommend(payload):
+    message, products = engine.recommend_products(
+        _as_str(payload.get("skin_type"), "skin_type", "all"),
+        _as_list(payload.get("concerns"), "concerns"),
+        avoid_ingredients=_as_list(payload.get("avoid_ingredients"), "avoid_ingredients"),
+        brand_filter=_as_str(payload.get("brand_filter"), "brand_filter"),
+        category_filter=_as_str(payload.get("category_filter"), "category_filter"),
+        sort_by=_as_str(payload.get("sort_by"), "sort_by") or "rating",
+        limit=_as_int(payload.get("limit"), "limit", DEFAULT_LIMIT, MAX_LIMIT),
+        offset=_as_int(payload.get("offset"), "offset", 0))
+    return {"message": message, "products": [product_to_json(p) for p in products]}
+
+
+def handle_similar(payload):
+    names = _as_list(payload.get("names"), "names")
+    if not names:
+        raise ValueError("'names' must name at least one product")
+    approximate = bool(payload.get("approximate")) and "lsh" in engine.catalog_state["similarity"]
+    matches = engine.more_like_this(names, top_k=_as_int(payload.get("top_k"), "top_k", 10, MAX_LIMIT),
+                                    approximate=approximate)
+    return {"products": [dict(product_to_json(p), score=round(score, 4)) for p, score in matches],
+            "approximate": approximate}
+
+
+def handle_keywords(payload):
+    keywords = engine.derive_ingredient_keywords_from_concerns(_as_list(payload.get("concerns"), "concerns"))
+    return {"keywords": sorted(keywords)}
+
+
+GET_ROUTES = {
+    "/health": lambda: {"status": "ok", "products": engine.live_product_count(),
+                        "catalog_version": engine.catalog_state["version"]},
+    "/catalog": lambda: {"skin_concerns": engine.skin_concerns, "ingredients": [str(i) for i in engine.ingredients]},
+    "/stats": lambda: engine.cache_stats(),
+    "/metrics": lambda: metrics.to_prometheus(),
+}
+POST_ROUTES = {
+    "/recommend": handle_recommend,
+    "/keywords": handle_keywords,
+    "/similar": handle_similar,
+}
+
+
+def route(method, path, body):
+    """Dispatch one request -> (status, JSON-able payload or None)."""
+    if method == "OPTIONS":
+        return 204, None
+    if path in GET_ROUTES:
+        if method != "GET":
+            return 405, {"error": f"{path} only accepts GET"}
+        return 200, GET_ROUTES[path]()
+    if path in POST_ROUTES:
+        if method != "POST":
+            return 405, {"error": f"{path} only accepts POST"}
+        try:
+            payload = json.loads(body or b"{}")
+            if not isinstance(payload, dict):
+                raise ValueError("request body must be a JSON object")
+            return 200, POST_ROUTES[path](payload)
+        except ValueError as e:
+            return 400, {"error": str(e)}
+    return 404, {"error": f"unknown path {path}"}
+
+
+def encode_response(status, payload, keep_alive):
+    """JSON-encode payload (str payloads are sent as-is as text/plain, e.g. /metrics)."""
+    if isinstance(payload, str):
+        body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+    else:
+        body, content_type = b"" if payload is None else json.dumps(payload).encode("utf-8"), "application/json"
+    head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            f"{CORS_HEADERS}\r\n")
+    return head.encode("latin-1") + body
+
+
+async def handle_connection(reader, writer):
+    """Serve requests on one connection until the client closes it, asks to, or idles out."""
+    try:
+        while True:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_TIMEOUT)
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+                break
+            request_line, *header_lines = head.decode("latin-1").rstrip("\r\n").split("\r\n")
+            headers = {}
+            for line in header_lines:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            try:
+                method, target, version = request_line.split(" ", 2)
+                length = int(headers.get("content-length") or 0)
+            except ValueError:
+                writer.write(encode_response(400, {"error": "malformed request"}, False))
+                break
+            if "transfer-encoding" in headers:
+                # bodies are only framed by Content-Length: a chunked body would be left on the
+                # connection and read as the next request
+                writer.write(encode_response(411, {"error": "send the body with Content-Length"}, False))
+                break
+            if length > MAX_BODY_BYTES:
+                writer.write(encode_response(413, {"error": "request body too large"}, False))
+                break
+            try:
+                body = await reader.readexactly(length) if length else b""
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+
+            connection = headers.get("connection", "").lower()
+            keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+            path = urlsplit(target).path
+            known = path if path in GET_ROUTES or path in POST_ROUTES else "other"
+            with metrics.stage("request", path=known) as st:
+                try:
+                    status, payload = route(method, path, body)
+                except Exception:
+                    # details go to the server log, not to the client
+                    logging.getLogger("skincare.service").exception("%s %s failed", method, path)
+                    status, payload = 500, {"error": "internal server error"}
+                st.record(request_bytes=length)
+            metrics.inc("responses_total", path=known, status=status)
+            writer.write(encode_response(status, payload, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    finally:
+        writer.close()
+
+
+async def serve(host="127.0.0.1", port=8765, reuse_port=False, watch=None, lsh=False):
+    """
+    Run the service; watch=SECONDS polls the catalog CSV and its delta directory for changes,
+    lsh=True builds the LSH index used by approximate /similar queries.
+    """
+    global engine
+    import recommender_engine
+    engine = recommender_engine
+    if lsh:
+        engine.enable_lsh()
+    if watch:
+        engine.CatalogWatcher(interval=watch).start()
+    server = await asyncio.start_server(handle_connection, host, port,
+                                        limit=MAX_HEADER_BYTES, reuse_port=reuse_port or None)
+    print(f"Serving {engine.live_product_count()} products on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+# ---------------------------
+# Client (used by the Tk app when RECOMMENDER_SERVICE_URL is set)
+# ---------------------------
+class RecommendationClient:
+    """
+    Thin keep-alive client exposing the same names the GUI uses from recommender_engine:
+    recommend_products, derive_ingredient_keywords_from_concerns, skin_concerns and ingredients.
+    """
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self._conn = None
+        self._lock = threading.Lock()
+        catalog = self._request("GET", "/catalog")
+        self.skin_concerns = catalog["skin_concerns"]
+        self.ingredients = catalog["ingredients"]
+
+    def _request(self, method, path, payload=None):
+        body = None if payload is None else json.dumps(payload).encode("utf-8")
+        with self._lock:
+            for attempt in (0, 1):
+                if self._conn is None:
+                    self._conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+                try:
+                    self._conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+                    response = self._conn.getresponse()
+                    data = json.loads(response.read() or b"null")
+                    break
+                except (http.client.HTTPException, ConnectionError):
+                    # the server closed an idle keep-alive connection: reconnect once
+                    self._conn.close()
+                    self._conn = None
+                    if attempt:
+                        raise
+        if response.status != 200:
+            raise RuntimeError(f"{method} {path} failed: {data.get('error') if isinstance(data, dict) else response.status}")
+        return data
+
+    def recommend_products(self, skin_type, concerns, avoid_ingredients=None, brand_filter=None,
+                           category_filter=None, sort_by="rating", limit=None, offset=0):
+        """Same contract as the engine's: pages longer (or unlimited) requests MAX_LIMIT products at a time."""
+        query = {"skin_type": skin_type, "concerns": list(concerns),
+                 "avoid_ingredients": list(avoid_ingredients or []),
+                 "brand_filter": brand_filter, "category_filter": category_filter, "sort_by": sort_by}
+        message, products = None, []
+        while message is None or limit is None or len(products) < limit:
+            page = MAX_LIMIT if limit is None else min(MAX_LIMIT, limit - len(products))
+            data = self._request("POST", "/recommend", dict(query, limit=page, offset=offset + len(products)))
+            message = data["message"] if message is None else message
+            products += data["products"]
+            if len(data["products"]) < page:
+                break
+        return message, products
+
+    def derive_ingredient_keywords_from_concerns(self, concerns):
+        return set(self._request("POST", "/keywords", {"concerns": list(concerns)})["keywords"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Skincare recommendation HTTP service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--reuse-port", action="store_true", help="allow several service processes on one port")
+    parser.add_argument("--metrics", action="store_true", help="record per-stage timings (also SKINCARE_METRICS=1)")
+    parser.add_argument("--metrics-log", type=float, metavar="SECONDS",
+                        help="print a metrics summary line to stderr every SECONDS")
+    parser.add_argument("--watch", type=float, metavar="SECONDS",
+                        help="apply catalog changes (delta files, appended CSV rows) every SECONDS without restarting")
+    parser.add_argument("--lsh", action="store_true",
+                        help="build the LSH index for approximate /similar queries (also SKINCARE_LSH_MIN_PRODUCTS=N)")
+    args = parser.parse_args()
+    if args.metrics or args.metrics_log:
+        metrics.enable()
+    if args.metrics_log:
+        metrics.PeriodicExporter([metrics.stream_exporter()], interval=args.metrics_log).start()
+    asyncio.run(serve(args.host, args.port, args.reuse_port, args.watch, args.lsh))
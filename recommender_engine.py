@@ -0,0 +1,1680 @@
+"""
+Headless recommendation engine: catalog loading, ingredient indexes, scoring and caches.
+
+Importing this module loads the catalog once (from the compiled snapshot when it is fresh).
+It has no GUI dependencies, so the Tk app (group14_source_code.py), the HTTP service
+(recommendation_service.py) and offline jobs all share it.
+"""
+import pandas as pd
+import numpy as np
+import ast
+import os
+import json
+import shutil
+import hashlib
+import uuid
+import io
+import itertools
+import logging
+import threading
+import time
+import warnings
+import multiprocessing as mp
+from collections import OrderedDict
+
+import metrics
+import good_stuff_model
+import product_records
+
+# ---------------------------
+# Compiled catalog snapshot (skips CSV parsing and eval() on startup)
+# ---------------------------
+# The snapshot is a directory of .npy arrays plus a manifest.json fingerprinting the CSV.
+# String columns are stored factorized (int32 codes + one UTF-8 blob of the distinct values),
+# numeric columns as plain arrays opened with mmap, and key_ingredients as CSR arrays of
+# interned ingredient ids. The columnar/ subdirectory adds the columnar_catalog arrays, with
+# the trigram table of every factorized field, so a warm start builds no index at all; its own
+# manifest.json names the CSV (SHA-1) and Good_Stuff model the frame it was built from came from.
+# It is rebuilt only when the CSV content changes (size/mtime are compared first; the SHA-1
+# is only recomputed when they differ). Writers build in a private temp directory and publish
+# it with renames, so concurrent processes never write into, or read, a half-built snapshot.
+SNAPSHOT_VERSION = 3
+# temp directories left behind by a writer that died are removed by the next writer after this long
+STALE_TMP_SECONDS = 3600
+
+def _csv_sha1(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _save_strings(prefix, strings):
+    offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+    np.cumsum([len(x) for x in strings], out=offsets[1:])
+    np.save(prefix + ".offsets.npy", offsets)
+    with open(prefix + ".utf8", "wb") as f:
+        f.write("".join(strings).encode("utf-8"))
+
+def _load_strings(prefix):
+    offsets = np.load(prefix + ".offsets.npy").tolist()
+    with open(prefix + ".utf8", "rb") as f:
+        blob = f.read().decode("utf-8")
+    return [blob[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+
+def _save_codes(prefix, codes, values):
+    np.save(prefix + ".codes.npy", np.asarray(codes, dtype=np.int32))
+    _save_strings(prefix, [str(v) for v in values])
+
+def _write_json(path, obj):
+    """json.dump to path through a temp file in the same directory, so readers see the old or the new file."""
+    tmp = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:12]}.tmp"
+    try:
+        with open(tmp, "x", encoding="utf-8") as f:
+            json.dump(obj, f)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+def _new_tmp_dir(target):
+    """Create a temp directory next to `target`, private to this writer (and clear stale ones of dead writers)."""
+    parent, base = os.path.split(os.path.abspath(target))
+    now = time.time()
+    for name in os.listdir(parent):
+        if name.startswith(base + ".") and name.endswith((".tmp", ".old")):
+            path = os.path.join(parent, name)
+            try:
+                if now - os.stat(path).st_mtime > STALE_TMP_SECONDS:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
+    tmp_dir = os.path.join(parent, f"{base}.{os.getpid()}.{uuid.uuid4().hex[:12]}.tmp")
+    os.mkdir(tmp_dir)  # never recreates a parent another writer just moved aside
+    return tmp_dir
+
+def _publish_dir(tmp_dir, target):
+    """
+    Replace the directory `target` by the fully written tmp_dir. Both steps are single renames:
+    the old directory is moved aside, then tmp_dir takes its name. Readers see the old or the new
+    snapshot (or, for that instant, none, and rebuild). If another writer published in between,
+    its snapshot is kept and tmp_dir is dropped.
+    """
+    old = tmp_dir[:-len(".tmp")] + ".old"
+    try:
+        os.rename(target, old)
+    except FileNotFoundError:
+        old = None
+    try:
+        os.rename(tmp_dir, target)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.isdir(target):
+            raise
+    if old is not None:
+        shutil.rmtree(old, ignore_errors=True)
+
+def _snapshot_is_fresh(snapshot_dir, csv_path):
+    """True when the snapshot was compiled from the CSV as it is now (refreshing the stored mtime if only it changed)."""
+    manifest_path = os.path.join(snapshot_dir, "manifest.json")
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if manifest.get("version") != SNAPSHOT_VERSION:
+        return False
+    st = os.stat(csv_path)
+    if manifest.get("csv_size") == st.st_size and manifest.get("csv_mtime_ns") == st.st_mtime_ns:
+        return True
+    if manifest.get("csv_size") != st.st_size or manifest.get("csv_sha1") != _csv_sha1(csv_path):
+        return False
+    manifest["csv_mtime_ns"] = st.st_mtime_ns
+    try:
+        _write_json(manifest_path, manifest)
+    except OSError:
+        pass  # read-only location: the SHA-1 is compared again next time
+    return True
+
+def write_frame_snapshot(frame, snapshot_dir, csv_path):
+    """Compile a preprocessed skin_data frame into snapshot_dir (written to a private temp dir, then swapped in)."""
+    tmp_dir = _new_tmp_dir(snapshot_dir)
+    try:
+        _write_frame_files(frame, tmp_dir, csv_path)
+        _publish_dir(tmp_dir, snapshot_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+def _write_frame_files(frame, tmp_dir, csv_path):
+    os.makedirs(os.path.join(tmp_dir, "frame"))
+    columns = []
+    for i, col in enumerate(frame.columns):
+        prefix = os.path.join(tmp_dir, "frame", f"col{i}")
+        series = frame[col]
+        if col == "key_ingredients":
+            kind = "ingredients"
+            lists = series.tolist()
+            codes, vocab = pd.factorize(pd.Series([str(x) for lst in lists for x in lst], dtype=object))
+            ptr = np.zeros(len(lists) + 1, dtype=np.int64)
+            np.cumsum([len(lst) for lst in lists], out=ptr[1:])
+            np.save(prefix + ".ptr.npy", ptr)
+            _save_codes(prefix, codes, vocab)
+        elif pd.api.types.is_numeric_dtype(series.dtype):
+            kind = "numeric"
+            np.save(prefix + ".npy", series.to_numpy())
+        else:
+            kind = "strings"
+            codes, values = pd.factorize(series)
+            _save_codes(prefix, codes, values)
+        columns.append({"name": col, "kind": kind})
+    st = os.stat(csv_path)
+    manifest = {"version": SNAPSHOT_VERSION, "csv_size": st.st_size, "csv_mtime_ns": st.st_mtime_ns,
+                "csv_sha1": _csv_sha1(csv_path), "columns": columns, "attrs": frame.attrs}
+    _write_json(os.path.join(tmp_dir, "manifest.json"), manifest)
+
+def read_frame_snapshot(snapshot_dir, columns=None):
+    """
+    Load the preprocessed skin_data frame from a snapshot (numeric columns memory-mapped).
+    - columns: read only these columns (default: all); the full column list is in frame.attrs["columns"]
+    """
+    with open(os.path.join(snapshot_dir, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    data = {}
+    for i, column in enumerate(manifest["columns"]):
+        if columns is not None and column["name"] not in columns:
+            continue
+        prefix = os.path.join(snapshot_dir, "frame", f"col{i}")
+        if column["kind"] == "ingredients":
+            vocab = _load_strings(prefix)
+            ids = np.load(prefix + ".codes.npy", mmap_mode="r").tolist()
+            ptr = np.load(prefix + ".ptr.npy").tolist()
+            data[column["name"]] = [[vocab[j] for j in ids[ptr[r]:ptr[r + 1]]] for r in range(len(ptr) - 1)]
+        elif column["kind"] == "strings":
+            codes = np.load(prefix + ".codes.npy", mmap_mode="r")
+            data[column["name"]] = pd.Categorical.from_codes(codes, _load_strings(prefix))
+        else:
+            data[column["name"]] = np.load(prefix + ".npy", mmap_mode="r")
+    frame = pd.DataFrame(data)
+    frame.attrs = dict(manifest.get("attrs", {}), csv_sha1=manifest.get("csv_sha1"),
+                       columns=[c["name"] for c in manifest["columns"]])
+    return frame
+
+def read_snapshot_ingredients(snapshot_dir):
+    """key_ingredients straight from the snapshot as (ptr, ingredient ids, vocabulary), without building lists."""
+    with open(os.path.join(snapshot_dir, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    for i, column in enumerate(manifest["columns"]):
+        if column["kind"] == "ingredients":
+            prefix = os.path.join(snapshot_dir, "frame", f"col{i}")
+            return np.load(prefix + ".ptr.npy"), np.load(prefix + ".codes.npy", mmap_mode="r"), _load_strings(prefix)
+    return None
+
+def snapshot_column_loader(snapshot_dir):
+    """Loader for cold columns of the snapshot as it is now (once the snapshot is rebuilt it returns None: values unavailable)."""
+    manifest_path = os.path.join(snapshot_dir, "manifest.json")
+    with open(manifest_path, encoding="utf-8") as f:
+        sha1 = json.load(f).get("csv_sha1")
+
+    def load(column):
+        try:
+            with open(manifest_path, encoding="utf-8") as f:
+                if json.load(f).get("csv_sha1") != sha1:
+                    return None
+            frame = read_frame_snapshot(snapshot_dir, [column])
+        except (OSError, ValueError):
+            return None
+        return frame[column].to_numpy() if column in frame else None
+    return load
+
+def columnar_source(frame):
+    """What a columnar_catalog built from this frame depends on: the CSV content and the Good_Stuff model."""
+    return {"csv_sha1": frame.attrs.get("csv_sha1"), "good_stuff_model": frame.attrs.get("good_stuff_model")}
+
+def write_columnar_snapshot(cat, snapshot_dir, source):
+    """
+    Add the columnar_catalog arrays to an existing snapshot (written to a private temp dir, then swapped in).
+    - source: columnar_source() of the frame cat was built from, stored in columnar/manifest.json
+    """
+    columnar = os.path.join(snapshot_dir, "columnar")
+    tmp_dir = _new_tmp_dir(columnar)
+    try:
+        _write_columnar_files(cat, tmp_dir)
+        _write_json(os.path.join(tmp_dir, "manifest.json"), source)
+        _publish_dir(tmp_dir, columnar)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+def _write_columnar_files(cat, tmp_dir):
+    for key, value in cat.items():
+        if isinstance(value, dict):
+            prefix = os.path.join(tmp_dir, key)
+            _save_codes(prefix, value["codes"], value["values"])
+            index = value["index"]
+            _save_strings(prefix + ".grams", index.grams)
+            np.save(prefix + ".gram_ptr.npy", index.gram_ptr)
+            np.save(prefix + ".gram_ids.npy", index.gram_ids)
+        elif isinstance(value, np.ndarray):
+            np.save(os.path.join(tmp_dir, key + ".npy"), value)
+
+def read_columnar_snapshot(snapshot_dir, source):
+    """Load columnar_catalog from a snapshot, or None if it has not been written yet or was built from another `source`."""
+    col_dir = os.path.join(snapshot_dir, "columnar")
+    try:
+        with open(os.path.join(col_dir, "manifest.json"), encoding="utf-8") as f:
+            if json.load(f) != source:
+                return None
+    except (OSError, ValueError):
+        return None
+    cat = {}
+    for fname in os.listdir(col_dir):
+        if fname.endswith(".codes.npy"):
+            key = fname[:-len(".codes.npy")]
+            prefix = os.path.join(col_dir, key)
+            values = _load_strings(prefix)
+            table = (_load_strings(prefix + ".grams"),
+                     np.load(prefix + ".gram_ptr.npy"), np.load(prefix + ".gram_ids.npy"))
+            cat[key] = {"codes": np.load(os.path.join(col_dir, fname), mmap_mode="r"),
+                        "values": values,
+                        "index": SubstringIndex(values, table=table)}
+        elif fname.endswith(".npy") and not fname.endswith((".offsets.npy", ".gram_ptr.npy", ".gram_ids.npy")):
+            cat[fname[:-len(".npy")]] = np.load(os.path.join(col_dir, fname), mmap_mode="r")
+    cat["size"] = len(cat["rating"])
+    return cat
+
+# ---------------------------
+# Load dataset (original behavior preserved)
+# ---------------------------
+script_dir = os.path.dirname(os.path.abspath(__file__))
+# SKINCARE_CATALOG_CSV points the engine at another catalog (the snapshot is kept next to it)
+file_path = os.environ.get("SKINCARE_CATALOG_CSV") or os.path.join(script_dir, 'skindataall.csv')
+snapshot_path = os.path.splitext(file_path)[0] + '.snapshot'
+# Delta CSVs applied on top of the catalog (see apply_delta), replayed in file name order on load
+delta_dir = os.path.splitext(file_path)[0] + '.deltas'
+
+def preprocess_skin_data(frame, encoders=None, prior=None):
+    """
+    Review-level CSV rows -> one preprocessed record per product.
+    - encoders / prior: the catalog's Good_Stuff encoder classes and mean rating, when the rows
+      are a delta applied on top of an already loaded catalog (default: fitted on `frame`)
+    """
+    # Good_Stuff model: one predict_proba over every review row, on the original column names
+    model = good_stuff_model.load_model()
+    if encoders is None:
+        encoders = good_stuff_model.fit_encoders(frame)
+    if model is not None:
+        features = good_stuff_model.feature_matrix(frame, encoders)
+        frame = frame.assign(good_stuff_prob=good_stuff_model.positive_proba(model, features))
+
+    # Keep original column mapping & preprocessing (unchanged)
+    frame = frame.rename(columns={
+        "Product": "name",
+        "Brand": "brand",
+        "Skin_Type": "skin_type",
+        "Category": "category",
+        "Ingredients_Cleaned": "key_ingredients",
+        "Product_Url": "url",
+        "Good_Stuff": "good_stuff",
+        "Rating_Stars": "rating"
+    })
+
+    frame["skin_type"] = frame["skin_type"].apply(lambda x: x.lower() if isinstance(x, str) else "all")
+    if prior is None:
+        stars = pd.to_numeric(frame["rating"], errors="coerce")
+        prior = float(stars.mean()) if stars.notna().any() else 0.0
+    # one record per product (the CSV has one row per review)
+    frame = aggregate_products(frame, prior)
+    # key_ingredients are Python list literals in the CSV (parsed as literals only: delta files come from a watched directory)
+    frame["key_ingredients"] = frame["key_ingredients"].apply(lambda x: ast.literal_eval(x) if isinstance(x, str) else [])
+    # kept in the snapshot: which model the predictions came from, and the user-side encoder classes
+    frame.attrs = {"good_stuff_model": good_stuff_model.fingerprint(), "rating_prior": prior,
+                   "profile_classes": {col: list(encoders[col]) for col in good_stuff_model.PROFILE_ENCODED if col in encoders}}
+    return frame
+
+# Weight (in reviews) of the catalog-wide mean in the smoothed rating_score
+RATING_PRIOR_REVIEWS = 5
+
+def _join_skin_types(values):
+    distinct = set(values)
+    return "all" if "all" in distinct else "/".join(sorted(distinct))
+
+def aggregate_products(frame, prior=None):
+    """
+    Collapse review-level rows into one record per (name, brand), in first-seen order.
+    - prior: catalog mean rating for rating_score (default: the mean over `frame`)
+    Product columns keep their first value; on top of that each product gets:
+    - rating: mean Rating_Stars, rating_count: number of rated reviews, review_count: number of rows
+    - rating_score: Bayesian-smoothed mean, pulled towards the catalog mean by RATING_PRIOR_REVIEWS
+    - good_stuff_share: fraction of reviews flagged Good_Stuff; good_stuff: 1 when that share is >= 0.5
+    - with Good_Stuff model predictions (good_stuff_prob rows): good_stuff_score, their mean, which
+      then decides good_stuff instead (>= good_stuff_model.GOOD_STUFF_THRESHOLD)
+    - skin_type: "all" if any review had no skin type, else the distinct reviewer skin types joined by "/"
+    - rating_<skin type> / reviews_<skin type>: mean rating and review count per reviewer skin type
+    """
+    keys = ["name", "brand"]
+    stars = pd.to_numeric(frame["rating"], errors="coerce")
+    good = (pd.to_numeric(frame["good_stuff"], errors="coerce") == 1).astype(float)
+    work = frame.assign(_stars=stars, _good=good)
+    grouped = work.groupby(keys, sort=False, dropna=False)
+
+    products = grouped.first()
+    products["rating_count"] = grouped["_stars"].count()
+    products["review_count"] = grouped.size()
+    star_sum = grouped["_stars"].sum()
+    products["rating"] = (star_sum / products["rating_count"]).round(2)
+    if prior is None:
+        prior = stars.mean() if stars.notna().any() else 0.0
+    products["rating_score"] = (RATING_PRIOR_REVIEWS * prior + star_sum) / (RATING_PRIOR_REVIEWS + products["rating_count"])
+    products["good_stuff_share"] = grouped["_good"].mean()
+    products["good_stuff"] = (products["good_stuff_share"] >= 0.5).astype(int)
+    if "good_stuff_prob" in frame:
+        products["good_stuff_score"] = grouped["good_stuff_prob"].mean()
+        products["good_stuff"] = (products["good_stuff_score"] >= good_stuff_model.GOOD_STUFF_THRESHOLD).astype(int)
+        products = products.drop(columns=["good_stuff_prob"])
+    products["skin_type"] = grouped["skin_type"].agg(_join_skin_types)
+
+    by_skin = work.groupby(keys + ["skin_type"], sort=False, dropna=False)["_stars"].agg(["mean", "size"]).unstack("skin_type")
+    for skin in sorted(work["skin_type"].unique()):
+        products[f"rating_{skin}"] = by_skin[("mean", skin)].reindex(products.index).round(2)
+        products[f"reviews_{skin}"] = by_skin[("size", skin)].reindex(products.index).fillna(0).astype(int)
+
+    return products.drop(columns=["_stars", "_good"]).reset_index()
+
+def load_skin_data(csv_path, snapshot_dir, columns=None):
+    """
+    Preprocessed skin_data, read from the compiled snapshot when it is fresh, else from the CSV (then compiled).
+    - columns: read only these from the snapshot (a frame rebuilt from the CSV has them all)
+    frame.attrs["csv_sha1"] is the SHA-1 of the CSV the frame was compiled from.
+    """
+    try:
+        if _snapshot_is_fresh(snapshot_dir, csv_path):
+            frame = read_frame_snapshot(snapshot_dir, columns)
+            # predictions are cached in the snapshot: recompute when the model file changed
+            if frame.attrs.get("good_stuff_model") == good_stuff_model.fingerprint():
+                return frame
+    except Exception:
+        pass  # unreadable snapshot: rebuild from the CSV below
+    sha1 = _csv_sha1(csv_path)  # before parsing: if the CSV changes meanwhile, the next load sees a mismatch
+    frame = preprocess_skin_data(pd.read_csv(csv_path))
+    frame.attrs["csv_sha1"] = sha1
+    try:
+        write_frame_snapshot(frame, snapshot_dir, csv_path)
+    except (OSError, ValueError):
+        pass  # read-only location: run without a snapshot
+    return frame
+
+# Columns kept in memory for every product (ranking, filters, the GUI, the service and the
+# Good_Stuff model read these). key_ingredients live in the ProductStore as interned ids; the
+# other columns (per-skin-type breakdowns, review text, ...) are read from the snapshot on demand.
+HOT_COLUMNS = ("name", "brand", "category", "skin_type", "url", "Product_id", "Rating", "Price",
+               "rating", "rating_count", "review_count", "rating_score",
+               "good_stuff", "good_stuff_share", "good_stuff_score")
+
+def load_catalog(csv_path, snapshot_dir):
+    """(skin_data with only the HOT_COLUMNS, ProductStore behind product_list) for a catalog CSV."""
+    frame = load_skin_data(csv_path, snapshot_dir, HOT_COLUMNS)
+    attrs = dict(frame.attrs)
+    columns = attrs.pop("columns", None)
+    if columns is not None:  # read from the snapshot
+        ingredients = read_snapshot_ingredients(snapshot_dir)
+        cold_loader = snapshot_column_loader(snapshot_dir)
+    else:
+        columns = list(frame.columns)
+        ingredients = product_records.ingredient_csr(frame["key_ingredients"])
+        try:
+            cold_loader = snapshot_column_loader(snapshot_dir) if _snapshot_is_fresh(snapshot_dir, csv_path) else None
+        except OSError:
+            cold_loader = None
+        if cold_loader is None:  # no snapshot written: keep the cold columns in memory
+            cold = frame.drop(columns=[c for c in HOT_COLUMNS if c in frame] + ["key_ingredients"])
+            cold_loader = lambda col: cold[col].to_numpy() if col in cold else None
+    hot = frame[[c for c in HOT_COLUMNS if c in frame]]
+    hot.attrs = attrs
+    store = product_records.ProductStore(hot, columns=columns, ingredients=ingredients, cold_loader=cold_loader)
+    return hot, store
+
+skin_data, product_store = load_catalog(file_path, snapshot_path)
+product_list = product_store.records()
+
+# Supported concerns and ingredients (original)
+skin_concerns = ["acne", "dark circles", "dryness", "redness", "pores", "oiliness", "sensitivity", "hyperpigmentation", "wrinkles"]
+ingredients = sorted(set(product_store.vocab))
+
+# ---------------------------
+# Inverted ingredient index (built once at load)
+# ---------------------------
+NGRAM_SIZE = 3
+GRAM_SCAN_SIZE = 64
+
+def _trigram_table(values):
+    """(gram strings, ptr, ids): CSR table of the positions in `values` of the strings containing each trigram."""
+    postings = {}
+    for i, s in enumerate(values):
+        for gram in {s[j:j + NGRAM_SIZE] for j in range(len(s) - NGRAM_SIZE + 1)}:
+            postings.setdefault(gram, []).append(i)
+    grams = list(postings)
+    ptr = np.zeros(len(grams) + 1, dtype=np.int64)
+    np.cumsum([len(postings[g]) for g in grams], out=ptr[1:])
+    ids = np.fromiter((i for g in grams for i in postings[g]), dtype=np.int32, count=int(ptr[-1]))
+    return grams, ptr, ids
+
+class SubstringIndex:
+    """
+    Substring lookup over the distinct values of a factorized field -> value ids (codes).
+    A trigram table (CSR arrays, stored in the snapshot next to the values) narrows
+    `sub in s` checks down to a few candidates, so partial matches behave exactly like
+    the old linear scan.
+    - first_id: code of values[0] (delta tails continue the base codes)
+    - table: a ready _trigram_table(values) (optional; built when omitted)
+    """
+    def __init__(self, values, first_id=0, table=None):
+        self.values = list(values)
+        self.first_id = first_id
+        self.grams, self.gram_ptr, self.gram_ids = _trigram_table(self.values) if table is None else table
+        self._gram_slots = None
+        self._codes = None
+
+    def code(self, value):
+        """Code of an exact value, or None when it is not indexed."""
+        if self._codes is None:
+            self._codes = {v: i for i, v in enumerate(self.values, self.first_id)}
+        return self._codes.get(value)
+
+    def lookup(self, sub):
+        """Sorted array of the codes of values that contain `sub`."""
+        values = self.values
+        if len(sub) < NGRAM_SIZE:
+            hits = [i for i, s in enumerate(values) if sub in s]
+        else:
+            if self._gram_slots is None:
+                self._gram_slots = {g: k for k, g in enumerate(self.grams)}
+            candidates = []
+            for j in range(len(sub) - NGRAM_SIZE + 1):
+                k = self._gram_slots.get(sub[j:j + NGRAM_SIZE])
+                if k is None:
+                    return np.zeros(0, dtype=np.int64)
+                candidates.append(self.gram_ids[self.gram_ptr[k]:self.gram_ptr[k + 1]])
+            candidates.sort(key=len)
+            cands = candidates[0]
+            for other in candidates[1:]:
+                if len(cands) <= GRAM_SCAN_SIZE:
+                    break  # checking a few strings directly beats another intersection
+                cands = np.intersect1d(cands, other, assume_unique=True)
+            hits = [i for i in cands.tolist() if sub in values[i]]
+        return np.asarray(hits, dtype=np.int64) + self.first_id
+
+    def matching_strings(self, sub):
+        """Distinct indexed strings that contain `sub`."""
+        return [self.values[i - self.first_id] for i in self.lookup(sub).tolist()]
+
+class LayeredIndex:
+    """
+    SubstringIndex interface over a large `base` index and a small `tail` one holding the
+    values added by catalog deltas, so applying a delta never re-indexes the base.
+    """
+    def __init__(self, base, tail):
+        self.base, self.tail = base, tail
+
+    def code(self, value):
+        code = self.base.code(value)
+        return self.tail.code(value) if code is None else code
+
+    def matching_strings(self, sub):
+        return self.base.matching_strings(sub) + self.tail.matching_strings(sub)
+
+    def lookup(self, sub):
+        return np.concatenate([self.base.lookup(sub), self.tail.lookup(sub)])
+
+# ---------------------------
+# Query caches (invalidated on catalog reload)
+# ---------------------------
+RESULT_CACHE_SIZE = 512
+RESULT_CACHE_TTL = 300  # seconds
+KEYWORD_CACHE_SIZE = 1024
+
+class QueryCache:
+    """
+    Thread-safe LRU cache with an optional time-to-live, plus hit/miss/eviction counters.
+    get() returns None on a miss, so None must not be stored as a value.
+    """
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._data[key]
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+result_cache = QueryCache(RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+keyword_cache = QueryCache(KEYWORD_CACHE_SIZE)
+
+def cache_stats():
+    """Counters for the recommendation result cache and the concern -> keyword memo."""
+    return {"results": result_cache.stats(), "keywords": keyword_cache.stats()}
+
+def invalidate_caches():
+    result_cache.clear()
+    keyword_cache.clear()
+
+# Serializes catalog writers (reload_catalog, apply_delta); readers never take it
+_catalog_lock = threading.RLock()
+
+def reload_catalog(csv_path=None):
+    """
+    Reload skin_data (snapshot or CSV), rebuild every structure derived from it, replay the
+    catalog's delta files and publish the result as a new catalog_state (dropping cached query results).
+    - csv_path: switch to another catalog CSV (optional; defaults to the current one)
+    """
+    global file_path, snapshot_path, delta_dir
+    with _catalog_lock:
+        if csv_path:
+            file_path = csv_path
+            snapshot_path = os.path.splitext(csv_path)[0] + '.snapshot'
+            delta_dir = os.path.splitext(csv_path)[0] + '.deltas'
+        frame, store = load_catalog(file_path, snapshot_path)
+        products = store.records()
+        cat = load_columnar_catalog(frame, snapshot_path, store)
+        _publish(new_catalog_state(
+            frame, store, products, sorted(set(store.vocab)), cat,
+            build_similarity_index(cat, lsh_tables=_lsh_tables_for(cat, keep="lsh" in catalog_state["similarity"]))))
+        apply_pending_deltas()
+
+# ---------------------------
+# Concern -> ingredient mapping (enhancement)
+# ---------------------------
+# This mapping helps the recommender expand a concern into ingredient keywords.
+CONCERN_TO_INGREDIENTS = {
+    "acne": ["salicylic", "benzoyl", "niacinamide", "tea tree", "sulfur"],
+    "dark circles": ["caffeine", "retinol", "vitamin c", "niacinamide", "hyaluronic"],
+    "dryness": ["hyaluronic", "glycerin", "shea", "ceramide", "squalane"],
+    "redness": ["aloe", "centella", "green tea", "niacinamide", "azelaic"],
+    "pores": ["niacinamide", "salicylic", "retinol", "clay"],
+    "oiliness": ["salicylic", "clay", "niacinamide", "zinc"],
+    "sensitivity": ["aloe", "oat", "centella", "chamomile", "ceramide"],
+    "hyperpigmentation": ["vitamin c", "niacinamide", "azelaic", "licorice"],
+    "wrinkles": ["retinol", "peptide", "collagen", "vitamin c"]
+}
+
+def derive_ingredient_keywords_from_concerns(concerns, state=None):
+    """
+    Return a set of ingredient keyword strings derived from concerns and dataset ingredients.
+    - state: catalog_state whose ingredients are searched (default: the current one)
+    """
+    state = catalog_state if state is None else state
+    key = (state["version"], frozenset(c.strip().lower() for c in concerns))
+    keywords = keyword_cache.get(key)
+    if keywords is None:
+        keywords = frozenset(_derive_ingredient_keywords(concerns, state["columnar"]["ingredients"]["index"]))
+        keyword_cache.put(key, keywords)
+    return set(keywords)
+
+def _derive_ingredient_keywords(concerns, vocab_index):
+    """
+    - vocab_index: SubstringIndex over the lowercased distinct ingredients
+      (columnar_catalog["ingredients"]["index"]), so a concern is matched via its trigrams
+    """
+    keywords = set()
+    for c in concerns:
+        c_norm = c.strip().lower()
+        # mapping-based
+        for mapped in CONCERN_TO_INGREDIENTS.get(c_norm, []):
+            keywords.add(mapped.lower())
+        # find ingredients in dataset that contain the concern word (partial match)
+        keywords.update(vocab_index.matching_strings(c_norm))
+    # fallback to the concerns themselves if no mapping found
+    if not keywords:
+        for c in concerns:
+            if c.strip():
+                keywords.add(c.strip().lower())
+    return keywords
+
+# ---------------------------
+# Enhanced recommendation engine (keeps original fallback)
+# ---------------------------
+def normalize_query(skin_type, concerns,
+                    avoid_ingredients=None,
+                    brand_filter=None,
+                    category_filter=None,
+                    sort_by="rating"):
+    """
+    Hashable, order-independent form of a recommend_products query:
+    (skin_type, sorted concerns, sorted unique avoid list, brand, category, sort_by).
+    Queries with equal keys always get the same results; skin_type is stripped and lowercased
+    (a missing one means "all"), since product skin types are matched in lowercase.
+    """
+    skin_type = "all" if skin_type is None else str(skin_type).strip().lower()
+    concerns = [c.strip().lower() for c in concerns if c and c.strip()]
+    avoid_ingredients = [a.strip().lower() for a in (avoid_ingredients or []) if a and a.strip()]
+    brand_filter = brand_filter.strip().lower() if isinstance(brand_filter, str) and brand_filter.strip() else None
+    category_filter = category_filter.strip().lower() if isinstance(category_filter, str) and category_filter.strip() else None
+    return (skin_type, tuple(sorted(concerns)), tuple(sorted(set(avoid_ingredients))),
+            brand_filter, category_filter, sort_by)
+
+def recommend_products(skin_type, concerns,
+                       avoid_ingredients=None,
+                       brand_filter=None,
+                       category_filter=None,
+                       sort_by="rating",
+                       limit=None,
+                       offset=0):
+    """
+    Enhanced recommender (returns same type of results as original):
+    - skin_type: string (e.g., 'oily', 'all')
+    - concerns: list of concern strings
+    - avoid_ingredients: list of strings to avoid (optional)
+    - brand_filter: partial brand name to restrict to (optional)
+    - category_filter: partial category to restrict to (optional)
+    - sort_by: "rating", "brand", or "relevance"
+    - limit: return at most this many products (optional; only the requested page is sorted)
+    - offset: number of leading results to skip, for pagination (optional)
+    Returns: (message, list_of_products)
+    Repeated queries are answered from result_cache. The whole query reads one catalog_state,
+    so a delta published meanwhile never mixes into its results.
+    """
+    state = catalog_state
+    query = normalize_query(skin_type, concerns, avoid_ingredients, brand_filter, category_filter, sort_by)
+    key = (state["version"], query, limit, offset)
+    cached = result_cache.get(key)
+    if cached is not None:
+        metrics.inc("result_cache_total", result="hit")
+        message, products = cached
+        return message, list(products)
+    metrics.inc("result_cache_total", result="miss")
+    message, products = rank_products(query, limit, offset, state)
+    result_cache.put(key, (message, tuple(products)))
+    return message, products
+
+def rank_products(query, limit=None, offset=0, state=None):
+    """Uncached recommend_products for a normalize_query() key -> (message, list_of_products)."""
+    state = catalog_state if state is None else state
+    message, ids = rank_products_columnar(query, state, top_n=None if limit is None else offset + limit)
+    products = state["products"]
+    return message, [products[i] for i in page_slice(ids, limit, offset).tolist()]
+
+def page_slice(items, limit=None, offset=0):
+    """items[offset:offset + limit], or everything from offset when limit is None."""
+    return items[offset:] if limit is None else items[offset:offset + limit]
+
+# ---------------------------
+# Columnar scoring backend (serves recommend_products)
+# ---------------------------
+def _factorize_lower(values):
+    """Lowercase and factorize strings -> {"codes": int array, "values": distinct values, "index": SubstringIndex over them}."""
+    codes, uniques = pd.factorize(pd.Series([str(v).lower() for v in values], dtype=object))
+    return {"codes": codes.astype(np.int32), "index": SubstringIndex(uniques), "values": uniques}
+
+def _vocab_mask(field, sub):
+    """Boolean mask over a field's distinct values that contain `sub`."""
+    mask = np.zeros(len(field["values"]), dtype=bool)
+    mask[field["index"].lookup(sub)] = True
+    return mask
+
+def _value_mask(field, value):
+    """Boolean mask over catalog rows whose field value equals `value` (already lowercased)."""
+    code = field["index"].code(value)
+    if code is None:
+        return np.zeros(len(field["codes"]), dtype=bool)
+    return field["codes"] == code
+
+def _row_mask(field, sub):
+    """Boolean mask over catalog rows whose field value contains `sub`."""
+    return _vocab_mask(field, sub)[field["codes"]]
+
+def _ingredient_rows_mask(cat, sub):
+    """Boolean mask over catalog rows with an ingredient containing `sub` (reads only the matching matrix columns)."""
+    mask = np.zeros(cat["size"], dtype=bool)
+    col_ptr, col_rows = cat["ing_col_ptr"], cat["ing_col_rows"]
+    n_cols = len(col_ptr) - 1
+    vocab_ids = cat["ingredients"]["index"].lookup(sub)
+    for v in vocab_ids.tolist():
+        if v < n_cols:
+            mask[col_rows[col_ptr[v]:col_ptr[v + 1]]] = True
+    # (row, ingredient) entries of products appended by catalog deltas
+    tail_codes = cat.get("ing_tail_codes")
+    if tail_codes is not None and len(vocab_ids):
+        mask[cat["ing_tail_rows"][np.isin(tail_codes, vocab_ids)]] = True
+    return mask
+
+def build_columnar_catalog(frame, store=None):
+    """
+    Columnar view of skin_data for recommend_products_columnar:
+    - ingredients as a sparse product x ingredient matrix, stored column-wise (CSC: ing_col_ptr, ing_col_rows),
+      taken from the ProductStore's interned ids when given (else from frame["key_ingredients"])
+    - factorized lowercase name/category/brand/skin_type columns
+    - precomputed good_stuff mask, float rating column and brand sort rank
+    """
+    n = len(frame)
+    if store is None:
+        store = product_records.ProductStore(frame[["key_ingredients"]])
+    lengths = np.diff(store.ing_ptr[:n + 1])
+    # factorize the vocabulary once, then map every (product, ingredient) entry through it
+    ingredients = _factorize_lower(store.vocab_lower)
+    ingredients["codes"] = ingredients["codes"][np.asarray(store.ing_ids[:store.ing_ptr[n]])]
+    ing_rows = np.repeat(np.arange(n, dtype=np.int32), lengths)
+    col_order = np.argsort(ingredients["codes"], kind="stable")
+    col_ptr = np.zeros(len(ingredients["values"]) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(ingredients["codes"], minlength=len(ingredients["values"])), out=col_ptr[1:])
+    brand = _factorize_lower(frame["brand"])
+    brand_rank = np.empty(len(brand["values"]), dtype=np.int32)
+    brand_rank[np.argsort(np.asarray(brand["values"], dtype=object), kind="stable")] = np.arange(len(brand["values"]))
+    return {
+        "size": n,
+        "ingredients": ingredients,
+        "ing_col_ptr": col_ptr,
+        "ing_col_rows": ing_rows[col_order],
+        "name": _factorize_lower(frame["name"]),
+        "category": _factorize_lower(frame["category"]),
+        "brand": brand,
+        "brand_rank": brand_rank[brand["codes"]],
+        "skin_type": _factorize_lower(frame["skin_type"]),
+        "good_stuff": pd.to_numeric(frame["good_stuff"], errors="coerce").to_numpy() == 1,
+        "rating": pd.to_numeric(frame["rating_score" if "rating_score" in frame else "rating"], errors="coerce").fillna(0).to_numpy(dtype=np.float64),
+    }
+
+def load_columnar_catalog(frame, snapshot_dir, store=None):
+    """
+    columnar_catalog from the snapshot (memory-mapped) when it was built from the same CSV and
+    Good_Stuff model as the frame, else built from the frame and stored.
+    """
+    source = columnar_source(frame)
+    if source["csv_sha1"] is None:  # not loaded by load_skin_data: nothing to check a snapshot against
+        return build_columnar_catalog(frame, store)
+    try:
+        cat = read_columnar_snapshot(snapshot_dir, source)
+        if cat is not None and cat["size"] == len(frame):
+            return cat
+    except Exception:
+        pass
+    cat = build_columnar_catalog(frame, store)
+    if os.path.isdir(snapshot_dir):
+        try:
+            write_columnar_snapshot(cat, snapshot_dir, source)
+        except (OSError, ValueError):
+            pass
+    return cat
+
+columnar_catalog = load_columnar_catalog(skin_data, snapshot_path, product_store)
+
+def _top_order(ids, coarse, keys, top_n=None):
+    """
+    ids in lexsort order of `keys` (last key primary, ties by id), cut to the first `top_n`.
+    With top_n, only rows whose `coarse` key (non-decreasing along that order) is within the
+    top_n-th smallest are sorted, so a page costs an argpartition plus a small sort.
+    """
+    if top_n is not None and top_n < len(ids):
+        if top_n <= 0:
+            return ids[:0]
+        kth = np.partition(coarse, top_n - 1)[top_n - 1]
+        head = np.flatnonzero(coarse <= kth)
+        ids, keys = ids[head], [k[head] for k in keys]
+    order = np.lexsort([ids] + list(keys))
+    return ids[order[:top_n]]
+
+def _cached_mask(masks, key, build):
+    """build() memoized in `masks` (a QueryCache scoped to one catalog_state), or just build() without one."""
+    if masks is None:
+        return build()
+    mask = masks.get(key)
+    if mask is None:
+        mask = build()
+        masks.put(key, mask)
+    return mask
+
+def _concern_scores(cat, concerns, keywords, masks=None):
+    """(scores, keyword_hit) over catalog rows: +3 per ingredient keyword hit, +1 per concern in category or name."""
+    scores = np.zeros(cat["size"], dtype=np.int32)
+    keyword_hit = np.zeros(cat["size"], dtype=bool)
+    for kw in keywords:
+        hit = _cached_mask(masks, ("ingredient", kw), lambda: _ingredient_rows_mask(cat, kw))
+        scores += 3 * hit
+        keyword_hit |= hit
+    for c in concerns:
+        scores += _cached_mask(masks, ("concern", c), lambda: _row_mask(cat["category"], c) | _row_mask(cat["name"], c))
+    return scores, keyword_hit
+
+def rank_products_columnar(query, state=None, top_n=None, masks=None):
+    """
+    Run a normalized query against columnar_catalog -> (message, array of product ids in result order).
+    - top_n: only the first top_n results are needed (optional; skips sorting the rest)
+    - masks: QueryCache memoizing row masks and concern scores across queries on the same state (optional)
+    """
+    skin_type, concerns, avoid_ingredients, brand_filter, category_filter, sort_by = query
+    metrics.inc("queries_total", backend="columnar")
+    state = catalog_state if state is None else state
+
+    with metrics.stage("keywords", backend="columnar") as st:
+        target_keywords = derive_ingredient_keywords_from_concerns(concerns, state)
+        st.record(candidates_out=len(target_keywords))
+
+    cat = state["columnar"]
+
+    with metrics.stage("score", backend="columnar") as st:
+        # ingredient keyword matches (+3 per keyword hit), concern string in product category or name (+1)
+        scores, keyword_hit = _cached_mask(masks, ("scores", concerns),
+                                           lambda: _concern_scores(cat, concerns, target_keywords, masks))
+        scored = scores > 0
+        if metrics.enabled:
+            st.record(candidates_out=int(np.count_nonzero(scored)))
+
+    with metrics.stage("filter", backend="columnar") as st:
+        # base filters (skin type and good_stuff), brand/category filters and avoided ingredients
+        skin_ok = _cached_mask(masks, ("skin_type", skin_type),
+                               lambda: _row_mask(cat["skin_type"], skin_type) | _value_mask(cat["skin_type"], "all"))
+        keep = scored & cat["good_stuff"] & skin_ok
+        if brand_filter:
+            keep &= _cached_mask(masks, ("brand", brand_filter), lambda: _row_mask(cat["brand"], brand_filter))
+        if category_filter:
+            keep &= _cached_mask(masks, ("category", category_filter), lambda: _row_mask(cat["category"], category_filter))
+        for a in avoid_ingredients:
+            keep &= ~_cached_mask(masks, ("ingredient", a), lambda: _ingredient_rows_mask(cat, a))
+
+        ids = np.flatnonzero(keep)
+        if metrics.enabled:
+            st.record(candidates_in=int(np.count_nonzero(scored)), candidates_out=len(ids))
+
+    if not len(ids):
+        metrics.inc("fallback_total", backend="columnar")
+        with metrics.stage("fallback", backend="columnar") as st:
+            fallback_ids = np.flatnonzero(keyword_hit & cat["good_stuff"])
+            st.record(candidates_out=len(fallback_ids))
+        if len(fallback_ids):
+            return "No products for the selected skin type. Showing results for all skin types:", fallback_ids
+        else:
+            return "No products found for the given concerns.", fallback_ids
+
+    # ties keep catalog order like a stable list.sort
+    with metrics.stage("sort", backend="columnar") as st:
+        if sort_by == "brand":
+            rank = cat["brand_rank"][ids]
+            ranked = _top_order(ids, rank, [rank], top_n)
+        else:
+            # score weighted past the rating spread, so the sum orders like (-score, -rating)
+            score, rating = scores[ids].astype(np.float64), cat["rating"][ids]
+            weight = float(np.ptp(rating)) + 1 if len(ids) else 1.0
+            ranked = _top_order(ids, -(weight * score + rating), [-rating, -score], top_n)
+        st.record(candidates_in=len(ids), candidates_out=len(ranked))
+    return "Here are your recommendations:", ranked
+
+def recommend_products_columnar(skin_type, concerns,
+                                avoid_ingredients=None,
+                                brand_filter=None,
+                                category_filter=None,
+                                sort_by="rating",
+                                limit=None,
+                                offset=0):
+    """
+    Vectorized counterpart of recommend_products over columnar_catalog.
+    Same arguments and (message, list_of_products) contract; scoring, exclusions
+    and sorting run as NumPy operations over whole columns.
+    """
+    state = catalog_state
+    query = normalize_query(skin_type, concerns, avoid_ingredients, brand_filter, category_filter, sort_by)
+    message, ids = rank_products_columnar(query, state, top_n=None if limit is None else offset + limit)
+    return message, [state["products"][i] for i in page_slice(ids, limit, offset)]
+
+# ---------------------------
+# Personalized Good_Stuff predictions (RandomForest from the notebook)
+# ---------------------------
+_personal_model = {}  # "version", "model", "products": per-product feature rows of that catalog_state
+PREDICT_CHUNK_ROWS = 1 << 16  # (profile, product) feature rows per predict_proba call
+
+def _good_stuff_features(state):
+    """
+    Model and per-product feature rows (product columns filled, review/user columns 0 as in the notebook).
+    Product/Brand/Category use the classes of the base catalog (the CSV the model saw), so products
+    added by deltas never shift existing codes; names unknown to it get the unseen-value code.
+    """
+    if _personal_model.get("version") != state["version"]:
+        model = good_stuff_model.load_model()
+        if model is None:
+            return None, None
+        encoders = _delta_encoders(state)
+        skin_data = catalog_frame(state)
+        block = np.zeros((len(skin_data), len(good_stuff_model.FEATURE_COLUMNS)), dtype=np.float64)
+        columns = {"Product_id": "Product_id", "Rating": "Rating", "Price": "Price",
+                   "Product": "name", "Brand": "brand", "Category": "category"}
+        for feature, col in columns.items():
+            if col not in skin_data:
+                continue
+            j = good_stuff_model.FEATURE_COLUMNS.index(feature)
+            if feature in good_stuff_model.CATEGORICAL_COLUMNS:
+                block[:, j] = good_stuff_model.encode(skin_data[col], encoders[feature])
+            else:
+                block[:, j] = pd.to_numeric(skin_data[col], errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+        _personal_model.update(version=state["version"], model=model, products=block)
+    return _personal_model["model"], _personal_model["products"]
+
+def predict_good_stuff(profiles, product_ids=None):
+    """
+    Personalized Good_Stuff probabilities for many users at once. The profile x product feature
+    rows are built and scored with one predict_proba call per PREDICT_CHUNK_ROWS rows, so memory
+    stays flat however many profiles and products are crossed.
+    - profiles: dicts with skin_tone, skin_type, eye_color, hair_color, sensitive
+    - product_ids: positions in product_list to score (default: the whole catalog)
+    Returns: float array (n_profiles x n_products), or None when no model is available.
+    """
+    state = catalog_state
+    model, block = _good_stuff_features(state)
+    if model is None:
+        return None
+    if product_ids is not None:
+        block = block[np.asarray(product_ids, dtype=np.int64)]
+    profile_block = good_stuff_model.profile_matrix(list(profiles), state["frame"].attrs.get("profile_classes", {}))
+    proba = np.zeros(len(profile_block) * len(block))
+    for start in range(0, len(proba), PREDICT_CHUNK_ROWS):
+        rows = np.arange(start, min(start + PREDICT_CHUNK_ROWS, len(proba)))
+        proba[rows] = good_stuff_model.positive_proba(model, good_stuff_model.cross_features(block, profile_block, rows))
+    return proba.reshape(len(profile_block), len(block))
+
+# ---------------------------
+# Batch recommendations (offline campaigns)
+# ---------------------------
+BATCH_CHUNKS_PER_PROCESS = 4
+BATCH_MASK_CACHE_BYTES = 64 << 20  # row masks memoized per batch (worker)
+
+_batch_state = None  # catalog_state a batch pool is created from (inherited by forked workers)
+
+def _profile_query(profile):
+    return normalize_query(profile.get("skin_type", "all"), profile.get("concerns", []),
+                           avoid_ingredients=profile.get("avoid_ingredients"),
+                           brand_filter=profile.get("brand_filter"),
+                           category_filter=profile.get("category_filter"),
+                           sort_by=profile.get("sort_by", "rating"))
+
+def _catalog_generation(state):
+    """What a batch worker must have loaded for its row ids to match `state`'s."""
+    return (file_path, state["base_size"], len(state["products"]), sorted(state["deltas"].items()))
+
+def _rank_query_chunk(queries, top_n, generation=None, state=None):
+    """
+    Worker body: rank each query and keep only the top_n product ids (small to pickle).
+    - generation: _catalog_generation() of the parent's state; a worker holding another
+      catalog (a spawned one that loaded a different snapshot or deltas) returns None
+    Row masks shared by the queries (concerns, keywords, filters) are computed once per chunk.
+    """
+    if state is None:
+        state = catalog_state if _batch_state is None else _batch_state
+    if generation is not None and _catalog_generation(state) != generation:
+        return None
+    masks = QueryCache(max(16, BATCH_MASK_CACHE_BYTES // max(state["columnar"]["size"], 1)))
+    results = []
+    for q in queries:
+        message, ids = rank_products_columnar(q, state, top_n=top_n, masks=masks)
+        results.append((message, ids[:top_n].tolist()))
+    return results
+
+def recommend_products_batch(profiles, top_n=5, processes=None):
+    """
+    Recommend for many user profiles in one call.
+    - profiles: iterable of dicts with recommend_products keyword names
+      (skin_type, concerns, avoid_ingredients, brand_filter, category_filter, sort_by)
+    - top_n: number of products kept per profile
+    - processes: None/1 runs in this process; N > 1 shards the distinct queries over N worker
+      processes (forked where available so workers share the loaded catalog; spawned workers
+      load it from the snapshot and delta files on import)
+    Profiles are grouped by normalized query, so each distinct query is scored once. Workers
+    check they hold the same catalog generation as this process; chunks from a worker that
+    does not (e.g. after a delta applied from a DataFrame) are ranked here instead.
+    Returns: list of (message, list_of_products), aligned with profiles.
+    """
+    global _batch_state
+    state = catalog_state
+    profile_queries = [_profile_query(p) for p in profiles]
+    unique_queries = list(dict.fromkeys(profile_queries))
+
+    ranked = {}
+    if processes and processes > 1 and len(unique_queries) > 1:
+        n_chunks = min(len(unique_queries), processes * BATCH_CHUNKS_PER_PROCESS)
+        # contiguous runs of queries grouped by concerns, so a chunk reuses its concern scores
+        grouped = sorted(unique_queries, key=lambda q: (q[1], str(q[0])))
+        bounds = np.linspace(0, len(grouped), n_chunks + 1).astype(int)
+        chunks = [grouped[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])]
+        generation = _catalog_generation(state)
+        ctx = mp.get_context("fork" if "fork" in mp.get_all_start_methods() else "spawn")
+        _batch_state = state
+        try:
+            with ctx.Pool(processes) as pool:
+                chunk_results = pool.starmap(_rank_query_chunk, [(chunk, top_n, generation) for chunk in chunks])
+        finally:
+            _batch_state = None
+        for chunk, results in zip(chunks, chunk_results):
+            if results is not None:
+                ranked.update(zip(chunk, results))
+    missing = [q for q in unique_queries if q not in ranked]
+    if missing:
+        ranked.update(zip(missing, _rank_query_chunk(missing, top_n, state=state)))
+
+    products = state["products"]
+    results = {}
+    for q, (message, ids) in ranked.items():
+        results[q] = (message, [products[i] for i in ids])
+    return [results[q] for q in profile_queries]
+
+# ---------------------------
+# Ingredient similarity ("more like this")
+# ---------------------------
+# Products are TF-IDF vectors over their lowercase ingredients (binary tf, smoothed idf),
+# L2-normalized and kept both column-wise (CSC, for exact scoring that only reads the
+# query's ingredient columns) and row-wise (CSR, for building query vectors and rescoring).
+LSH_TABLES = 8
+LSH_BUCKET_SIZE = 64  # target products per LSH bucket (sets the number of hash bits)
+LSH_BLOCK_ROWS = 8192
+# catalogs with at least this many products get the LSH index at load (0: only through enable_lsh())
+LSH_MIN_PRODUCTS = int(os.environ.get("SKINCARE_LSH_MIN_PRODUCTS") or 0)
+
+def build_similarity_index(cat, lsh_tables=0, lsh_bits=None, seed=0):
+    """
+    TF-IDF similarity index over columnar_catalog ingredients.
+    lsh_tables > 0 also builds a random-projection LSH index for approximate search on large catalogs.
+    """
+    n = cat["size"]
+    n_vocab = len(cat["ingredients"]["values"])
+    col_ptr = np.asarray(cat["ing_col_ptr"])
+    cols = np.repeat(np.arange(n_vocab, dtype=np.int64), np.diff(col_ptr))
+    # drop repeated (product, ingredient) pairs: tf is binary
+    # (the CSC entries are already sorted, so dropping adjacent repeats is enough)
+    keys = cols * n + np.asarray(cat["ing_col_rows"], dtype=np.int64)
+    if np.all(keys[1:] >= keys[:-1]):
+        keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+    else:
+        keys = np.unique(keys)
+    cols, rows = keys // n, keys % n
+
+    df = np.bincount(cols, minlength=n_vocab)
+    idf = np.log((1 + n) / (1 + df)) + 1
+    weights = idf[cols]
+    norms = np.sqrt(np.bincount(rows, weights * weights, minlength=n))
+    data = (weights / norms[rows]).astype(np.float32)
+
+    sim = {"size": n, "idf": idf,
+           "col_ptr": np.concatenate(([0], np.cumsum(df))), "col_rows": rows.astype(np.int32), "col_data": data}
+    row_order = np.lexsort((cols, rows))
+    sim["row_ptr"] = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=n))))
+    sim["row_cols"] = cols[row_order].astype(np.int32)
+    sim["row_data"] = data[row_order]
+    if lsh_tables:
+        sim["lsh"] = _build_lsh(sim, n_vocab, lsh_tables, lsh_bits, seed)
+    return sim
+
+def _lsh_tables_for(cat, keep=False):
+    """LSH tables to build for `cat`: LSH_TABLES when LSH was already enabled (keep) or the catalog is large enough."""
+    return LSH_TABLES if keep or (LSH_MIN_PRODUCTS and cat["size"] >= LSH_MIN_PRODUCTS) else 0
+
+def _lsh_codes(proj, n_tables, n_bits):
+    bits = (proj > 0).reshape(len(proj), n_tables, n_bits)
+    return bits.astype(np.uint64) @ (np.uint64(1) << np.arange(n_bits, dtype=np.uint64))
+
+def _build_lsh(sim, n_vocab, n_tables, n_bits, seed):
+    """Per table: product ids sorted by their hash code, plus the sorted codes for searchsorted lookups."""
+    n = sim["size"]
+    if n_bits is None:
+        n_bits = int(min(32, max(4, np.log2(max(n, 2) / LSH_BUCKET_SIZE))))
+    planes = np.random.default_rng(seed).standard_normal((n_vocab, n_tables * n_bits)).astype(np.float32)
+    codes = np.zeros((n, n_tables), dtype=np.uint64)
+    row_ptr, row_cols, row_data = sim["row_ptr"], sim["row_cols"], sim["row_data"]
+    for start in range(0, n, LSH_BLOCK_ROWS):
+        stop = min(n, start + LSH_BLOCK_ROWS)
+        lo, hi = row_ptr[start], row_ptr[stop]
+        if lo == hi:
+            continue
+        # sum each product's weighted hyperplane rows (products without ingredients keep code 0)
+        starts = row_ptr[start:stop] - lo
+        nonempty = np.flatnonzero(np.diff(row_ptr[start:stop + 1]))
+        proj = np.add.reduceat(row_data[lo:hi, None] * planes[row_cols[lo:hi]], starts[nonempty], axis=0)
+        codes[start + nonempty] = _lsh_codes(proj, n_tables, n_bits)
+    tables = []
+    for t in range(n_tables):
+        order = np.argsort(codes[:, t], kind="stable")
+        tables.append((codes[order, t], order))
+    return {"planes": planes, "tables": tables, "n_tables": n_tables, "n_bits": n_bits}
+
+def _row_vector(sim, i):
+    """(ingredient ids, weights) of product i, from the base CSR rows or the delta tail's."""
+    block = sim.get("tail")
+    if block is not None and i >= block["offset"]:
+        i -= block["offset"]
+    else:
+        block = sim
+    lo, hi = block["row_ptr"][i], block["row_ptr"][i + 1]
+    return block["row_cols"][lo:hi], block["row_data"][lo:hi]
+
+def _query_vector(sim, product_ids):
+    """Normalized sum of the liked products' vectors -> (ingredient ids, weights)."""
+    vectors = [_row_vector(sim, i) for i in product_ids]
+    cols = np.concatenate([c for c, _ in vectors]) if vectors else np.zeros(0, dtype=np.int32)
+    data = np.concatenate([d for _, d in vectors]) if vectors else np.zeros(0, dtype=np.float32)
+    q_cols, inverse = np.unique(cols, return_inverse=True)
+    q_vals = np.bincount(inverse, data, minlength=len(q_cols))
+    norm = np.sqrt(np.dot(q_vals, q_vals))
+    return q_cols, (q_vals / norm if norm else q_vals)
+
+def _dense_query(sim, q_cols, q_vals):
+    q_dense = np.zeros(len(sim["idf"]), dtype=np.float32)
+    q_dense[q_cols] = q_vals
+    return q_dense
+
+def _exact_scores(sim, q_cols, q_vals):
+    """Cosine similarity of every product to the query, reading only the query's ingredient columns."""
+    scores = np.zeros(sim["size"], dtype=np.float32)
+    col_ptr, col_rows, col_data = sim["col_ptr"], sim["col_rows"], sim["col_data"]
+    n_cols = len(col_ptr) - 1
+    for c, v in zip(q_cols, q_vals):
+        if c >= n_cols:
+            continue  # ingredient only carried by delta products
+        lo, hi = col_ptr[c], col_ptr[c + 1]
+        scores[col_rows[lo:hi]] += col_data[lo:hi] * v
+    tail = sim.get("tail")
+    if tail is not None:
+        scores[tail["offset"]:] += _csr_scores(tail, np.arange(len(tail["row_ptr"]) - 1),
+                                               _dense_query(sim, q_cols, q_vals)).astype(np.float32)
+    return scores
+
+def _lsh_candidates(sim, q_cols, q_vals):
+    """Products sharing at least one LSH bucket with the query, plus every delta tail product (not hashed)."""
+    lsh = sim["lsh"]
+    hashed = q_cols < len(lsh["planes"])
+    q_cols, q_vals = q_cols[hashed], q_vals[hashed]
+    proj = (q_vals[:, None].astype(np.float32) * lsh["planes"][q_cols]).sum(axis=0, keepdims=True)
+    q_codes = _lsh_codes(proj, lsh["n_tables"], lsh["n_bits"])[0]
+    found = []
+    for (codes, order), code in zip(lsh["tables"], q_codes):
+        lo, hi = np.searchsorted(codes, code, "left"), np.searchsorted(codes, code, "right")
+        found.append(order[lo:hi])
+    if "tail" in sim:
+        found.append(np.arange(sim["tail"]["offset"], sim["size"]))
+    return np.unique(np.concatenate(found))
+
+def _csr_scores(block, rows, q_dense):
+    """Dot products of a dense query with the given rows of a CSR block."""
+    row_ptr = block["row_ptr"]
+    starts, lengths = row_ptr[rows], row_ptr[rows + 1] - row_ptr[rows]
+    owner = np.repeat(np.arange(len(rows)), lengths)
+    idx = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + np.repeat(starts, lengths)
+    return np.bincount(owner, block["row_data"][idx] * q_dense[block["row_cols"][idx]], minlength=len(rows))
+
+def _candidate_scores(sim, candidates, q_cols, q_vals):
+    """Exact cosine scores for a subset of products (CSR rows)."""
+    q_dense = _dense_query(sim, q_cols, q_vals)
+    tail = sim.get("tail")
+    if tail is None:
+        return _csr_scores(sim, candidates, q_dense)
+    in_tail = candidates >= tail["offset"]
+    scores = np.empty(len(candidates), dtype=np.float64)
+    scores[~in_tail] = _csr_scores(sim, candidates[~in_tail], q_dense)
+    scores[in_tail] = _csr_scores(tail, candidates[in_tail] - tail["offset"], q_dense)
+    return scores
+
+def similar_products(product_ids, top_k=10, approximate=False, state=None):
+    """
+    Products whose ingredient profile is most similar to the given products (ids = positions in product_list).
+    - approximate: score only LSH bucket candidates; exact search when the catalog has no LSH
+      index (see enable_lsh() and LSH_MIN_PRODUCTS)
+    Returns: list of (product, cosine similarity), best first, excluding the query products
+    and products deleted or replaced by catalog deltas.
+    """
+    state = catalog_state if state is None else state
+    sim, live = state["similarity"], state["live"]
+    product_ids = np.asarray(list(product_ids), dtype=np.int64)
+    q_cols, q_vals = _query_vector(sim, product_ids)
+    if not len(q_cols):
+        return []
+    if approximate and "lsh" in sim:
+        candidates = np.setdiff1d(_lsh_candidates(sim, q_cols, q_vals), product_ids)
+        candidates = candidates[live[candidates]]
+        cand_scores = _candidate_scores(sim, candidates, q_cols, q_vals)
+    else:
+        scores = _exact_scores(sim, q_cols, q_vals)
+        scores[product_ids] = 0
+        scores[~live] = 0
+        candidates = np.flatnonzero(scores > 0)
+        cand_scores = scores[candidates]
+    if len(candidates) > top_k:
+        top = np.argpartition(-cand_scores, top_k - 1)[:top_k]
+        candidates, cand_scores = candidates[top], cand_scores[top]
+    order = np.lexsort((candidates, -cand_scores))
+    products = state["products"]
+    return [(products[i], float(cand_scores[j])) for j, i in zip(order, candidates[order]) if cand_scores[j] > 0]
+
+def find_product_ids(name, brand=None, state=None):
+    """Ids of (live) products whose name (and brand, if given) match exactly, ignoring case."""
+    state = catalog_state if state is None else state
+    cat = state["columnar"]
+    keep = state["live"] & _value_mask(cat["name"], str(name).strip().lower())
+    if brand:
+        keep &= _value_mask(cat["brand"], str(brand).strip().lower())
+    return np.flatnonzero(keep).tolist()
+
+def more_like_this(names, top_k=10, approximate=False):
+    """similar_products for products given by name (a single name or a list of liked product names)."""
+    if isinstance(names, str):
+        names = [names]
+    state = catalog_state
+    ids = [i for name in names for i in find_product_ids(name, state=state)]
+    return similar_products(ids, top_k, approximate, state) if ids else []
+
+similarity_index = build_similarity_index(columnar_catalog, lsh_tables=_lsh_tables_for(columnar_catalog))
+
+# ---------------------------
+# Catalog state and incremental updates (delta files)
+# ---------------------------
+# Everything a query reads lives in one catalog_state dict. Writers build a new dict and publish
+# it by rebinding catalog_state (one reference assignment), so a query that captured the previous
+# state keeps a consistent view until it returns.
+#
+# A delta is a CSV in the skindataall.csv layout keyed by Product_id, with an optional Op column:
+# "upsert" (default; the rows are the product's complete set of reviews) or "delete".
+# Positions in product_list never move: deleted and replaced products are retired (dropped from
+# good_stuff and the live mask) and upserted products are appended. Appended products get small
+# "tail" indexes layered over the untouched base ones, so applying a delta costs time in proportion
+# to the products added since the last full load (plus a few flat array copies).
+DELTA_OP_COLUMN = "Op"
+CSV_TAIL_CHECK_BYTES = 4096  # end of the CSV compared to tell appended rows from other edits
+
+_catalog_versions = itertools.count(1)
+_failed_deltas = {}  # path -> signature of delta files that could not be applied nor quarantined (retried once changed)
+FAILED_DELTA_SUFFIX = ".failed"  # a delta file that cannot be applied is renamed to <name>.csv.failed
+
+def _file_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+def _source_signature(path):
+    """Size, mtime, header line and last bytes of the catalog CSV."""
+    try:
+        st = os.stat(path)
+        with open(path, "rb") as f:
+            header = f.readline()
+            start = max(0, st.st_size - CSV_TAIL_CHECK_BYTES)
+            f.seek(start)
+            tail = f.read(st.st_size - start)
+    except OSError:
+        return None
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "header": header, "tail": tail}
+
+def new_catalog_state(frame, store, products, ingredients, cat, sim):
+    """catalog_state for a fully loaded catalog (no deltas applied yet)."""
+    return {
+        "version": next(_catalog_versions),
+        "frame": frame,                  # skin_data (hot columns) as loaded
+        "store": store,                  # ProductStore behind the records (appended to by deltas)
+        "appended": frame.iloc[:0],      # products appended by deltas (rows base_size...)
+        "products": products,
+        "ingredients": ingredients,
+        "columnar": cat,
+        "similarity": sim,
+        "live": np.ones(len(products), dtype=bool),
+        "base_size": len(products),
+        # writer-only bookkeeping
+        "positions": None,               # Product_id -> live position, built by the first delta
+        "encoders": None,                # Good_Stuff encoder classes for delta rows
+        "deltas": {},                    # applied delta file -> signature
+        "source": _source_signature(file_path),
+    }
+
+def _publish(state):
+    """Make `state` the current catalog; the module-level names follow for callers that read them directly."""
+    global catalog_state, skin_data, product_store, product_list, ingredients, columnar_catalog, similarity_index
+    catalog_state = state
+    skin_data, product_store, product_list, ingredients = state["frame"], state["store"], state["products"], state["ingredients"]
+    columnar_catalog, similarity_index = state["columnar"], state["similarity"]
+    invalidate_caches()
+
+def enable_lsh(n_tables=LSH_TABLES):
+    """
+    Add an LSH index to the current catalog and publish it, so similar_products(approximate=True)
+    scores bucket candidates only. Reloads and deltas keep it. Returns the published catalog_state.
+    """
+    with _catalog_lock:
+        state = catalog_state
+        sim = state["similarity"]
+        if "lsh" not in sim:
+            # hash the base rows; products appended by deltas stay candidates of every query
+            base = dict(sim, size=len(sim["row_ptr"]) - 1)
+            sim = dict(sim, lsh=_build_lsh(base, len(sim["col_ptr"]) - 1, n_tables, None, 0))
+            state = dict(state, version=next(_catalog_versions), similarity=sim)
+            _publish(state)
+        return state
+
+def catalog_frame(state=None):
+    """skin_data plus the rows appended by deltas: row i describes product_list[i] (retired products included)."""
+    state = catalog_state if state is None else state
+    if not len(state["appended"]):
+        return state["frame"]
+    return pd.concat([state["frame"], state["appended"]], ignore_index=True)
+
+def live_product_count():
+    """Number of products not deleted or replaced by a delta."""
+    return int(np.count_nonzero(catalog_state["live"]))
+
+def _product_positions(state):
+    # shared with (and updated in place for) later states: only writers, under _catalog_lock, read it
+    if state["positions"] is None:
+        frame = state["frame"]
+        if "Product_id" not in frame:
+            raise ValueError("catalog has no Product_id column: deltas cannot be applied")
+        ids = pd.to_numeric(pd.Series(np.asarray(frame["Product_id"])), errors="coerce").tolist()
+        state["positions"] = {int(pid): pos for pos, pid in enumerate(ids) if pid == pid}
+    return state["positions"]
+
+def _delta_encoders(state):
+    """Encoder classes of the loaded catalog, so delta rows encode like the CSV the model saw (None without a model)."""
+    if good_stuff_model.fingerprint() is None:
+        return None
+    if state["encoders"] is None:
+        frame = state["frame"]
+        encoders = {col: np.asarray(classes, dtype=str) for col, classes in frame.attrs.get("profile_classes", {}).items()}
+        for col, source in (("Product", "name"), ("Brand", "brand"), ("Category", "category")):
+            if source in frame:
+                encoders[col] = good_stuff_model.fit_classes(frame[source])
+        state["encoders"] = encoders
+    return state["encoders"]
+
+def _rating_prior(frame):
+    """Catalog mean rating used for rating_score (recovered from the products for older snapshots)."""
+    prior = frame.attrs.get("rating_prior")
+    if prior is None and "rating_count" in frame:
+        counts = pd.to_numeric(frame["rating_count"], errors="coerce").fillna(0)
+        prior = float((pd.to_numeric(frame["rating"], errors="coerce").fillna(0) * counts).sum() / max(counts.sum(), 1))
+    return prior
+
+def _extend_values(field, values):
+    """
+    Add lowercased `values` to a factorized field -> (field, codes of `values`).
+    New distinct values get the next codes and a tail index layered over the base one;
+    the field's own codes are left unchanged.
+    """
+    index = field["index"]
+    base_size = field.get("base_size", len(field["values"]))
+    distinct = list(field["values"])
+    known = {}
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, v in enumerate(values):
+        v = str(v).lower()
+        code = known.get(v)
+        if code is None:
+            code = index.code(v)
+            if code is None:
+                code = len(distinct)
+                distinct.append(v)
+            known[v] = code
+        codes[i] = code
+    tail = SubstringIndex(distinct[base_size:], first_id=base_size)
+    base = index.base if isinstance(index, LayeredIndex) else index
+    return dict(field, values=distinct, index=LayeredIndex(base, tail), base_size=base_size), codes
+
+def _extend_columnar(cat, frame, retired):
+    """columnar_catalog with the products of `frame` appended and the `retired` rows excluded."""
+    n_old, m = cat["size"], len(frame)
+    out = dict(cat, size=n_old + m)
+    for key in ("name", "category", "brand", "skin_type"):
+        field, codes = _extend_values(cat[key], list(frame[key]))
+        out[key] = dict(field, codes=np.concatenate([cat[key]["codes"], codes]))
+    brand_values = np.asarray(out["brand"]["values"], dtype=object)
+    brand_rank = np.empty(len(brand_values), dtype=np.int32)
+    brand_rank[np.argsort(brand_values, kind="stable")] = np.arange(len(brand_values))
+    out["brand_rank"] = brand_rank[out["brand"]["codes"]]
+
+    # new (row, ingredient) entries go to a tail list next to the base CSC matrix
+    # (the ingredients field keeps the base matrix entries as its codes)
+    ing_lists = [x if isinstance(x, (list, tuple)) else [] for x in frame["key_ingredients"]]
+    out["ingredients"], codes = _extend_values(cat["ingredients"], [x for lst in ing_lists for x in lst])
+    lengths = np.fromiter((len(x) for x in ing_lists), dtype=np.int64, count=m)
+    rows = np.repeat(np.arange(n_old, n_old + m, dtype=np.int32), lengths)
+    out["ing_tail_rows"] = np.concatenate([cat.get("ing_tail_rows", np.zeros(0, dtype=np.int32)), rows])
+    out["ing_tail_codes"] = np.concatenate([cat.get("ing_tail_codes", np.zeros(0, dtype=np.int32)), codes])
+
+    good = np.concatenate([cat["good_stuff"], pd.to_numeric(frame["good_stuff"], errors="coerce").to_numpy() == 1])
+    good[retired] = False
+    out["good_stuff"] = good
+    rating = frame["rating_score" if "rating_score" in frame else "rating"]
+    out["rating"] = np.concatenate([cat["rating"], pd.to_numeric(rating, errors="coerce").fillna(0).to_numpy(dtype=np.float64)])
+    return out
+
+def _extend_similarity_index(sim, cat, base_size):
+    """
+    Similarity index plus one small CSR "tail" holding the TF-IDF rows of every product appended since the base.
+    Base rows and idf weights are kept as they are; an ingredient new to the catalog gets its idf
+    from the appended products (a full reload recomputes every weight).
+    """
+    n = cat["size"]
+    n_vocab = len(cat["ingredients"]["values"])
+    rows = np.asarray(cat["ing_tail_rows"], dtype=np.int64) - base_size
+    keys = np.unique(rows * n_vocab + cat["ing_tail_codes"])
+    rows, cols = keys // n_vocab, keys % n_vocab
+    idf = sim["idf"]
+    if n_vocab > len(idf):
+        df = np.bincount(cols, minlength=n_vocab)[len(idf):]
+        idf = np.concatenate([idf, np.log((1 + n) / (1 + df)) + 1])
+    n_tail = n - base_size
+    weights = idf[cols]
+    norms = np.sqrt(np.bincount(rows, weights * weights, minlength=n_tail))
+    tail = {"offset": base_size,
+            "row_ptr": np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=n_tail)))),
+            "row_cols": cols.astype(np.int32),
+            "row_data": (weights / norms[rows]).astype(np.float32)}
+    return dict(sim, size=n, idf=idf, tail=tail)
+
+def _apply_delta(state, raw):
+    """New catalog_state with a raw delta frame applied -> (state, summary)."""
+    if "Product_id" not in raw:
+        raise ValueError("catalog delta needs a Product_id column")
+    ids = pd.to_numeric(raw["Product_id"], errors="coerce")
+    if ids.isna().any():
+        raise ValueError("catalog delta has rows without a numeric Product_id")
+    ids = ids.astype(np.int64)
+    if DELTA_OP_COLUMN in raw:
+        ops = raw[DELTA_OP_COLUMN].fillna("upsert").astype(str).str.strip().str.lower()
+        raw = raw.drop(columns=[DELTA_OP_COLUMN])
+    else:
+        ops = pd.Series("upsert", index=raw.index)
+    unknown = set(ops) - {"upsert", "delete"}
+    if unknown:
+        raise ValueError(f"unknown catalog delta operation(s): {sorted(unknown)}")
+    # the last operation on a product id wins
+    last_op = ops.groupby(ids.to_numpy(), sort=False).last()
+    upserts = raw[((ops == "upsert") & (ids.map(last_op) == "upsert")).to_numpy()]
+
+    positions = _product_positions(state)
+    touched = last_op.index.tolist()
+    retired = sorted(positions[pid] for pid in touched if pid in positions)
+    frame, store = state["frame"], state["store"]
+    if len(upserts):
+        added = preprocess_skin_data(upserts, _delta_encoders(state), _rating_prior(frame))
+        # every record key of the catalog (cold ones included), hot columns in skin_data's dtypes
+        added = added.reindex(columns=store.columns)
+        for col in added.columns:
+            if col.startswith("reviews_"):
+                added[col] = added[col].fillna(0).astype(int)
+    else:
+        added = pd.DataFrame(columns=store.columns)
+
+    n_old = len(state["products"])
+    store.truncate(n_old)
+    records = store.append(added)
+    live = np.concatenate([state["live"], np.ones(len(records), dtype=bool)])
+    live[retired] = False
+    new_ingredients = {i for lst in added["key_ingredients"] if isinstance(lst, (list, tuple)) for i in lst}
+    cat = _extend_columnar(state["columnar"], added, retired)
+    hot = added[list(frame.columns)]
+    new_state = dict(
+        state,
+        version=next(_catalog_versions),
+        appended=pd.concat([state["appended"], hot], ignore_index=True) if len(state["appended"]) else hot,
+        products=state["products"] + records,
+        ingredients=sorted(new_ingredients.union(state["ingredients"])) if new_ingredients - set(state["ingredients"]) else state["ingredients"],
+        columnar=cat,
+        similarity=_extend_similarity_index(state["similarity"], cat, state["base_size"]),
+        live=live,
+        deltas=dict(state["deltas"]),
+    )
+    for pid in touched:
+        positions.pop(pid, None)
+    for pos, pid in enumerate(pd.to_numeric(added["Product_id"]).astype(np.int64).tolist(), n_old):
+        positions[pid] = pos
+    upserted = set(last_op.index[last_op == "upsert"].tolist())
+    summary = {"version": new_state["version"], "upserted": len(upserted),
+               "deleted": len(touched) - len(upserted), "retired": len(retired)}
+    return new_state, summary
+
+def apply_delta(delta):
+    """
+    Apply a catalog delta and publish the result as the new catalog_state (queries already running keep the old one).
+    - delta: path of a delta CSV, or a DataFrame in the same layout
+    Returns: {"version", "upserted", "deleted", "retired"} (retired: existing records replaced or removed)
+    """
+    with _catalog_lock:
+        is_path = isinstance(delta, (str, os.PathLike))
+        state, summary = _apply_delta(catalog_state, pd.read_csv(delta) if is_path else delta)
+        if is_path:
+            state["deltas"][os.path.abspath(delta)] = _file_signature(delta)
+        _publish(state)
+    return summary
+
+def pending_deltas(state=None):
+    """Delta files in delta_dir that are new or changed since they were applied, in file name order."""
+    state = catalog_state if state is None else state
+    if not os.path.isdir(delta_dir):
+        return []
+    paths = sorted(os.path.abspath(os.path.join(delta_dir, f)) for f in os.listdir(delta_dir) if f.endswith(".csv"))
+    return [p for p in paths
+            if state["deltas"].get(p) != _file_signature(p) and _failed_deltas.get(p) != _file_signature(p)]
+
+def _quarantine_delta(path, error):
+    """Move a delta file that failed out of the way (<name>.csv.failed), so it is not retried on every poll."""
+    warnings.warn(f"catalog delta {path} not applied: {error!r}")
+    try:
+        os.replace(path, path + FAILED_DELTA_SUFFIX)
+    except OSError:
+        _failed_deltas[path] = _file_signature(path)  # read-only directory: skip it until it changes
+
+def apply_pending_deltas():
+    """apply_delta every pending delta file -> list of summaries (files that fail are quarantined with a warning)."""
+    summaries = []
+    with _catalog_lock:
+        for path in pending_deltas():
+            try:
+                summaries.append(apply_delta(path))
+            except Exception as e:  # anything in a dropped-in file (bad CSV, bad ingredient lists, ...)
+                _quarantine_delta(path, e)
+    return summaries
+
+def _appended_csv_rows(state):
+    """
+    (rows, source) for complete lines appended to the catalog CSV since `state` was loaded, or None
+    when the file changed in any other way (edited, truncated, or rows added for an existing product).
+    """
+    old = state["source"]
+    new = _source_signature(file_path)
+    if old is None or new is None or new["size"] <= old["size"] or not old["tail"].endswith(b"\n"):
+        return None
+    with open(file_path, "rb") as f:
+        if f.readline() != old["header"]:
+            return None
+        f.seek(old["size"] - len(old["tail"]))
+        if f.read(len(old["tail"])) != old["tail"]:
+            return None
+        added = f.read(new["size"] - old["size"])
+    added = added[:added.rfind(b"\n") + 1]  # a line still being written is picked up by the next poll
+    end = old["size"] + len(added)
+    tail = (old["tail"] + added)[-CSV_TAIL_CHECK_BYTES:]
+    source = {"size": end, "mtime_ns": new["mtime_ns"] if end == new["size"] else None, "header": old["header"], "tail": tail}
+    if not added:
+        return pd.DataFrame(), source
+    rows = pd.read_csv(io.BytesIO(old["header"] + added))
+    if "Product_id" not in rows:
+        return None
+    positions = _product_positions(state)
+    if any(int(pid) in positions for pid in pd.to_numeric(rows["Product_id"], errors="coerce").dropna()):
+        return None
+    return rows, source
+
+class CatalogWatcher:
+    """
+    Daemon thread keeping the catalog in sync with its files, polling every `interval` seconds:
+    - new or changed files in delta_dir are applied with apply_delta
+    - rows for new products appended to the catalog CSV are applied as a delta
+    - any other change to the CSV triggers reload_catalog()
+    """
+
+    def __init__(self, interval=2.0):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="catalog-watcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def poll(self):
+        """Check the files once -> list of changes made ("reload" or apply_delta summaries)."""
+        changes = []
+        with _catalog_lock:
+            state = catalog_state
+            source, new = state["source"], _file_signature(file_path)
+            if source is not None and new is not None and new != (source["size"], source["mtime_ns"]):
+                appended = _appended_csv_rows(state)
+                if appended is None:
+                    reload_catalog()
+                    changes.append("reload")
+                else:
+                    rows, source = appended
+                    if len(rows):
+                        try:
+                            changes.append(apply_delta(rows))
+                        except Exception as e:
+                            # skip the rows rather than retrying them every poll (a full reload reports them)
+                            warnings.warn(f"rows appended to {file_path} not applied: {e!r}")
+                    catalog_state["source"] = source
+            changes.extend(apply_pending_deltas())
+        return changes
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                logging.getLogger("skincare.catalog").exception("catalog update failed")
+
+catalog_state = new_catalog_state(skin_data, product_store, product_list, ingredients, columnar_catalog, similarity_index)
+apply_pending_deltas()
@@ -0,0 +1,570 @@
+"""
+Skin concern detection from webcam frames and images (OpenCV).
+
+The face is located with the notebook's Haar cascade and the under-eye and cheek regions of
+interest are placed relative to the face box, then resampled to fixed analysis sizes, so the
+thresholds mean the same at any camera resolution. On video, FaceTracker follows the face with
+template matching in a small window and only re-runs the cascade when the match gets weak.
+Only those regions are converted and edge-detected; the webcam path runs capture and analysis
+on background threads (WebcamConcernPipeline) so callers never block on the camera.
+analyze_images() tags whole folders across a process pool:
+
+    python skin_analysis.py "selfies/**/*.jpg" --output tags.jsonl --processes 8
+"""
+import argparse
+import csv
+import glob
+import json
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+import warnings
+
+import cv2
+import numpy as np
+
+# Regions of interest as (y0, y1, x0, x1) in pixels of a 640x480 frame: the original fixed
+# offsets. They set the analysis size of each region (face ROIs are resampled to it) and are
+# still used, scaled to the frame, when no face detector is available.
+DARK_CIRCLE_ROI = (100, 200, 150, 300)
+ACNE_ROI = (200, 300, 100, 200)
+REFERENCE_FRAME = (480, 640)  # (rows, cols) the fixed ROIs were written for
+# The fixed ROIs are only measured on frames larger than this (rows, cols, at full resolution),
+# like the original code: on smaller images they would cover a few pixels of whatever is there
+MIN_FIXED_FRAME = (200, 300)
+# The same regions relative to the face box, as (y0, y1, x0, x1) fractions of its height/width:
+# the band under both eyes, and one cheek
+DARK_CIRCLE_FACE_ROI = (0.50, 0.66, 0.18, 0.82)
+ACNE_FACE_ROI = (0.58, 0.82, 0.12, 0.42)
+DARK_CIRCLE_THRESHOLD = 80  # mean gray level below this -> "dark circles"
+ACNE_EDGE_THRESHOLD = 1000  # sum of Canny edge pixels (at the ACNE_ROI analysis size) above this -> "acne"
+CANNY_LOW, CANNY_HIGH = 100, 200
+# Extra pixels around the acne ROI fed to Canny, so gradients and hysteresis at the ROI
+# border match a full-frame Canny pass
+CANNY_MARGIN = 16
+# cv2.imread flags for decoding at 1/2, 1/4 and 1/8 resolution (JPEG decodes these without a full-size pass)
+REDUCED_GRAYSCALE_FLAGS = {1: cv2.IMREAD_GRAYSCALE, 2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+                           4: cv2.IMREAD_REDUCED_GRAYSCALE_4, 8: cv2.IMREAD_REDUCED_GRAYSCALE_8}
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+# Haar cascade from the notebook (SKINCARE_FACE_CASCADE overrides the file)
+FACE_CASCADE_PATH = os.environ.get("SKINCARE_FACE_CASCADE") or os.path.join(
+    getattr(getattr(cv2, "data", None), "haarcascades", ""), "haarcascade_frontalface_default.xml")
+DETECT_WIDTH = 320  # frames are downscaled to at most this width for the cascade
+MIN_FACE_FRACTION = 0.15  # smallest face searched for, as a fraction of the frame's shorter side
+TRACK_WIDTH = 48  # face width (pixels) the tracker matches templates at
+
+
+def _clip_roi(roi, shape, margin=0):
+    y0, y1, x0, x1 = roi
+    h, w = shape[:2]
+    return max(0, y0 - margin), min(h, y1 + margin), max(0, x0 - margin), min(w, x1 + margin)
+
+
+def _gray_roi(frame, roi, margin=0):
+    """Grayscale crop of roi (+margin); converts only the crop when the frame is BGR."""
+    y0, y1, x0, x1 = _clip_roi(roi, frame.shape, margin)
+    crop = frame[y0:y1, x0:x1]
+    if crop.ndim == 3:
+        crop = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    return crop, (y0, x0)
+
+
+def _roi_shape(roi):
+    y0, y1, x0, x1 = roi
+    return y1 - y0, x1 - x0
+
+
+def roi_edges(frame, roi=ACNE_ROI, margin=CANNY_MARGIN, shape=None):
+    """
+    Canny edge map of roi, computed on roi plus a margin instead of the whole frame.
+    - shape: (rows, cols) to resample the region to first (margin is in resampled pixels)
+    """
+    rows, cols = shape or _roi_shape(roi)
+    y0, y1, x0, x1 = roi
+    fy, fx = rows / max(y1 - y0, 1), cols / max(x1 - x0, 1)
+    gray, (oy, ox) = _gray_roi(frame, (y0 - round(margin / fy), y1 + round(margin / fy),
+                                       x0 - round(margin / fx), x1 + round(margin / fx)))
+    if (fy, fx) != (1, 1) and gray.size:
+        gray = cv2.resize(gray, (max(1, round(gray.shape[1] * fx)), max(1, round(gray.shape[0] * fy))),
+                          interpolation=cv2.INTER_AREA if fx < 1 else cv2.INTER_LINEAR)
+    edges = cv2.Canny(gray, CANNY_LOW, CANNY_HIGH)
+    y0, y1, x0, x1 = _clip_roi(roi, frame.shape)
+    top, left = round((y0 - oy) * fy), round((x0 - ox) * fx)
+    return edges[top:top + round((y1 - y0) * fy), left:left + round((x1 - x0) * fx)]
+
+
+# ---------------------------
+# Face localization
+# ---------------------------
+_cascades = threading.local()  # CascadeClassifier is not shared across threads
+
+
+def face_cascade():
+    """
+    This thread's Haar face cascade, or None when face detection is unavailable (an OpenCV build
+    without CascadeClassifier, or no cascade file); callers then fall back to the fixed ROIs.
+    """
+    if not hasattr(_cascades, "cascade"):
+        cascade = None
+        if hasattr(cv2, "CascadeClassifier") and os.path.isfile(FACE_CASCADE_PATH):
+            cascade = cv2.CascadeClassifier(FACE_CASCADE_PATH)
+            if cascade.empty():
+                cascade = None
+        if cascade is None:
+            warnings.warn(f"face detection unavailable ({FACE_CASCADE_PATH}): using the fixed regions of interest")
+        _cascades.cascade = cascade
+    return _cascades.cascade
+
+
+def detect_face(frame):
+    """Largest face in a BGR or grayscale frame as (x, y, w, h) in frame pixels, or None."""
+    cascade = face_cascade()
+    if cascade is None:
+        return None
+    h, w = frame.shape[:2]
+    f = min(1.0, DETECT_WIDTH / w)
+    small = cv2.resize(frame, (round(w * f), round(h * f)), interpolation=cv2.INTER_AREA) if f < 1 else frame
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    min_side = max(30, int(min(small.shape[:2]) * MIN_FACE_FRACTION))
+    faces = cascade.detectMultiScale(small, scaleFactor=1.1, minNeighbors=5, minSize=(min_side, min_side))
+    if not len(faces):
+        return None
+    x, y, fw, fh = max(faces, key=lambda b: b[2] * b[3])
+    return tuple(int(round(v / f)) for v in (x, y, fw, fh))
+
+
+def face_rois(face):
+    """(dark circle ROI, acne ROI) in frame pixels for a face box (x, y, w, h)."""
+    x, y, w, h = face
+    return tuple((y + round(y0 * h), y + round(y1 * h), x + round(x0 * w), x + round(x1 * w))
+                 for y0, y1, x0, x1 in (DARK_CIRCLE_FACE_ROI, ACNE_FACE_ROI))
+
+
+def fixed_rois(shape, scale=1):
+    """
+    The fixed ROIs scaled from REFERENCE_FRAME to a frame of this shape, or None when the frame
+    is not larger than MIN_FIXED_FRAME.
+    - scale: the frame was decoded at 1/scale resolution
+    """
+    if not (shape[0] > MIN_FIXED_FRAME[0] // scale and shape[1] > MIN_FIXED_FRAME[1] // scale):
+        return None
+    fy, fx = shape[0] / REFERENCE_FRAME[0], shape[1] / REFERENCE_FRAME[1]
+    return tuple((round(y0 * fy), round(y1 * fy), round(x0 * fx), round(x1 * fx))
+                 for y0, y1, x0, x1 in (DARK_CIRCLE_ROI, ACNE_ROI))
+
+
+class FaceTracker:
+    """
+    Follows one face across video frames. The cascade locates it; on later frames the face patch
+    from that detection is matched (normalized cross-correlation at TRACK_WIDTH pixels of face
+    width) inside a window around the previous box, and the cascade runs again only when the
+    match score drops below min_confidence or after redetect_every tracked frames.
+    - detect: frame -> face box or None (default: detect_face)
+    - search_margin: how far the face may move between analyzed frames, as a fraction of its size
+    """
+    def __init__(self, min_confidence=0.6, redetect_every=50, search_margin=0.3, detect=None):
+        self.min_confidence = min_confidence
+        self.redetect_every = redetect_every
+        self.search_margin = search_margin
+        self.detect = detect or detect_face
+        self.box = None
+        self.confidence = 0.0
+        self._template = None
+        self._since_detect = 0
+        self.detections = self.tracked = 0
+
+    @property
+    def available(self):
+        """False when there is no face detector (detect_face without a cascade)."""
+        return self.detect is not detect_face or face_cascade() is not None
+
+    def update(self, frame):
+        """Face box (x, y, w, h) in this frame, or None when no face is found."""
+        if self.box is not None and self._since_detect < self.redetect_every:
+            box, score = self._track(frame)
+            if score >= self.min_confidence:
+                self.box, self.confidence = box, score
+                self._since_detect += 1
+                self.tracked += 1
+                return box
+        box = self.detect(frame)
+        self.detections += 1
+        self.box, self.confidence, self._since_detect = box, float(box is not None), 0
+        self._template = None if box is None else self._face_patch(frame, box)
+        return box
+
+    @staticmethod
+    def _small_gray(frame, roi, f):
+        """Grayscale crop of roi resized by f; rows/columns are subsampled first so only ~2x the output is converted."""
+        y0, y1, x0, x1 = _clip_roi(roi, frame.shape)
+        step = max(1, int(0.5 / f))
+        crop = frame[y0:y1:step, x0:x1:step]
+        if crop.ndim == 3:
+            crop = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        size = (max(1, round((x1 - x0) * f)), max(1, round((y1 - y0) * f)))
+        return cv2.resize(crop, size, interpolation=cv2.INTER_AREA), (y0, x0)
+
+    def _face_patch(self, frame, box):
+        x, y, w, h = box
+        if _clip_roi((y, y + h, x, x + w), frame.shape) != (y, y + h, x, x + w):
+            return None  # face box crosses the frame border: re-detect next time
+        return self._small_gray(frame, (y, y + h, x, x + w), TRACK_WIDTH / max(w, 1))[0]
+
+    def _track(self, frame):
+        if self._template is None:
+            return None, 0.0
+        x, y, w, h = self.box
+        my, mx = round(h * self.search_margin), round(w * self.search_margin)
+        f = TRACK_WIDTH / max(w, 1)
+        window, (oy, ox) = self._small_gray(frame, (y - my, y + h + my, x - mx, x + w + mx), f)
+        th, tw = self._template.shape
+        if window.shape[0] < th or window.shape[1] < tw:
+            return None, 0.0
+        _, score, _, (bx, by) = cv2.minMaxLoc(cv2.matchTemplate(window, self._template, cv2.TM_CCOEFF_NORMED))
+        return (ox + round(bx / f), oy + round(by / f), w, h), float(score)
+
+
+# ---------------------------
+# Measurements
+# ---------------------------
+def measure_rois(frame, dark_roi, acne_roi):
+    """
+    (mean gray level under the eyes, sum of edge pixels in the acne region) for ROIs in frame pixels,
+    or None when a region falls outside the frame. The acne region is resampled to the size of
+    ACNE_ROI first, so the edge sum is in the units ACNE_EDGE_THRESHOLD was set in.
+    """
+    dark, _ = _gray_roi(frame, dark_roi)
+    y0, y1, x0, x1 = _clip_roi(acne_roi, frame.shape)
+    if not dark.size or y1 <= y0 or x1 <= x0:
+        return None
+    edges = roi_edges(frame, acne_roi, shape=_roi_shape(ACNE_ROI))
+    return float(np.mean(dark)), float(np.sum(edges))
+
+
+def locate_rois(frame, face=None, scale=1):
+    """ROIs for a face box, or the fixed ROIs scaled to the frame when face is None (see fixed_rois)."""
+    return face_rois(face) if face is not None else fixed_rois(frame.shape, scale)
+
+
+def measure_frame(frame, face=None, scale=1, detect=None):
+    """
+    Raw measurements for one BGR or grayscale frame (see measure_rois), at any resolution.
+    - face: face box (x, y, w, h), e.g. from a FaceTracker; default: detected in the frame
+    - scale: the frame was decoded at 1/scale resolution
+    - detect: frame -> face box or None, used instead of detect_face
+    Returns None when no face is found. Without a face detector the fixed ROIs are measured,
+    on frames larger than MIN_FIXED_FRAME.
+    """
+    if face is None:
+        face = (detect or detect_face)(frame)
+        if face is None and (detect is not None or face_cascade() is not None):
+            return None
+    rois = locate_rois(frame, face, scale)
+    return measure_rois(frame, *rois) if rois is not None else None
+
+
+def concerns_from_measurements(dark_mean, acne_edges):
+    concerns = set()
+    if dark_mean < DARK_CIRCLE_THRESHOLD:
+        concerns.add("dark circles")
+    if acne_edges > ACNE_EDGE_THRESHOLD:
+        concerns.add("acne")
+    return concerns
+
+
+class WebcamConcernPipeline:
+    """
+    Threaded webcam analysis:
+    - a capture thread reads frames and keeps only the newest one for analysis (stale frames are dropped)
+    - an analysis worker measures the ROIs at most analysis_hz times per second (or every Nth captured frame);
+      a FaceTracker places them, so each analyzed frame costs a small window around the face, and
+      frames without a face are skipped
+    - measurements are smoothed with an exponential moving average before thresholding
+    concerns() accumulates every concern the smoothed signal has shown, like the original loop did.
+    """
+    def __init__(self, camera_index=0, analysis_hz=5.0, every_nth=None, smoothing=0.3, tracker=None):
+        self.camera_index = camera_index
+        self.analysis_hz = analysis_hz
+        self.every_nth = every_nth
+        self.smoothing = smoothing
+        self.tracker = tracker or FaceTracker()
+        self._frames = queue.Queue(maxsize=1)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._cap = None
+        self._latest = None
+        self._face = None
+        self._smoothed = None
+        self._concerns = set()
+        self.captured = self.analyzed = self.dropped = 0
+
+    def start(self):
+        self._cap = cv2.VideoCapture(self.camera_index)
+        if not self._cap.isOpened():
+            self._cap.release()
+            raise RuntimeError(f"Unable to open camera {self.camera_index}")
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._capture_loop, daemon=True),
+                         threading.Thread(target=self._analysis_loop, daemon=True)]
+        for t in self._threads:
+            t.start()
+        return self
+
+    def request_stop(self):
+        """Ask the threads to finish and return at once (poll running, then call stop to release the camera)."""
+        self._stop.set()
+
+    def stop(self):
+        """Stop the threads (waiting up to 2 s for each) and release the camera."""
+        self.request_stop()
+        for t in self._threads:
+            t.join(timeout=2)
+        self._threads = []
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+    @property
+    def running(self):
+        return any(t.is_alive() for t in self._threads)
+
+    def latest_frame(self):
+        """Most recent captured BGR frame (for preview), or None."""
+        with self._lock:
+            return self._latest
+
+    def face(self):
+        """Face box (x, y, w, h) in the last analyzed frame, or None."""
+        with self._lock:
+            return self._face
+
+    def concerns(self):
+        with self._lock:
+            return sorted(self._concerns)
+
+    def _capture_loop(self):
+        while not self._stop.is_set():
+            ret, frame = self._cap.read()
+            if not ret:
+                break
+            with self._lock:
+                self._latest = frame
+                self.captured += 1
+                n = self.captured
+            if self.every_nth and n % self.every_nth:
+                continue
+            try:
+                self._frames.put_nowait(frame)
+            except queue.Full:
+                # replace the stale frame the worker has not picked up yet
+                try:
+                    self._frames.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+                self._frames.put_nowait(frame)
+        self._stop.set()
+
+    def _analysis_loop(self):
+        interval = 1.0 / self.analysis_hz if self.analysis_hz else 0.0
+        next_due = time.monotonic()
+        while not self._stop.is_set():
+            delay = next_due - time.monotonic()
+            if delay > 0 and self._stop.wait(delay):
+                break
+            try:
+                frame = self._frames.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            next_due = time.monotonic() + interval
+            try:
+                face = self.tracker.update(frame) if self.tracker.available else None
+                rois = locate_rois(frame, face) if face is not None or not self.tracker.available else None
+                measured = measure_rois(frame, *rois) if rois is not None else None
+            except cv2.error:
+                face = measured = None
+            with self._lock:
+                self._face = face
+            if measured is None:
+                continue
+            with self._lock:
+                if self._smoothed is None:
+                    self._smoothed = measured
+                else:
+                    a = self.smoothing
+                    self._smoothed = tuple(a * m + (1 - a) * s for m, s in zip(measured, self._smoothed))
+                self._concerns |= concerns_from_measurements(*self._smoothed)
+                self.analyzed += 1
+
+
+def detect_skin_concerns_from_webcam(camera_index=0, analysis_hz=5.0):
+    """
+    Standalone OpenCV window (press Q to stop); returns the detected concerns.
+    The window loop only draws the newest frame, capture and analysis run on the pipeline threads.
+    """
+    window = "Skin Concern Detection (Press Q to Stop)"
+    try:
+        pipeline = WebcamConcernPipeline(camera_index, analysis_hz=analysis_hz).start()
+    except RuntimeError:
+        return []
+    cv2.namedWindow(window)
+    try:
+        while pipeline.running:
+            frame = pipeline.latest_frame()
+            if frame is not None:
+                frame = frame.copy()
+                face = pipeline.face()
+                if face is not None:
+                    x, y, w, h = face
+                    cv2.rectangle(frame, (x, y), (x + w, y + h), (180, 105, 255), 2)
+                cv2.putText(frame, f"Detected: {', '.join(pipeline.concerns())}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                cv2.imshow(window, frame)
+            if cv2.waitKey(15) & 0xFF == ord('q'):
+                break
+    finally:
+        pipeline.stop()
+        cv2.destroyAllWindows()
+    return pipeline.concerns()
+
+
+def detect_skin_concerns_from_image(image_path, scale=1, detect=None):
+    """
+    Concerns for one face image; scale > 1 decodes it at 1/scale resolution (faster, approximate).
+    - detect: frame -> face box or None, used instead of detect_face
+    """
+    img = cv2.imread(image_path, REDUCED_GRAYSCALE_FLAGS[scale])
+    if img is None:
+        return []
+    try:
+        measured = measure_frame(img, scale=scale, detect=detect)
+    except cv2.error:
+        return []
+    if measured is None:
+        return []
+    return list(concerns_from_measurements(*measured))
+
+
+# ---------------------------
+# Bulk image analysis
+# ---------------------------
+def iter_image_paths(source):
+    """Image files under a directory (recursively) or matching a glob pattern, in sorted order."""
+    if os.path.isdir(source):
+        paths = (os.path.join(d, f) for d, _, files in os.walk(source) for f in files)
+    else:
+        paths = glob.iglob(source, recursive=True)
+    return sorted(p for p in paths if p.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(p))
+
+
+def _analyze_one(args):
+    path, scale, detect = args
+    img = cv2.imread(path, REDUCED_GRAYSCALE_FLAGS[scale])
+    if img is None:
+        return {"path": path, "concerns": [], "error": "unreadable image"}
+    try:
+        measured = measure_frame(img, scale=scale, detect=detect)
+    except cv2.error as e:
+        return {"path": path, "concerns": [], "error": str(e)}
+    if measured is None:
+        return {"path": path, "concerns": [], "error": "no face found"}
+    return {"path": path, "concerns": sorted(concerns_from_measurements(*measured)), "error": None}
+
+
+def _init_worker():
+    # one OpenCV thread per process: the pool itself provides the parallelism
+    cv2.setNumThreads(1)
+
+
+def analyze_images(source, processes=None, scale=1, skip=(), chunksize=16, detect=None):
+    """
+    Generator of {"path", "concerns", "error"} dicts for every image in source (directory or glob).
+    - processes: worker processes (None = os.cpu_count(), 1 = analyze in this process)
+    - scale: 1, 2, 4 or 8; decode at 1/scale resolution (cv2.IMREAD_REDUCED_GRAYSCALE_*)
+    - skip: paths already analyzed (e.g. read back from a previous output file) to resume from
+    - detect: frame -> face box or None, used instead of detect_face (a module-level function, for the pool)
+    Results are yielded as soon as they complete, so the order is not the directory order.
+    """
+    if scale not in REDUCED_GRAYSCALE_FLAGS:
+        raise ValueError(f"scale must be one of {sorted(REDUCED_GRAYSCALE_FLAGS)}")
+    skip = set(skip)
+    tasks = [(p, scale, detect) for p in iter_image_paths(source) if p not in skip]
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield _analyze_one(task)
+        return
+    with mp.Pool(processes, initializer=_init_worker) as pool:
+        yield from pool.imap_unordered(_analyze_one, tasks, chunksize=chunksize)
+
+
+def read_checkpoint(output_path):
+    """Paths already present in a previous JSONL/CSV output file (empty if there is none)."""
+    if not os.path.exists(output_path):
+        return set()
+    with open(output_path, newline="", encoding="utf-8") as f:
+        # an unterminated last line was cut short by an interrupted run (write_results drops it)
+        lines = (line for line in f if line.endswith("\n"))
+        if output_path.endswith(".csv"):
+            return {row["path"] for row in csv.DictReader(lines)}
+        done = set()
+        for line in lines:
+            try:
+                done.add(json.loads(line)["path"])
+            except (ValueError, KeyError):
+                pass
+        return done
+
+
+def _drop_partial_line(path, block_size=1 << 16):
+    """Truncate a results file after its last newline, removing a row an interrupted run left half written."""
+    with open(path, "rb+") as f:
+        end = pos = f.seek(0, os.SEEK_END)
+        while pos > 0:
+            step = min(pos, block_size)
+            f.seek(pos - step)
+            i = f.read(step).rfind(b"\n")
+            if i >= 0:
+                pos += i + 1 - step
+                break
+            pos -= step
+        if pos < end:
+            f.truncate(pos)
+
+
+def write_results(results, output_path):
+    """Append results to a JSONL or CSV file, flushing each row so an interrupted run can resume."""
+    is_csv = output_path.endswith(".csv")
+    if os.path.exists(output_path):
+        _drop_partial_line(output_path)
+    new_file = not os.path.exists(output_path) or os.path.getsize(output_path) == 0
+    count = 0
+    with open(output_path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f) if is_csv else None
+        if is_csv and new_file:
+            writer.writerow(["path", "concerns", "error"])
+        for result in results:
+            if is_csv:
+                writer.writerow([result["path"], ";".join(result["concerns"]), result["error"] or ""])
+            else:
+                f.write(json.dumps(result) + "\n")
+            f.flush()
+            count += 1
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tag a folder of face images with skin concerns")
+    parser.add_argument("source", help="directory or glob pattern (quote it, e.g. \"photos/**/*.jpg\")")
+    parser.add_argument("--output", "-o", required=True, help="results file (.jsonl or .csv); re-running resumes from it")
+    parser.add_argument("--processes", "-p", type=int, default=None)
+    parser.add_argument("--scale", type=int, default=1, choices=sorted(REDUCED_GRAYSCALE_FLAGS),
+                        help="decode at 1/scale resolution (faster, approximate)")
+    args = parser.parse_args()
+    done = read_checkpoint(args.output)
+    written = write_results(analyze_images(args.source, args.processes, args.scale, skip=done), args.output)
+    print(f"{written} images analyzed ({len(done)} already in {args.output})")
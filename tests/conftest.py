@@ -0,0 +1,34 @@
+"""
+Shared test setup. recommender_engine loads its catalog at import, so a small synthetic
+catalog (benchmark.synthetic_catalog, ~500 products) is generated and selected through
+SKINCARE_CATALOG_CSV before any test imports the engine.
+"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import benchmark
+
+CATALOG_ROWS = 4000
+
+_workdir = tempfile.mkdtemp(prefix="skincare-tests-")
+atexit.register(shutil.rmtree, _workdir, True)
+os.environ["SKINCARE_CATALOG_CSV"] = benchmark.ensure_catalog(_workdir, CATALOG_ROWS)
+os.environ.pop("SKINCARE_LSH_MIN_PRODUCTS", None)
+
+
+@pytest.fixture
+def engine():
+    """recommender_engine; whatever catalog_state a test publishes is rolled back afterwards."""
+    import recommender_engine
+    state = recommender_engine.catalog_state
+    yield recommender_engine
+    # the Product_id -> position map is shared with (and updated in place by) later states
+    recommender_engine._publish(dict(state, positions=None))
@@ -0,0 +1,28 @@
+import os
+
+import pytest
+
+PROFILES = [
+    {"skin_type": skin_type, "concerns": concerns, "avoid_ingredients": avoid, "sort_by": sort_by}
+    for skin_type in ("oily", "dry", "all")
+    for concerns in (["acne"], ["dryness", "wrinkles"], ["redness"])
+    for avoid in ([], ["fragrance"])
+    for sort_by in ("rating", "brand")
+]
+
+
+def _names(results):
+    return [(message, [p["name"] for p in products]) for message, products in results]
+
+
+@pytest.mark.parametrize("processes", [None, 2])
+def test_batch_matches_single_queries(engine, processes):
+    expected = [engine.recommend_products(limit=4, **p) for p in PROFILES]
+    assert _names(engine.recommend_products_batch(PROFILES, top_n=4, processes=processes)) == _names(expected)
+
+
+def test_workers_with_another_catalog_are_not_trusted(engine, monkeypatch):
+    # every worker sees another catalog generation than the parent: all chunks are ranked in-process
+    monkeypatch.setattr(engine, "_catalog_generation", lambda state: os.getpid())
+    expected = [engine.recommend_products(limit=4, **p) for p in PROFILES]
+    assert _names(engine.recommend_products_batch(PROFILES, top_n=4, processes=2)) == _names(expected)
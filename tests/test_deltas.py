@@ -0,0 +1,64 @@
+"""Catalog deltas applied one by one must leave the same catalog as a reload that replays them."""
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+QUERIES = [("all", ["acne"]), ("oily", ["dryness", "redness"]), ("dry", ["zzq"]), ("all", ["a"])]
+
+
+@pytest.fixture
+def delta_dir(engine):
+    os.makedirs(engine.delta_dir, exist_ok=True)
+    yield engine.delta_dir
+    shutil.rmtree(engine.delta_dir, ignore_errors=True)
+
+
+def _snapshot(engine):
+    """What queries see of the current catalog, by Product_id."""
+    ids = lambda products: [int(p["Product_id"]) for p in products]
+    out = {"size": engine.live_product_count(), "ingredients": list(engine.ingredients)}
+    for skin_type, concerns in QUERIES:
+        for sort_by in ("rating", "brand"):
+            message, products = engine.recommend_products(skin_type, concerns, sort_by=sort_by)
+            out[skin_type, tuple(concerns), sort_by] = (message, ids(products))
+    for name in ("Zzq Night Serum", engine.product_list[1]["name"]):
+        out["similar", name] = [(int(p["Product_id"]), round(s, 5)) for p, s in engine.more_like_this(name, top_k=8)]
+    return out
+
+
+def _write(delta_dir, name, frame):
+    frame.to_csv(os.path.join(delta_dir, name), index=False)
+
+
+def test_incremental_deltas_match_reload(engine, delta_dir):
+    raw = pd.read_csv(engine.file_path)
+    first_id, second_id = raw["Product_id"].unique()[:2]
+
+    # upsert an existing product with new ratings, and add a product with a new ingredient
+    changed = raw[raw["Product_id"] == first_id].assign(Rating_Stars=5, Good_Stuff=1)
+    added = raw[raw["Product_id"] == second_id].head(3).assign(
+        Product_id=10 ** 9, Product="Zzq Night Serum", Ingredients_Cleaned="['zzq extract', 'glycerin']")
+    _write(delta_dir, "001.csv", pd.concat([changed, added]))
+    engine.apply_pending_deltas()
+    # delete an existing product and upsert the added one again
+    deleted = raw[raw["Product_id"] == second_id].head(1).assign(Op="delete")
+    readded = added.assign(Rating_Stars=1, Op="upsert")
+    _write(delta_dir, "002.csv", pd.concat([deleted, readded]))
+    assert len(engine.apply_pending_deltas()) == 1
+
+    incremental = _snapshot(engine)
+    assert incremental["size"] == raw["Product_id"].nunique()
+    assert "zzq extract" in incremental["ingredients"]
+    assert second_id not in incremental["all", ("acne",), "rating"][1]
+
+    engine.reload_catalog()
+    assert _snapshot(engine) == incremental
+
+
+def test_failed_delta_is_quarantined(engine, delta_dir):
+    _write(delta_dir, "bad.csv", pd.DataFrame({"Product_id": ["x"], "Product": ["y"]}))
+    with pytest.warns(UserWarning):
+        assert engine.apply_pending_deltas() == []
+    assert os.listdir(delta_dir) == ["bad.csv" + engine.FAILED_DELTA_SUFFIX]
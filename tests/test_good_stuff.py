@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("sklearn")
+
+import good_stuff_model
+
+
+@pytest.fixture
+def model(engine, tmp_path, monkeypatch):
+    path = str(tmp_path / "model.pkl")
+    good_stuff_model.train_model(engine.file_path, path, n_estimators=5, n_jobs=1)
+    monkeypatch.setattr(good_stuff_model, "model_path", path)
+    return path
+
+
+PROFILES = [{"skin_type": "Oily", "skin_tone": "Light"}, {"skin_type": "dry"}, {}]
+
+
+def test_predictions_are_chunked_without_changing_them(engine, model, monkeypatch):
+    full = engine.predict_good_stuff(PROFILES)
+    assert full.shape == (len(PROFILES), len(engine.product_list))
+    monkeypatch.setattr(engine, "PREDICT_CHUNK_ROWS", 7)
+    assert np.allclose(engine.predict_good_stuff(PROFILES), full)
+    assert np.allclose(engine.predict_good_stuff(PROFILES[:2], [3, 1, 4]), full[:2][:, [3, 1, 4]])
+
+
+def test_delta_products_do_not_shift_codes(engine, model):
+    _, before = engine._good_stuff_features(engine.catalog_state)
+    rows = pd.read_csv(engine.file_path, nrows=2)
+    # names sorting before every catalog name: refitting the classes would renumber all products
+    rows["Product"] = ["000 New Serum", "001 New Cream"]
+    rows["Product_id"] = [10 ** 9, 10 ** 9 + 1]
+    engine.apply_delta(rows)
+    _, after = engine._good_stuff_features(engine.catalog_state)
+    j = good_stuff_model.FEATURE_COLUMNS.index("Product")
+    assert (after[:len(before), j] == before[:, j]).all()
+    unseen = len(engine.catalog_state["encoders"]["Product"])
+    assert (after[len(before):, j] == unseen).all()
@@ -0,0 +1,90 @@
+import json
+import logging
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """A fresh global registry, with metrics enabled."""
+    reg = metrics.MetricsRegistry()
+    monkeypatch.setattr(metrics, "registry", reg)
+    monkeypatch.setattr(metrics, "enabled", True)
+    return reg
+
+
+def test_histogram_buckets():
+    h = metrics.Histogram((1, 5, 10))
+    assert h.quantile(0.5) is None
+    for value in (0.5, 1, 3, 10, 11):  # bounds are inclusive; 11 is past the last bucket
+        h.observe(value)
+    assert h.counts == [2, 1, 1] and h.count == 5 and h.sum == 25.5
+    assert h.cumulative() == [(1, 2), (5, 3), (10, 4)]
+    assert h.quantile(0.4) == 1 and h.quantile(0.5) == 5 and h.quantile(0.8) == 10
+    assert h.quantile(1.0) == float("inf")
+
+
+def test_prometheus_output():
+    reg = metrics.MetricsRegistry()
+    reg.inc("responses_total", path='/a"b\\c\nd', status=200)
+    reg.inc("responses_total", 2, path="/health", status=200)
+    reg.observe("stage_seconds", 0.05, (0.1, 1.0), stage="rank")
+    reg.observe("stage_seconds", 2.0, (0.1, 1.0), stage="rank")
+    reg.observe("queue_depth", 3, (5,))
+    assert metrics.to_prometheus(reg).splitlines() == [
+        "# TYPE skincare_responses_total counter",
+        'skincare_responses_total{path="/a\\"b\\\\c\\nd",status="200"} 1',
+        'skincare_responses_total{path="/health",status="200"} 2',
+        "# TYPE skincare_queue_depth histogram",
+        'skincare_queue_depth_bucket{le="5"} 1',
+        'skincare_queue_depth_bucket{le="+Inf"} 1',
+        "skincare_queue_depth_sum{} 3.0",
+        "skincare_queue_depth_count{} 1",
+        "# TYPE skincare_stage_seconds histogram",
+        'skincare_stage_seconds_bucket{stage="rank",le="0.1"} 1',
+        'skincare_stage_seconds_bucket{stage="rank",le="1.0"} 1',
+        'skincare_stage_seconds_bucket{stage="rank",le="+Inf"} 2',
+        'skincare_stage_seconds_sum{stage="rank"} 2.05',
+        'skincare_stage_seconds_count{stage="rank"} 2',
+    ]
+    assert json.loads(metrics.to_json(reg))["counters"][1]["value"] == 2
+
+
+def test_log_line(caplog):
+    reg = metrics.MetricsRegistry()
+    assert metrics.to_log_line(reg) == "no metrics recorded"
+    reg.observe("stage_seconds", 0.002, stage="rank", backend="columnar")
+    reg.observe("stage_seconds", 0.004, stage="rank", backend="columnar")
+    reg.observe("stage_seconds", 0.02, stage="load")
+    reg.observe("stage_candidates_out", 7, metrics.SIZE_BUCKETS, stage="rank")
+    reg.inc("cache_hits", 3, cache="results")
+    reg.inc("reloads")
+    # in registry key order: (name, sorted label items)
+    line = "rank@columnar n=2 mean=3.00ms p99<=5.0ms; load n=1 mean=20.00ms p99<=25.0ms; " \
+           'cache_hits{cache="results"}=3; reloads=1'
+    assert metrics.to_log_line(reg) == line
+    with caplog.at_level(logging.INFO, logger="skincare.metrics"):
+        metrics.log_exporter()(reg)
+    assert caplog.messages == [line]
+
+
+def test_disabled_stage_is_a_shared_no_op(registry, monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", False)
+    first, second = metrics.stage("rank"), metrics.stage("filter", backend="index")
+    assert first is second
+    with second as st:
+        st.record(candidates_out=5)
+    metrics.inc("requests_total")
+    assert registry.snapshot() == {"counters": [], "histograms": []}
+
+    metrics.enable()
+    with metrics.stage("rank", backend="columnar") as st:
+        st.record(candidates_out=5)
+    metrics.inc("requests_total")
+    snap = registry.snapshot()
+    assert [(h["name"], h["labels"], h["count"]) for h in snap["histograms"]] == [
+        ("stage_candidates_out", {"stage": "rank", "backend": "columnar"}, 1),
+        ("stage_seconds", {"stage": "rank", "backend": "columnar"}, 1)]
+    assert snap["counters"] == [{"name": "requests_total", "labels": {}, "value": 1}]
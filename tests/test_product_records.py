@@ -0,0 +1,109 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import product_records
+
+COLUMNS = ["name", "brand", "rating", "key_ingredients", "review"]
+
+
+class ColdLoader:
+    """Cold column loader counting its calls; returns None (snapshot rebuilt) when values is None."""
+    def __init__(self, values):
+        self.values, self.calls = values, []
+
+    def __call__(self, column):
+        self.calls.append(column)
+        return None if self.values is None else self.values.get(column)
+
+
+def _store(loader=None):
+    frame = pd.DataFrame({
+        "name": ["Serum", "Cream", None],
+        "brand": ["A", "B", "A"],
+        "rating": [4.5, 3.0, 5.0],
+        "key_ingredients": [["water", "niacinamide"], [], ["water"]],
+    })
+    return product_records.ProductStore(frame, columns=COLUMNS, cold_loader=loader)
+
+
+def _delta(names, ingredients, reviews=None):
+    frame = pd.DataFrame({"name": names, "brand": "C", "rating": 4.0, "key_ingredients": ingredients})
+    if reviews is not None:
+        frame["review"] = reviews
+    return frame
+
+
+def test_append_adds_records_and_keeps_old_ones():
+    store = _store(ColdLoader({"review": np.array(["good", "ok", "meh"], dtype=object)}))
+    old = store.records()
+    added = store.append(_delta(["Toner", "Mask"], [["water", "zinc"], "not a list"], reviews=["new", "fine"]))
+    assert [r.position for r in added] == [3, 4] and store.size == 5
+    assert dict(added[0]) == {"name": "Toner", "brand": "C", "rating": 4.0,
+                              "key_ingredients": ["water", "zinc"], "review": "new"}
+    assert added[1]["key_ingredients"] == []
+    assert store.vocab == ["water", "niacinamide", "zinc"] and store.vocab_lower[-1] == "zinc"
+    assert list(added[0].ingredient_ids) == [0, 2]
+    assert old[0]["name"] == "Serum" and math.isnan(old[2]["name"]) and old[1]["review"] == "ok"
+    # columns missing from a delta read back as NaN
+    missing = store.append(_delta(["Oil"], [[]]))[0]
+    assert math.isnan(missing["review"])
+
+
+def test_truncate_drops_a_half_applied_delta():
+    store = _store(ColdLoader({"review": np.array(["good", "ok", "meh"], dtype=object)}))
+    store.append(_delta(["Toner"], [["zinc"]], reviews=["new"]))
+    size = store.size
+    store.append(_delta(["Broken", "Broken 2"], [["retinol"], []], reviews=["x", "y"]))
+    store.truncate(size)
+    assert store.size == size and len(store.records()) == size
+    store.truncate(size + 10)  # nothing to drop
+    assert store.size == size
+    again = store.append(_delta(["Mask"], [["water"]], reviews=["fine"]))[0]
+    assert again.position == size
+    assert dict(again) == {"name": "Mask", "brand": "C", "rating": 4.0, "key_ingredients": ["water"], "review": "fine"}
+    assert store.records()[3]["name"] == "Toner" and store.records()[3]["review"] == "new"
+
+
+def test_cold_columns_load_once_on_first_use():
+    loader = ColdLoader({"review": np.array(["good", "ok", "meh"], dtype=object)})
+    store = _store(loader)
+    added = store.append(_delta(["Toner"], [[]], reviews=["new"]))[0]
+    records = store.records()
+    assert records[0]["name"] == "Serum" and loader.calls == []
+    assert [r["review"] for r in records] == ["good", "ok", "meh", "new"]
+    assert added["review"] == "new" and loader.calls == ["review"]
+    with pytest.raises(KeyError):
+        records[0]["username"]
+    assert records[0].get("username", "-") == "-" and loader.calls == ["review"]
+
+
+def test_cold_columns_after_the_snapshot_was_rebuilt():
+    loader = ColdLoader(None)
+    store = _store(loader)
+    store.append(_delta(["Toner"], [[]], reviews=["new"]))
+    # base rows are no longer available, appended ones still are
+    assert [r["review"] for r in store.records()] == [None, None, None, "new"]
+    assert loader.calls == ["review"]
+    # without a loader at all, the same
+    bare = _store()
+    assert bare.records()[0]["review"] is None
+
+
+def test_truncate_after_an_append_that_failed_part_way(monkeypatch):
+    store = _store(ColdLoader({"review": np.array(["good", "ok", "meh"], dtype=object)}))
+    size = store.size
+
+    def fail(ingredient):
+        raise ValueError("bad ingredient")
+    # name, brand and rating get their tails extended before key_ingredients fails
+    with monkeypatch.context() as m:
+        m.setattr(store, "_intern", fail)
+        with pytest.raises(ValueError):
+            store.append(_delta(["Broken"], [["retinol"]], reviews=["x"]))
+    assert store.size == size
+    store.truncate(size)
+    added = store.append(_delta(["Mask"], [["water"]], reviews=["fine"]))[0]
+    assert dict(added) == {"name": "Mask", "brand": "C", "rating": 4.0, "key_ingredients": ["water"], "review": "fine"}
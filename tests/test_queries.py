@@ -0,0 +1,39 @@
+def test_skin_type_is_normalized_for_key_and_results(engine):
+    key = engine.normalize_query("dry", ["acne"])
+    assert engine.normalize_query(" Dry ", ["acne"]) == key
+    assert engine.normalize_query("DRY", ["Acne "]) == key
+    assert engine.recommend_products(" Dry ", ["acne"]) == engine.recommend_products("dry", ["acne"])
+    engine.invalidate_caches()
+    assert engine.recommend_products("DRY", ["acne"]) == engine.recommend_products("dry", ["acne"])
+
+
+def test_missing_skin_type_means_all(engine):
+    assert engine.normalize_query(None, ["acne"]) == engine.normalize_query("all", ["acne"])
+    assert engine.recommend_products(None, ["acne"]) == engine.recommend_products("all", ["acne"])
+
+
+def test_equivalent_queries_share_a_key(engine):
+    key = engine.normalize_query("oily", ["acne", "redness"], ["alcohol", "fragrance"], "The ", " Serum", "rating")
+    assert engine.normalize_query("oily", [" Redness", "ACNE", ""], ["fragrance", "alcohol", "Alcohol ", " "],
+                                  "the", "serum ", "rating") == key
+    assert engine.normalize_query("oily", ["acne"], brand_filter="  ") == engine.normalize_query("oily", ["acne"])
+    assert engine.normalize_query("oily", ["acne"], sort_by="brand") != engine.normalize_query("oily", ["acne"])
+
+
+def test_result_cache_keys_pages_and_versions(engine):
+    engine.invalidate_caches()
+    first = engine.recommend_products("all", ["acne"], limit=5)
+    hits = engine.cache_stats()["results"]["hits"]
+    assert engine.recommend_products("all", ["ACNE "], limit=5) == first
+    assert engine.cache_stats()["results"]["hits"] == hits + 1
+    # limit and offset are part of the key
+    assert engine.recommend_products("all", ["acne"], limit=5, offset=5)[1] == \
+        engine.recommend_products("all", ["acne"])[1][5:10]
+    # callers get their own list
+    first[1].clear()
+    assert len(engine.recommend_products("all", ["acne"], limit=5)[1]) == 5
+    # a new catalog version never serves the old entries
+    engine._publish(dict(engine.catalog_state, version=next(engine._catalog_versions)))
+    misses = engine.cache_stats()["results"]["misses"]
+    engine.recommend_products("all", ["acne"], limit=5)
+    assert engine.cache_stats()["results"]["misses"] == misses + 1
@@ -0,0 +1,88 @@
+"""
+recommend_products (served by the columnar ranker) against the original recommender loop,
+transcribed below: one product at a time, substring checks, stable sorts.
+"""
+import itertools
+
+import pytest
+
+CONCERN_SETS = [["acne"], ["dryness", "redness"], ["wrinkles", "dark circles"], ["serum"], ["zzz"], ["a"], []]
+QUERIES = [
+    dict(skin_type=skin_type, concerns=concerns, avoid_ingredients=avoid, brand_filter=brand,
+         category_filter=category, sort_by=sort_by)
+    for (skin_type, concerns, avoid, brand, category, sort_by) in itertools.islice(itertools.product(
+        ["oily", "dry", "all", "normal", "", "xx"], CONCERN_SETS, [[], ["fragrance", "alcohol"]],
+        [None, "the ", "zzz"], [None, "mask"], ["rating", "brand", "relevance"]), 0, None, 23)
+]
+
+
+def reference_recommend(engine, skin_type, concerns, avoid_ingredients=None, brand_filter=None,
+                        category_filter=None, sort_by="rating"):
+    """The original recommend_products over engine.product_list (rating_score as the rating)."""
+    skin_type = "all" if skin_type is None else skin_type.strip().lower()
+    concerns = [c.strip().lower() for c in concerns if c and c.strip()]
+    avoid_ingredients = [a.strip().lower() for a in (avoid_ingredients or []) if a and a.strip()]
+    brand_filter = brand_filter.strip().lower() if brand_filter and brand_filter.strip() else None
+    category_filter = category_filter.strip().lower() if category_filter and category_filter.strip() else None
+
+    keywords = set()
+    for c in concerns:
+        keywords.update(m.lower() for m in engine.CONCERN_TO_INGREDIENTS.get(c, []))
+        keywords.update(ing.lower() for ing in engine.ingredients if c in ing.lower())
+    if not keywords:
+        keywords = set(concerns)
+
+    live = engine.catalog_state["live"]
+    products = [p for i, p in enumerate(engine.product_list) if live[i] and int(p.get("good_stuff", 0)) == 1]
+
+    def score(p):
+        ings = [str(x).lower() for x in p.get("key_ingredients", [])]
+        category, name = str(p.get("category", "")).lower(), str(p.get("name", "")).lower()
+        s = sum(3 for kw in keywords if any(kw in ing for ing in ings))
+        s += sum(1 for c in concerns if c in category or c in name)
+        if brand_filter and brand_filter not in str(p.get("brand", "")).lower():
+            return 0
+        if category_filter and category_filter not in category:
+            return 0
+        if any(a in ing for a in avoid_ingredients for ing in ings):
+            return 0
+        return s
+
+    candidates = []
+    for p in products:
+        prod_skin = str(p.get("skin_type", "all")).lower()
+        if skin_type in prod_skin or prod_skin == "all":
+            s = score(p)
+            if s > 0:
+                candidates.append((s, p))
+    if not candidates:
+        fallback = [p for p in products
+                    if any(kw in str(ing).lower() for kw in keywords for ing in p.get("key_ingredients", []))]
+        if fallback:
+            return "No products for the selected skin type. Showing results for all skin types:", fallback
+        return "No products found for the given concerns.", []
+    if sort_by == "brand":
+        candidates.sort(key=lambda t: str(t[1].get("brand", "")).lower())
+    else:
+        candidates.sort(key=lambda t: (t[0], float(t[1].get("rating_score", 0) or 0)), reverse=True)
+    return "Here are your recommendations:", [p for _, p in candidates]
+
+
+def _same(result, expected):
+    assert result[0] == expected[0]
+    assert [id(p) for p in result[1]] == [id(p) for p in expected[1]]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_matches_original_recommender(engine, query):
+    expected = reference_recommend(engine, **query)
+    _same(engine.recommend_products(**query), expected)
+    _same(engine.recommend_products_columnar(**query), expected)
+
+
+@pytest.mark.parametrize("query", QUERIES[::6])
+@pytest.mark.parametrize("limit,offset", [(1, 0), (5, 0), (5, 3), (50, 10), (0, 0), (10, 10 ** 6)])
+def test_pages_match_full_ranking(engine, query, limit, offset):
+    message, full = engine.recommend_products(**query)
+    _same(engine.recommend_products(**query, limit=limit, offset=offset), (message, full[offset:offset + limit]))
+    _same(engine.recommend_products_columnar(**query, limit=limit, offset=offset), (message, full[offset:offset + limit]))
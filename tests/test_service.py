@@ -0,0 +1,129 @@
+import asyncio
+import json
+
+import pytest
+
+import recommendation_service as service
+
+
+@pytest.fixture
+def route(engine, monkeypatch):
+    monkeypatch.setattr(service, "engine", engine)
+
+    def call(method, path, payload=None):
+        return service.route(method, path, None if payload is None else json.dumps(payload).encode())
+    return call
+
+
+@pytest.mark.parametrize("payload", [
+    {"skin_type": 3},
+    {"skin_type": ["oily"]},
+    {"concerns": [1, 2]},
+    {"concerns": {"acne": True}},
+    {"brand_filter": {"x": 1}},
+    {"category_filter": 7},
+    {"sort_by": ["rating"]},
+    {"limit": -1},
+    {"limit": "5"},
+    {"limit": True},
+    {"limit": service.MAX_LIMIT + 1},
+    {"offset": 1.5},
+])
+def test_recommend_rejects_bad_fields(route, payload):
+    status, body = route("POST", "/recommend", dict({"concerns": ["acne"]}, **payload))
+    assert status == 400 and "error" in body
+
+
+@pytest.mark.parametrize("body", [b"not json", b"[1, 2]", b"\xff\xfe"])
+def test_malformed_bodies_are_400(route, body):
+    status, reply = service.route("POST", "/recommend", body)
+    assert status == 400 and "error" in reply
+
+
+def test_recommend_applies_default_limit(route, engine):
+    status, body = route("POST", "/recommend", {"concerns": ["a"], "skin_type": "all"})
+    full = engine.recommend_products("all", ["a"])[1]
+    assert status == 200 and len(full) > service.DEFAULT_LIMIT
+    assert [p["name"] for p in body["products"]] == [p["name"] for p in full[:service.DEFAULT_LIMIT]]
+
+
+def test_unknown_paths_and_methods(route):
+    assert route("GET", "/nope")[0] == 404
+    assert route("POST", "/nope", {})[0] == 404
+    assert route("GET", "/recommend")[0] == 405
+    assert route("POST", "/health", {})[0] == 405
+
+
+def test_similar_validation(route, engine):
+    assert route("POST", "/similar", {"names": []})[0] == 400
+    assert route("POST", "/similar", {"names": ["x"], "top_k": service.MAX_LIMIT + 1})[0] == 400
+    status, body = route("POST", "/similar", {"names": [engine.product_list[0]["name"]], "approximate": True})
+    assert status == 200 and body["approximate"] is False
+
+
+class _Writer:
+    data = b""
+
+    def write(self, chunk):
+        self.data += chunk
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _exchange(request):
+    """Everything handle_connection writes back for the raw bytes of one connection."""
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(request)
+        reader.feed_eof()
+        writer = _Writer()
+        await service.handle_connection(reader, writer)
+        return writer.data
+    return asyncio.run(run())
+
+
+def test_internal_errors_do_not_leak(engine, monkeypatch):
+    def boom(*args, **kwargs):
+        raise RuntimeError("secret path /srv/catalog.csv")
+    monkeypatch.setattr(service, "engine", engine)
+    monkeypatch.setattr(engine, "recommend_products", boom)
+    reply = _exchange(b"POST /recommend HTTP/1.1\r\nContent-Length: 2\r\nConnection: close\r\n\r\n{}")
+    assert reply.startswith(b"HTTP/1.1 500") and b"secret" not in reply
+
+
+def test_chunked_bodies_are_refused(route):
+    reply = _exchange(b"POST /recommend HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+                      b"13\r\n{\"concerns\": [\"x\"]}\r\n0\r\n\r\n"
+                      b"GET /health HTTP/1.1\r\n\r\n")
+    assert reply.startswith(b"HTTP/1.1 411") and b"Connection: close" in reply
+    assert reply.count(b"HTTP/1.1") == 1
+
+
+def test_client_pages_past_max_limit(route, engine, monkeypatch):
+    requests = []
+
+    def request(self, method, path, payload=None):
+        requests.append(payload)
+        status, body = route(method, path, payload)
+        assert status == 200, body
+        return body
+    monkeypatch.setattr(service.RecommendationClient, "_request", request)
+    monkeypatch.setattr(service, "MAX_LIMIT", 7)
+    client = service.RecommendationClient("http://127.0.0.1:1")
+    expected = engine.recommend_products("all", ["acne"])
+    assert len(expected[1]) > 20
+
+    requests.clear()
+    assert _names(client.recommend_products("all", ["acne"], limit=20)) == _names((expected[0], expected[1][:20]))
+    assert [r["limit"] for r in requests] == [7, 7, 6]
+    assert _names(client.recommend_products("all", ["acne"])) == _names(expected)
+    assert client.recommend_products("all", ["acne"], limit=0) == (expected[0], [])
+
+
+def _names(result):
+    message, products = result
+    return message, [p["name"] for p in products]
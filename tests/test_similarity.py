@@ -0,0 +1,39 @@
+import numpy as np
+
+
+def _liked(engine):
+    """Name of a product with ingredients."""
+    sim = engine.catalog_state["similarity"]
+    i = int(np.flatnonzero(np.diff(sim["row_ptr"]))[0])
+    return engine.product_list[i]["name"]
+
+
+def test_approximate_without_lsh_is_exact(engine):
+    assert "lsh" not in engine.catalog_state["similarity"]
+    name = _liked(engine)
+    assert engine.more_like_this(name, top_k=5, approximate=True) == engine.more_like_this(name, top_k=5)
+
+
+def test_enable_lsh_makes_approximate_use_it(engine, monkeypatch):
+    version = engine.catalog_state["version"]
+    state = engine.enable_lsh()
+    assert state is engine.catalog_state and state["version"] != version
+    assert "lsh" in engine.similarity_index
+
+    calls = []
+    lsh_candidates = engine._lsh_candidates
+    monkeypatch.setattr(engine, "_lsh_candidates", lambda *args: calls.append(args) or lsh_candidates(*args))
+    name = _liked(engine)
+    approx = engine.more_like_this(name, top_k=5, approximate=True)
+    assert len(calls) == 1 and approx
+    exact = dict((p["name"], s) for p, s in engine.more_like_this(name, top_k=len(engine.product_list)))
+    assert len(calls) == 1
+    # approximate results are a subset of the exact ranking, with exact scores
+    for product, score in approx:
+        assert np.isclose(exact[product["name"]], score)
+
+
+def test_lsh_survives_reload(engine):
+    engine.enable_lsh()
+    engine.reload_catalog()
+    assert "lsh" in engine.catalog_state["similarity"]
@@ -0,0 +1,195 @@
+import csv
+import io
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+
+import benchmark
+import skin_analysis
+
+
+@pytest.fixture
+def no_detector(monkeypatch):
+    """OpenCV without a usable face cascade: the fixed ROIs are measured."""
+    monkeypatch.setattr(skin_analysis, "face_cascade", lambda: None)
+
+
+def _dark(rows, cols):
+    return np.full((rows, cols), 20, dtype=np.uint8)
+
+
+def test_fixed_rois_need_a_large_enough_frame(no_detector):
+    assert skin_analysis.measure_frame(_dark(50, 60)) is None
+    assert skin_analysis.measure_frame(_dark(200, 640)) is None
+    assert skin_analysis.measure_frame(_dark(480, 300)) is None
+    dark_mean, edges = skin_analysis.measure_frame(_dark(480, 640))
+    assert dark_mean == 20 and edges == 0
+    assert skin_analysis.concerns_from_measurements(dark_mean, edges) == {"dark circles"}
+
+
+def test_minimum_size_is_at_full_resolution(no_detector):
+    # a 240x320 image decoded at 1/8 is 30x40 pixels: large enough
+    assert skin_analysis.measure_frame(_dark(30, 40), scale=8) is not None
+    assert skin_analysis.measure_frame(_dark(30, 40)) is None
+    assert skin_analysis.measure_frame(_dark(25, 40), scale=8) is None
+
+
+def test_small_image_reports_nothing(no_detector, tmp_path):
+    path = str(tmp_path / "small.png")
+    cv2.imwrite(path, _dark(50, 60))
+    assert skin_analysis.detect_skin_concerns_from_image(path) == []
+    assert skin_analysis._analyze_one((path, 1, None))["concerns"] == []
+    large = str(tmp_path / "large.png")
+    cv2.imwrite(large, _dark(480, 640))
+    assert skin_analysis.detect_skin_concerns_from_image(large) == ["dark circles"]
+
+
+def test_request_stop_does_not_wait_for_the_threads():
+    pipeline = skin_analysis.WebcamConcernPipeline()
+
+    def slow_exit():  # a worker busy in a camera read when asked to stop
+        pipeline._stop.wait()
+        time.sleep(0.3)
+
+    pipeline._threads = [threading.Thread(target=slow_exit, daemon=True)]
+    pipeline._threads[0].start()
+    started = time.monotonic()
+    pipeline.request_stop()
+    assert time.monotonic() - started < 0.1 and pipeline.running
+    pipeline.stop()
+    assert not pipeline.running
+
+
+@pytest.fixture
+def image_dir(tmp_path):
+    folder = tmp_path / "faces"
+    (folder / "sub").mkdir(parents=True)
+    for i, (rows, cols) in enumerate([(480, 640), (50, 60), (240, 320), (600, 800)]):
+        image = _dark(rows, cols)
+        image[::7] = 255  # stripes: edges in the acne region
+        cv2.imwrite(str(folder / ("sub" if i % 2 else "") / f"{i}.png"), image)
+    (folder / "broken.jpg").write_bytes(b"not an image")
+    (folder / "notes.txt").write_text("skipped")
+    return str(folder)
+
+
+def test_analyze_images_pool_matches_serial(image_dir):
+    paths = skin_analysis.iter_image_paths(image_dir)
+    assert [os.path.basename(p) for p in paths] == ["0.png", "2.png", "broken.jpg", "1.png", "3.png"]
+    serial = list(skin_analysis.analyze_images(image_dir, processes=1))
+    assert [r["path"] for r in serial] == paths
+    pooled = list(skin_analysis.analyze_images(image_dir, processes=2, chunksize=1))
+    assert sorted(pooled, key=lambda r: r["path"]) == sorted(serial, key=lambda r: r["path"])
+    assert {r["path"]: r["error"] for r in serial}[os.path.join(image_dir, "broken.jpg")] == "unreadable image"
+    resumed = list(skin_analysis.analyze_images(image_dir, processes=1, skip=paths[:3]))
+    assert resumed == serial[3:]
+    with pytest.raises(ValueError):
+        next(skin_analysis.analyze_images(image_dir, scale=3))
+
+
+@pytest.mark.parametrize("suffix", [".jsonl", ".csv"])
+def test_resume_after_an_interrupted_write(image_dir, tmp_path, suffix):
+    output = str(tmp_path / ("tags" + suffix))
+    results = list(skin_analysis.analyze_images(image_dir, processes=1))
+    assert skin_analysis.write_results(results[:2], output) == 2
+    # the run is killed while writing the third row
+    with open(output, "r", newline="", encoding="utf-8") as f:
+        complete = f.read()
+    cut = ('{"path": ' + json.dumps(results[2]["path"])[:-3]) if suffix == ".jsonl" else results[2]["path"] + ",acn"
+    with open(output, "a", newline="", encoding="utf-8") as f:
+        f.write(cut)
+    done = skin_analysis.read_checkpoint(output)
+    assert done == {r["path"] for r in results[:2]}
+
+    rest = list(skin_analysis.analyze_images(image_dir, processes=1, skip=done))
+    assert skin_analysis.write_results(rest, output) == len(results) - 2
+    with open(output, newline="", encoding="utf-8") as f:
+        text = f.read()
+    assert text.startswith(complete) and text.endswith("\n")
+    assert skin_analysis.read_checkpoint(output) == {r["path"] for r in results}
+    if suffix == ".jsonl":
+        assert [json.loads(line) for line in text.splitlines()] == results
+    else:
+        rows = list(csv.DictReader(io.StringIO(text)))
+        assert [row["path"] for row in rows] == [r["path"] for r in results]
+
+
+def test_unterminated_only_line_is_dropped(tmp_path):
+    output = str(tmp_path / "tags.csv")
+    with open(output, "w", encoding="utf-8") as f:
+        f.write("path,conc")
+    assert skin_analysis.read_checkpoint(output) == set()
+    skin_analysis.write_results([{"path": "a.png", "concerns": ["acne"], "error": None}], output)
+    with open(output, newline="", encoding="utf-8") as f:
+        assert f.read() == "path,concerns,error\r\na.png,acne,\r\n"
+
+
+def test_face_rois_follow_the_face_box():
+    dark, acne = skin_analysis.face_rois((100, 50, 200, 300))
+    assert dark == (50 + 150, 50 + 198, 100 + 36, 100 + 164)
+    assert acne == (50 + 174, 50 + 246, 100 + 24, 100 + 84)
+    # twice the face, twice the regions: the analysis size (and the thresholds) stay the same
+    big_dark, big_acne = skin_analysis.face_rois((200, 100, 400, 600))
+    assert big_dark == tuple(2 * v for v in dark) and big_acne == tuple(2 * v for v in acne)
+
+
+class CountingDetector:
+    def __init__(self, box):
+        self.box, self.calls = box, 0
+
+    def __call__(self, frame):
+        self.calls += 1
+        return self.box
+
+
+def _face_frames(shifts):
+    face = benchmark.synthetic_face(np.random.default_rng(0))
+    return [np.roll(face, (dy, dx), axis=(0, 1)) for dy, dx in shifts]
+
+
+def test_tracker_follows_the_face_between_detections():
+    detect = CountingDetector(benchmark.synthetic_face_box())
+    tracker = skin_analysis.FaceTracker(detect=detect, redetect_every=3)
+    frames = _face_frames([(0, 0), (4, 6), (8, 12), (10, 15), (12, 18)])
+    boxes = [tracker.update(f) for f in frames]
+    x, y, w, h = detect.box
+    # frame 0 detects; 1-3 are tracked; 4 hits redetect_every and detects again
+    assert (detect.calls, tracker.tracked) == (2, 3)
+    for (dy, dx), box in zip([(4, 6), (8, 12), (10, 15)], boxes[1:4]):
+        assert abs(box[0] - (x + dx)) <= 3 and abs(box[1] - (y + dy)) <= 3 and box[2:] == (w, h)
+    assert boxes[4] == detect.box
+
+
+def test_tracker_redetects_when_the_match_is_lost():
+    detect = CountingDetector(benchmark.synthetic_face_box())
+    tracker = skin_analysis.FaceTracker(detect=detect)
+    frame = _face_frames([(0, 0)])[0]
+    tracker.update(frame)
+    noise = np.random.default_rng(1).integers(0, 255, frame.shape, dtype=np.uint8)
+    tracker.update(noise)
+    assert (detect.calls, tracker.tracked) == (2, 0)
+
+
+def test_no_face_means_no_measurement(monkeypatch, tmp_path):
+    frame = _face_frames([(0, 0)])[0]
+    nobody = CountingDetector(None)
+    tracker = skin_analysis.FaceTracker(detect=nobody)
+    assert tracker.available and tracker.update(frame) is None and tracker.box is None
+    assert skin_analysis.measure_frame(frame, detect=nobody) is None
+    path = str(tmp_path / "face.png")
+    cv2.imwrite(path, frame)
+    assert skin_analysis.detect_skin_concerns_from_image(path, detect=nobody) == []
+    assert skin_analysis._analyze_one((path, 1, nobody))["error"] == "no face found"
+    # with a cascade that finds nothing, the fixed ROIs are not used either
+    monkeypatch.setattr(skin_analysis, "face_cascade", lambda: object())
+    monkeypatch.setattr(skin_analysis, "detect_face", lambda frame: None)
+    assert skin_analysis.measure_frame(frame) is None
+    assert skin_analysis.detect_skin_concerns_from_image(path) == []
+    # a face box is measured
+    assert skin_analysis.measure_frame(frame, detect=benchmark.synthetic_detect) is not None